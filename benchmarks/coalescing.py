@@ -0,0 +1,107 @@
+"""
+Replays bursts of answers and leaves arriving in busy rooms through the BroadcastCoalescer, counting the updates that
+are sent and encoded for each flush window against sending every update right away (window 0).
+
+    python -m benchmarks.coalescing [--rooms 50] [--room-size 12] [--spread-ms 500]
+"""
+import argparse
+import json
+import random
+import time
+
+from things_game.background_scheduler import BackgroundTaskScheduler
+from things_game.coalescing import BroadcastCoalescer
+from things_game.logic import GameState, ThingsGame
+from benchmarks.micro import _room
+
+
+class _Room(object):
+    """Collects what the server would emit to one room"""
+    def __init__(self, game: ThingsGame):
+        self.game = game
+        self.emits = 0
+        self.bytes = 0
+
+    def flush(self, updates):
+        for event, player in updates:
+            self.broadcast(event, player)
+
+    def broadcast(self, event, player=None):
+        patch = self.game.publish_patch()
+        if not patch and not player:
+            return
+        data = {"patch": patch}
+        if player:
+            data["player"] = player
+        self.bytes += len(json.dumps(data))
+        self.emits += 1
+
+
+def answers(rooms, room_size):
+    """Everyone but the last player answers, the last answer would start matching and bypass the window"""
+    for _ in range(rooms):
+        game, players = _room(room_size, GameState.writing_answers)
+
+        yield game, "answer_submitted", [lambda p=p, game=game: game.submit_answer(p.id, p.session_key, "an answer")
+                                         for p in players[:-1]]
+
+
+def leaves(rooms, room_size):
+    """Everyone but the owner leaves before the game starts. Every leave is still announced, only one carries a patch"""
+    for _ in range(rooms):
+        game, players = _room(room_size)
+        game.publish_patch()
+        yield game, "player_left", [lambda p=p, game=game: game.drop_player(p.id).to_dict() for p in players[1:]]
+
+
+def run_case(scenario, window, rooms, room_size, spread, rand):
+    scheduler = BackgroundTaskScheduler()
+    scheduler.start()
+    by_id = {}
+    timeline = []
+    for game, event, actions in scenario(rooms, room_size):
+        room = by_id[game.id] = _Room(game)
+        timeline.extend((rand.uniform(0, spread), room, event, action) for action in actions)
+    timeline.sort(key=lambda item: item[0])
+    coalescer = BroadcastCoalescer(scheduler, window, lambda room_id, updates: by_id[room_id].flush(updates))
+
+    t_start = time.perf_counter()
+    for offset, room, event, action in timeline:
+        delay = t_start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        player = action()
+        if window:
+            coalescer.defer(room.game.id, event, player)
+        else:
+            room.broadcast(event, player)
+    while len(coalescer):
+        time.sleep(window / 4)
+    elapsed = time.perf_counter() - t_start
+    scheduler.stop()
+    emits = sum(r.emits for r in by_id.values())
+    encoded = sum(r.bytes for r in by_id.values())
+    return len(timeline), emits, encoded, elapsed
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--room-size", type=int, default=12)
+    parser.add_argument("--spread-ms", type=float, default=500, help="time over which a room's burst arrives")
+    args = parser.parse_args()
+
+    for scenario in (answers, leaves):
+        baseline = None
+        print(f"{scenario.__name__}: {args.rooms} rooms of {args.room_size}, each burst over {args.spread_ms:.0f}ms")
+        for window_ms in (0, 20, 50):
+            updates, emits, encoded, elapsed = run_case(scenario, window_ms / 1000, args.rooms, args.room_size,
+                                                        args.spread_ms / 1000, random.Random(1))
+            if baseline is None:
+                baseline = emits / elapsed
+            print(f"  window={window_ms:>3}ms updates={updates:>5} emits={emits:>5} encoded={encoded / 1024:>8.1f}KiB "
+                  f"emits/s={emits / elapsed:>7.0f} saved/s={baseline - emits / elapsed:>7.0f}")
+
+
+if __name__ == "__main__":
+    run()
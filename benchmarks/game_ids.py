@@ -0,0 +1,59 @@
+"""
+Measures GameManager.create_game as more and more of the word ids are in use, for the GameIdPool and for the
+previous approach of picking random words until one is free.
+
+    python -m benchmarks.game_ids
+"""
+import itertools
+import statistics
+import time
+
+from things_game.game_ids import load_word_ids
+from things_game.logic import ThingsGame
+from things_game.manager import GameManager
+from things_game.utils import generate_id, rand
+
+
+class _RetryingManager(GameManager):
+    """The previous create_game: random words until one is free, random letters after 100 collisions"""
+    words = load_word_ids()
+
+    def create_game(self, name, password_hash, password_salt):
+        for attempt in itertools.count():
+            game_id = rand.choice(self.words) if attempt < 100 else generate_id()
+            game = ThingsGame(name or game_id, password_hash, password_salt, game_id)
+            if self.store.add(game):
+                return game
+
+
+def run_case(manager_cls, fill, samples=500):
+    manager = manager_cls()
+    words = load_word_ids()
+    word_set = set(words)
+    for game_id in words[:int(len(words) * fill)]:
+        manager.store.add(ThingsGame("bench", game_id=game_id))
+        manager.game_ids.reserve(game_id)
+    timings = []
+    fallback = 0
+    for _ in range(samples):
+        t_start = time.perf_counter()
+        game = manager.create_game("bench", "", "")
+        timings.append(time.perf_counter() - t_start)
+        fallback += game.id not in word_set
+        # Removed again so every sample sees the same fill
+        manager.store.remove_if(game.id, lambda g: True)
+        manager.game_ids.release(game.id)
+    timings.sort()
+    print(f"{manager_cls.__name__:>17} in use={fill:>6.1%} median={statistics.median(timings) * 1e6:>8.1f}us "
+          f"p99={timings[int(len(timings) * 0.99)] * 1e6:>8.1f}us max={timings[-1] * 1e6:>8.1f}us "
+          f"fallback ids={fallback}")
+
+
+def run():
+    for fill in (0, 0.5, 0.9, 0.99, 0.999, 1.0):
+        for manager_cls in (_RetryingManager, GameManager):
+            run_case(manager_cls, fill)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,312 @@
+"""
+Plays full games against a running server with simulated players, then reports latency per event, event rates and
+the server's CPU and memory use.
+
+    python -m benchmarks.loadtest --rooms 50 --players 5 --spawn
+    python -m benchmarks.loadtest --url http://localhost:5000 --pid <server pid> --rooms 50 --players 5
+
+Each room creates a game, has the other players join, starts it and plays `--rounds` rounds through topic, answers
+and matching. Latency is measured from emitting an event to receiving the event the server answers it with. The
+match_result and round_started latencies include the delays the server schedules on purpose (3s, and 3+2+6s).
+"""
+# Bots are green threads, so hundreds of them fit in one process
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import socketio
+
+from things_game.delta import apply_patch
+
+
+# Events the server sends to clients, all of them are recorded so a bot can wait for any of them
+SERVER_EVENTS = ["player_id", "game_update", "games", "error", "random_topic", "player_joined", "player_left",
+                 "player_removed", "game_started", "points_reset", "topic_set", "topic_writer_skipped",
+                 "answer_submitted", "match_submitted", "match_result", "round_complete", "round_started",
+                 "game_patch"]
+
+
+class Stats(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.sent = 0
+        self.received = 0
+        self.errors = defaultdict(int)
+
+    def record(self, event, latency):
+        with self.lock:
+            self.latencies[event].append(latency)
+
+    def error(self, reason):
+        with self.lock:
+            self.errors[reason] += 1
+
+
+class Bot(object):
+    """One simulated player, keeps its own copy of the game up to date from snapshots and patches"""
+    def __init__(self, url, stats: Stats, timeout):
+        self.url = url
+        self.stats = stats
+        self.timeout = timeout
+        self.client = socketio.Client(reconnection=False)
+        self.condition = threading.Condition()
+        self.counts = defaultdict(int)
+        self.game = None
+        self.player_id = ""
+        self.session_key = ""
+        for event in SERVER_EVENTS:
+            self.client.on(event, self._handler(event))
+
+    def _handler(self, event):
+        def handle(data=None):
+            with self.condition:
+                self._update(event, data or {})
+                self.counts[event] += 1
+                self.condition.notify_all()
+            with self.stats.lock:
+                self.stats.received += 1
+        return handle
+
+    def _update(self, event, data):
+        if event == "player_id":
+            self.player_id = data["player_id"]
+            self.session_key = data["session_key"]
+        elif event == "error":
+            self.stats.error(data.get("error", ""))
+        elif data.get("game"):
+            self.game = data["game"]
+        elif data.get("patch") and self.game:
+            patch = data["patch"]
+            if patch["base_version"] == self.game["version"]:
+                self.game = apply_patch(self.game, patch)
+            elif patch["version"] > self.game["version"]:
+                # Missed one, a snapshot sorts it out
+                self.client.emit("request_update", self._credentials())
+
+    def _credentials(self):
+        return dict(game_id=self.game["game_id"] if self.game else "", player_id=self.player_id,
+                    session_key=self.session_key)
+
+    def connect(self):
+        self.client.connect(self.url, transports=["websocket"])
+
+    def disconnect(self):
+        self.client.disconnect()
+
+    def mark(self, event):
+        with self.condition:
+            return self.counts[event]
+
+    def me(self):
+        return next((p for p in self.game["players"] if p["id"] == self.player_id), None) if self.game else None
+
+    def wait(self, event, mark, started=None, until=None):
+        """
+        Wait for `event` to arrive more times than `mark`, and for `until(bot)` to hold if given. Records the latency
+        from `started` if given.
+        """
+        def done():
+            return self.counts[event] > mark and (until is None or until(self))
+
+        with self.condition:
+            if not self.condition.wait_for(done, self.timeout):
+                self.stats.error(f"timed out waiting for {event}")
+                raise TimeoutError(event)
+        if started is not None:
+            self.stats.record(event, time.perf_counter() - started)
+
+    def request(self, event, data, reply, until=None, command=True):
+        """
+        Emit `event` and wait for the server's `reply` to it. Broadcasts caused by other players can arrive in the
+        meantime, `until` tells this bot's own reply apart from them.
+        """
+        if command:
+            data = dict(self._credentials(), **data)
+        mark = self.mark(reply)
+        started = time.perf_counter()
+        self.client.emit(event, data)
+        with self.stats.lock:
+            self.stats.sent += 1
+        self.wait(reply, mark, until=until)
+        self.stats.record(event, time.perf_counter() - started)
+        return started
+
+
+def play_room(url, index, players, rounds, stats: Stats, timeout):
+    bots = [Bot(url, stats, timeout) for _ in range(players)]
+    try:
+        for bot in bots:
+            bot.connect()
+        owner = bots[0]
+        # The snapshot is the last thing sent back to a new player
+        owner.request("create_game", dict(name=f"load {index}", player_name="player 0"), "game_update", command=False)
+        game_id = owner.game["game_id"]
+        for i, bot in enumerate(bots[1:], 1):
+            bot.request("join_game", dict(game_id=game_id, player_name=f"player {i}"), "game_update", command=False)
+
+        by_id = {bot.player_id: bot for bot in bots}
+        answers = {bot.player_id: f"Answer {i}" for i, bot in enumerate(bots)}
+        owner.request("start_game", {}, "game_started")
+        actor = owner
+        for _ in range(rounds):
+            writer = by_id[actor.game["topic_writer"]["id"]]
+            writer.request("set_topic", dict(topic="things you would say to a load test"), "topic_set",
+                           until=lambda b: b.game["state"] == "writing_answers")
+            for bot in bots:
+                bot.request("submit_answer", dict(answer=answers[bot.player_id]), "answer_submitted",
+                            until=lambda b: b.me()["submitted_answer"])
+            actor = bots[-1]
+
+            while actor.game["state"] == "matching":
+                guesser = by_id[actor.game["guesser"]["id"]]
+                target = next(p for p in actor.game["players"] if not p["answer"] and p["id"] != guesser.player_id)
+                answer = next(a for a in actor.game["answers"] if a["text"] == answers[target["id"]])
+                mark_result = guesser.mark("match_result")
+                mark_round = guesser.mark("round_started")
+                started = guesser.request("submit_match", dict(guessed_player_id=target["id"], answer_id=answer["id"]),
+                                          "match_submitted")
+                guesser.wait("match_result", mark_result, started)
+                actor = guesser
+                if actor.game["state"] == "round_complete":
+                    guesser.wait("round_started", mark_round, started)
+    except Exception as e:
+        stats.error(f"room failed: {type(e).__name__}")
+    finally:
+        for bot in bots:
+            bot.disconnect()
+
+
+class ProcessMonitor(object):
+    """Samples CPU and RSS of a process from /proc"""
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.cpu = []
+        self.rss = []
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def _read(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+        return cpu_seconds, rss
+
+    def start(self):
+        if self.pid:
+            self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def run(self):
+        last_cpu, _ = self._read()
+        last_time = time.monotonic()
+        while not self._stop.wait(self.interval):
+            try:
+                cpu, rss = self._read()
+            except OSError:
+                return
+            now = time.monotonic()
+            self.cpu.append((cpu - last_cpu) / (now - last_time) * 100)
+            self.rss.append(rss)
+            last_cpu, last_time = cpu, now
+
+
+def spawn_server(port):
+    code = ("import eventlet; eventlet.monkey_patch(); from things_game.server import create_app; app = create_app(); "
+            f"app.extensions['socketio'].run(app, host='127.0.0.1', port={port})")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=root,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Server did not start listening")
+
+
+def _percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def report(stats: Stats, elapsed, monitor: ProcessMonitor):
+    print(f"{'event':>18} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for event, samples in sorted(stats.latencies.items()):
+        samples = sorted(samples)
+        print(f"{event:>18} {len(samples):>7} " + " ".join(f"{_percentile(samples, q) * 1e3:>7.1f}ms"
+                                                            for q in (0.5, 0.95, 0.99, 1.0)))
+    print(f"sent {stats.sent} events ({stats.sent / elapsed:.1f}/s), "
+          f"received {stats.received} ({stats.received / elapsed:.1f}/s) in {elapsed:.1f}s")
+    if monitor.cpu:
+        print(f"server cpu mean={statistics.mean(monitor.cpu):.0f}% max={max(monitor.cpu):.0f}%, "
+              f"rss max={max(monitor.rss) / 2**20:.1f}MB")
+    for reason, count in sorted(stats.errors.items()):
+        print(f"error x{count}: {reason}")
+
+
+def run(url, rooms, players, rounds, ramp_seconds, timeout, pid):
+    stats = Stats()
+    monitor = ProcessMonitor(pid)
+    monitor.start()
+    threads = [threading.Thread(target=play_room, args=(url, i, players, rounds, stats, timeout))
+               for i in range(rooms)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+        time.sleep(ramp_seconds / rooms)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    monitor.stop()
+    report(stats, elapsed, monitor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--ramp", type=float, default=1.0, help="seconds over which the rooms are started")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for any one reply")
+    parser.add_argument("--pid", type=int, default=0, help="server process to sample CPU and RSS from")
+    parser.add_argument("--spawn", action="store_true", help="start a local server on --port for the run")
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+    for name in ("socketio", "engineio"):
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+    process = None
+    url, pid = args.url, args.pid
+    if args.spawn:
+        process = spawn_server(args.port)
+        url, pid = f"http://127.0.0.1:{args.port}", process.pid
+    try:
+        run(url, args.rooms, args.players, args.rounds, args.ramp, args.timeout, pid)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Measures get_game latency from many threads while prune sweeps a large number of games, for the split locking in
+GameManager and for the previous single global lock.
+
+    python -m benchmarks.manager_contention
+"""
+import random
+import statistics
+import threading
+import time
+from threading import Lock
+
+from things_game.logic import ThingsGame
+from things_game.manager import GameManager
+
+
+class _GlobalLockManager(GameManager):
+    """The previous scheme: every call takes one lock and prune holds it for the whole sweep"""
+    def __init__(self):
+        super(_GlobalLockManager, self).__init__()
+        self.lock = Lock()
+
+    def get_game(self, game_id):
+        with self.lock:
+            return super(_GlobalLockManager, self).get_game(game_id)
+
+    def prune(self, stale_time_seconds=15*60):
+        with self.lock:
+            return super(_GlobalLockManager, self).prune(stale_time_seconds)
+
+
+def populate(manager: GameManager, games, stale_fraction=0.5):
+    now = time.time()
+    for i in range(games):
+        game = ThingsGame(f"game {i}", game_id=f"G{i}")
+        player = game.add_player("player", is_observer=False)
+        if i < games * stale_fraction:
+            game.last_update_time = now - 3600
+        manager.store.add(game)
+        manager.update_player_sid(game.id, player.id, f"sid{i}")
+    return [f"G{i}" for i in range(games)]
+
+
+def run_case(manager_cls, games=20000, readers=4):
+    manager = manager_cls()
+    game_ids = populate(manager, games)
+    stop = threading.Event()
+    latencies = [[] for _ in range(readers)]
+
+    def reader(samples):
+        rng = random.Random()
+        while not stop.is_set():
+            game_id = rng.choice(game_ids)
+            start = time.perf_counter()
+            manager.get_game(game_id)
+            samples.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=reader, args=(latencies[i],)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    prune_start = time.perf_counter()
+    removed = manager.prune()
+    prune_time = time.perf_counter() - prune_start
+    time.sleep(0.2)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    samples = sorted(s for thread_samples in latencies for s in thread_samples)
+    p99 = samples[int(len(samples) * 0.99)]
+    print(f"{manager_cls.__name__:>20} removed={len(removed):>6} prune={prune_time * 1e3:>8.1f}ms "
+          f"lookups={len(samples):>8} median={statistics.median(samples) * 1e6:>6.1f}us "
+          f"p99={p99 * 1e6:>8.1f}us max={samples[-1] * 1e3:>8.1f}ms")
+
+
+def run():
+    for manager_cls in (_GlobalLockManager, GameManager):
+        run_case(manager_cls)
+
+
+if __name__ == "__main__":
+    run()
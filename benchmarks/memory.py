@@ -0,0 +1,58 @@
+"""
+Reports the memory held per live game, including players, answers and cached serialized state, for the game models
+with __slots__ and for the same models with a __dict__ per instance as they had before.
+
+    python -m benchmarks.memory
+"""
+import gc
+import tracemalloc
+from contextlib import contextmanager
+
+from benchmarks.serialization import build_game
+from things_game import logic
+
+_MODELS = ("Player", "Answer", "GameInfo", "ThingsGame")
+
+
+@contextmanager
+def _without_slots():
+    """Swaps in copies of the models without __slots__, the game logic creates those while this is active"""
+    originals = {name: getattr(logic, name) for name in _MODELS}
+    for name, cls in originals.items():
+        namespace = {k: v for k, v in vars(cls).items() if k != "__slots__" and k not in cls.__slots__}
+        setattr(logic, name, type(name, cls.__bases__, namespace))
+    try:
+        yield
+    finally:
+        for name, cls in originals.items():
+            setattr(logic, name, cls)
+
+
+def bytes_per_game(participants, games=200, published=False):
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    live = [build_game(participants, logic.ThingsGame) for _ in range(games)]
+    if published:
+        for game in live:
+            game.publish_patch()
+    gc.collect()
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (end - start) / len(live)
+
+
+def run():
+    print(f"{'participants':>12} {'models dict/slots':>20} {'published dict/slots':>22}  (bytes/game)")
+    for participants in (3, 20, 200):
+        games = max(20, 2000 // participants)
+        with _without_slots():
+            dict_models = bytes_per_game(participants, games)
+            dict_published = bytes_per_game(participants, games, published=True)
+        models = bytes_per_game(participants, games)
+        published = bytes_per_game(participants, games, published=True)
+        print(f"{participants:>12} {dict_models:>10.0f} /{models:>8.0f} {dict_published:>12.0f} /{published:>8.0f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,245 @@
+"""
+Micro-benchmarks for the hot paths in things_game.logic and GameManager. Every case runs for each room size and
+number of live games, the per-room cases spread their samples over that many resident games. Results are written as
+JSON so runs from two commits can be compared.
+
+    python -m benchmarks.micro --output before.json
+    python -m benchmarks.micro --output after.json --compare before.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+from things_game.logic import GameState, ThingsGame
+from things_game.manager import GameManager
+
+
+ROOM_SIZES = (3, 10, 50)
+LIVE_GAMES = (1, 1000)
+
+# name -> (generator function, whether it runs against a batch of `live_games` rooms)
+CASES = {}
+
+
+def case(name, per_room=True):
+    def register(func):
+        CASES[name] = (func, per_room)
+        return func
+    return register
+
+
+def _room(room_size, state=GameState.not_started):
+    """A game with `room_size` players advanced to `state` by playing it normally"""
+    game = ThingsGame("bench")
+    players = [game.add_player(f"player {i}", is_observer=False) for i in range(room_size)]
+    if state == GameState.not_started:
+        return game, players
+    game.start_game(players[0].id, players[0].session_key)
+    if state == GameState.writing_topic:
+        return game, players
+    writer = game.info.topic_writer
+    game.set_topic(writer.id, writer.session_key, "things you find in a kitchen")
+    if state == GameState.writing_answers:
+        return game, players
+    for i, p in enumerate(players):
+        game.submit_answer(p.id, p.session_key, f"answer {i}")
+    while state == GameState.round_complete and game.info.state == GameState.matching:
+        guesser, target_answer = _correct_guess(game)
+        game.validate_match(guesser.id, guesser.session_key, target_answer.id, target_answer.player.id)
+        game.finalize_match(guesser.id, target_answer.id, target_answer.id)
+    return game, players
+
+
+def _correct_guess(game: ThingsGame):
+    guesser = game.info.guesser
+    target = next(p for p in game.info.get_guessers() if p is not guesser)
+    return guesser, game.info.find_player_answer(target)
+
+
+def _rooms(room_size, live_games, state=GameState.not_started):
+    while True:
+        for game, players in [_room(room_size, state) for _ in range(live_games)]:
+            yield game, players
+
+
+@case("ThingsGame.add_player")
+def add_player(room_size, live_games):
+    for game, _ in _rooms(room_size, live_games):
+        joined = []
+        yield lambda: joined.append(game.add_player("joiner", is_observer=False))
+        # Outside the timing, every sample joins a room of exactly room_size players whether or not rooms are reused
+        for player in joined:
+            game.drop_player(player.id)
+
+
+@case("ThingsGame.submit_answer")
+def submit_answer(room_size, live_games):
+    # The first answer of the round, the last one would also start matching
+    for game, players in _rooms(room_size, live_games, GameState.writing_answers):
+        player = players[0]
+        yield lambda: game.submit_answer(player.id, player.session_key, "an answer")
+
+
+@case("ThingsGame.start_matching")
+def start_matching(room_size, live_games):
+    for game, players in _rooms(room_size, live_games, GameState.writing_answers):
+        for i, p in enumerate(players[:-1]):
+            game.submit_answer(p.id, p.session_key, f"answer {i}")
+        yield game.start_matching
+
+
+@case("ThingsGame.validate_match+finalize_match")
+def validate_and_finalize_match(room_size, live_games):
+    for game, _ in _rooms(room_size, live_games, GameState.matching):
+        guesser, answer = _correct_guess(game)
+
+        def match():
+            game.validate_match(guesser.id, guesser.session_key, answer.id, answer.player.id)
+            game.finalize_match(guesser.id, answer.id, answer.id)
+        yield match
+
+
+def _remove_player_case(state):
+    def remove_player(room_size, live_games):
+        for game, players in _rooms(room_size, live_games, state):
+            # Neither the owner nor the current guesser, to keep the path the same for every room size
+            player = next(p for p in reversed(players) if p is not game.info.guesser)
+            yield lambda: game._remove_player(player)
+    return remove_player
+
+
+for _state in (GameState.not_started, GameState.writing_topic, GameState.writing_answers, GameState.matching,
+               GameState.round_complete):
+    case(f"ThingsGame._remove_player[{_state.value}]")(_remove_player_case(_state))
+
+
+@case("GameInfo.to_dict")
+def game_info_to_dict(room_size, live_games):
+    for game, _ in _rooms(room_size, live_games, GameState.matching):
+        yield game.info.to_dict
+
+
+def _manager(room_size, live_games):
+    manager = GameManager()
+    games = []
+    for i in range(live_games):
+        game, players = _room(room_size)
+        manager.store.add(game)
+        for player in players:
+            manager.update_player_sid(game.id, player.id, f"sid {game.id} {player.id}")
+        games.append(game)
+    return manager, games
+
+
+@case("GameManager.create_game", per_room=False)
+def create_game(room_size, live_games):
+    manager, _ = _manager(room_size, live_games)
+    while True:
+        yield lambda: manager.create_game("bench", "", "")
+
+
+@case("GameManager.prune", per_room=False)
+def prune(room_size, live_games):
+    # Half the games are stale on every sweep, the pruned ones are put back before the next
+    manager, games = _manager(room_size, live_games)
+    while True:
+        now = time.time()
+        for i, game in enumerate(games):
+            game.last_update_time = now - 3600 if i % 2 == 0 else now
+            manager.store.add(game)
+        yield manager.prune
+
+
+def measure(func, room_size, live_games, samples):
+    ops = func(room_size, live_games)
+    timings = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(samples):
+            op = next(ops)
+            t_start = time.perf_counter()
+            op()
+            timings.append(time.perf_counter() - t_start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    timings.sort()
+    return {
+        "samples": len(timings),
+        "min_us": timings[0] * 1e6,
+        "median_us": statistics.median(timings) * 1e6,
+        "mean_us": statistics.mean(timings) * 1e6,
+        "p95_us": timings[int(len(timings) * 0.95)] * 1e6,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.realpath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run(room_sizes=ROOM_SIZES, live_games=LIVE_GAMES, samples=300, selected=None):
+    results = {}
+    for name, (func, per_room) in CASES.items():
+        if selected and not any(s in name for s in selected):
+            continue
+        for room_size in room_sizes:
+            for games in live_games:
+                key = f"{name}[room={room_size},games={games}]"
+                # Per-room cases consume a fresh room per sample, keep the expensive manager cases short
+                results[key] = measure(func, room_size, games, samples if per_room else max(samples // 10, 5))
+                print(f"{key:<70} median={results[key]['median_us']:>10.2f}us p95={results[key]['p95_us']:>10.2f}us")
+    return {
+        "meta": {
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "samples": samples,
+        },
+        "results": results,
+    }
+
+
+def compare(old, new, threshold=0.1):
+    print(f"\ncompared with {old['meta']['commit'] or 'previous run'}:")
+    for key, result in new["results"].items():
+        before = old["results"].get(key)
+        if not before:
+            continue
+        ratio = result["median_us"] / before["median_us"]
+        flag = "slower" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else ""
+        print(f"{key:<70} {before['median_us']:>10.2f}us -> {result['median_us']:>10.2f}us {ratio:>6.2f}x {flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--room-sizes", default=",".join(map(str, ROOM_SIZES)))
+    parser.add_argument("--live-games", default=",".join(map(str, LIVE_GAMES)))
+    parser.add_argument("--samples", type=int, default=300)
+    parser.add_argument("--only", action="append", help="run only cases whose name contains this, can be repeated")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    report = run([int(s) for s in args.room_sizes.split(",")], [int(s) for s in args.live_games.split(",")],
+                 args.samples, args.only)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Measures the cost of journaling games, writing a snapshot and recovering from disk.
+
+    python -m benchmarks.persistence [games]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.serialization import build_game
+from things_game.persistence import GameJournal
+
+
+def run(games=10000):
+    live = [build_game(3) for _ in range(games)]
+    # build_game reuses the same name, give every game its own id
+    for i, game in enumerate(live):
+        game.info.game_id = f"G{i}"
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal = GameJournal(directory)
+        journal.start()
+        t_start = time.perf_counter()
+        for game in live:
+            journal.put(game)
+        t_put = time.perf_counter() - t_start
+        # Once a game has been written, a put only serializes again the members that changed since
+        t_change_start = time.perf_counter()
+        for game in live:
+            game.info.players.first().score += 1
+            journal.put(game)
+        t_put_change = time.perf_counter() - t_change_start
+        journal.stop(timeout=None)
+        t_drain = time.perf_counter() - t_start
+        journal_size = os.path.getsize(journal.journal_path)
+
+        # Folds the journal written above into a snapshot, stop waits for the writer thread to finish it
+        journal = GameJournal(directory)
+        journal.start()
+        t_start = time.perf_counter()
+        journal.snapshot()
+        journal.stop(timeout=None)
+        t_snapshot = time.perf_counter() - t_start
+        snapshot_size = os.path.getsize(journal.snapshot_path)
+
+        t_start = time.perf_counter()
+        recovered = GameJournal(directory).recover(budget_seconds=float("inf"))
+        t_recover = time.perf_counter() - t_start
+
+    print(f"games:                 {games}")
+    print(f"put on caller thread:  {t_put * 1e6 / games:.1f}us/game ({t_put * 1e3:.0f}ms total)")
+    print(f"put after a change:    {t_put_change * 1e6 / games:.1f}us/game ({t_put_change * 1e3:.0f}ms total)")
+    print(f"journal written after: {t_drain * 1e3:.0f}ms ({journal_size / 1e6:.1f}MB)")
+    print(f"snapshot write:        {t_snapshot * 1e3:.0f}ms ({snapshot_size / 1e6:.1f}MB)")
+    print(f"recovery:              {t_recover * 1e3:.0f}ms ({len(recovered)} games)")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
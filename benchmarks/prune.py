@@ -0,0 +1,65 @@
+"""
+Measures how long one prune takes as the number of live games grows while the number that expire stays the same,
+for the expiry index in GameStore and for the previous sweep over every game.
+
+    python -m benchmarks.prune
+"""
+import statistics
+import time
+
+from things_game.logic import ThingsGame
+from things_game.manager import GameManager
+
+
+class _SweepingManager(GameManager):
+    """The previous prune: look at every game on every run"""
+    def prune(self, stale_time_seconds=15*60):
+        games_to_remove = {}
+        now = time.time()
+        for game in self.store.games():
+            if not self._is_stale(game, now, stale_time_seconds):
+                continue
+            removed = self.store.remove_if(game.id, lambda g: self._is_stale(g, now, stale_time_seconds))
+            if removed:
+                games_to_remove[game.id] = list(self.store.pop_sids(game.id))
+        return games_to_remove
+
+
+def populate(manager: GameManager, games, spacing):
+    """Games last updated `spacing` seconds apart, the oldest first"""
+    start = time.time() - games * spacing
+    for i in range(games):
+        game = ThingsGame(f"game {i}", game_id=f"G{i}")
+        player = game.add_player("player", is_observer=False)
+        game.last_update_time = start + i * spacing
+        manager.store.add(game)
+        manager.update_player_sid(game.id, player.id, f"sid{i}")
+    return start
+
+
+def run_case(manager_cls, games, expiring=10, runs=20):
+    # Every run moves the cutoff forward by `expiring` games, as if that much time had passed since the last one
+    spacing = 0.001
+    manager = manager_cls()
+    start = populate(manager, games, spacing)
+    # Games that may have been emptied are checked once after they change, adding them all counts as that change
+    manager.prune(stale_time_seconds=time.time() - start + spacing)
+    timings = []
+    removed = 0
+    for run in range(1, runs + 1):
+        cutoff = start + run * expiring * spacing - spacing / 2
+        t_start = time.perf_counter()
+        removed += len(manager.prune(stale_time_seconds=time.time() - cutoff))
+        timings.append(time.perf_counter() - t_start)
+    print(f"{manager_cls.__name__:>18} games={games:>7} removed={removed:>4} "
+          f"median={statistics.median(timings) * 1e3:>8.3f}ms max={max(timings) * 1e3:>8.3f}ms")
+
+
+def run():
+    for games in (100, 1000, 10000, 100000):
+        for manager_cls in (_SweepingManager, GameManager):
+            run_case(manager_cls, games)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,325 @@
+"""
+Replays a capture recorded with THINGS_GAME_CAPTURE_DIR and reports throughput and per event latency.
+
+By default events go straight to a GameManager the way the server handlers would apply them, --socketio sends them
+through the real Flask-SocketIO handlers with one test client per recorded connection instead. Steps the server
+schedules for later (finishing a match, starting the next round) run on the same timeline as the recorded events, at
+the delay the server uses.
+
+The game's random generator is seeded from the capture, so ids, shuffles and topic writers come out as they did live
+as long as the draws happen in the same order: replay captures of a server started without recovered games, and expect
+some divergence past the first prune.
+
+    python -m benchmarks.replay CAPTURE [--socketio] [--speed 0]
+"""
+import argparse
+import heapq
+import itertools
+import json
+import os
+import statistics
+import time
+from collections import defaultdict
+
+from things_game.capture import read_capture
+from things_game.errors import GameStateError, PlayerError, InputError
+from things_game.logic import GameState, ThingsGame
+from things_game.manager import GameManager
+from things_game.rate_limit import DEFAULT_LIMITS
+from things_game.server import MATCH_RESULT_DELAY_S, NEXT_ROUND_DELAY_S, ROUND_COMPLETE_DELAY_S
+from things_game.topics import TopicLibrary
+from things_game.utils import rand
+
+
+class Timeline(object):
+    """Recorded events merged with the steps scheduled while replaying them, in time order"""
+    def __init__(self, events, speed):
+        self.events = events
+        self.speed = speed
+        self.now = 0.0
+        self._scheduled = []
+        self._counter = itertools.count()
+
+    def schedule(self, delay, action, *args, **kwargs):
+        """Same signature as BackgroundTaskScheduler.run_in"""
+        heapq.heappush(self._scheduled, (self.now + delay, next(self._counter), action, args, kwargs))
+
+    def __iter__(self):
+        """Yields (sid, event, data) for recorded events, and (None, name, call) for scheduled steps"""
+        t_start = time.perf_counter()
+        events = iter(self.events)
+        event = next(events, None)
+        while event is not None or self._scheduled:
+            if self._scheduled and (event is None or self._scheduled[0][0] <= event[0]):
+                at, _, action, args, kwargs = heapq.heappop(self._scheduled)
+                # The server wraps its steps, as in _run_scheduled(game_id, finalize), name them after the step
+                step = next((arg for arg in reversed(args) if callable(arg)), action)
+                item = (None, getattr(step, "__name__", "scheduled"), lambda: action(*args, **kwargs))
+            else:
+                at, sid, name, _, data = event
+                item = (sid, name, data)
+                event = next(events, None)
+            self.now = max(self.now, at)
+            if self.speed:
+                delay = t_start + self.now / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield item
+
+
+class _MissingGame(Exception):
+    pass
+
+
+class DirectTarget(object):
+    """Applies recorded events to a GameManager like the server handlers do, without Flask-SocketIO"""
+    def __init__(self, timeline: Timeline):
+        self.timeline = timeline
+        self.manager = GameManager()
+        self.topics = TopicLibrary()
+        # Recorded session keys are redacted, replayed players use their own
+        self.session_keys = {}
+
+    def handle(self, sid, event, data):
+        handler = getattr(self, f"on_{event}", None)
+        if handler is None:
+            return False
+        handler(data if isinstance(data, dict) else {})
+        return True
+
+    def _game(self, data) -> ThingsGame:
+        game = self.manager.get_game(data.get("game_id", ""))
+        if game is None:
+            raise _MissingGame(data.get("game_id", ""))
+        return game
+
+    def _player(self, data):
+        player_id = data.get("player_id", "")
+        return player_id, self.session_keys.get(player_id, "")
+
+    @staticmethod
+    def _publish(game: ThingsGame):
+        patch = game.publish_patch()
+        if patch:
+            json.dumps({"patch": patch})
+
+    def _added(self, game: ThingsGame, data):
+        player = game.add_player(data.get("player_name", "Unknown"), data.get("observer", False),
+                                 data.get("color", "blue"))
+        self.session_keys[player.id] = player.session_key
+        self._publish(game)
+        json.dumps({"game": game.snapshot()})
+
+    def _removed(self, game: ThingsGame, initial_state):
+        self._publish(game)
+        if initial_state != game.info.state and game.info.state == GameState.round_complete:
+            game.start_round()
+            self._publish(game)
+
+    def on_create_game(self, data):
+        game = self.manager.create_game(data.get("name", ""), data.get("password", ""), data.get("salt", ""))
+        self._added(game, data)
+
+    def on_join_game(self, data):
+        game = self._game(data)
+        if game.password != data.get("password", ""):
+            raise InputError("Incorrect password")
+        self._added(game, data)
+
+    def on_leave_game(self, data):
+        game = self._game(data)
+        initial_state = game.info.state
+        game.remove_player(*self._player(data))
+        self._removed(game, initial_state)
+
+    def on_remove_player(self, data):
+        game = self._game(data)
+        initial_state = game.info.state
+        game.force_remove_player(*self._player(data), data.get("player_id_to_remove", ""))
+        self._removed(game, initial_state)
+
+    def on_change_color(self, data):
+        self._game(data).change_color(*self._player(data), data.get("color", ""))
+
+    def on_start_game(self, data):
+        game = self._game(data)
+        game.start_game(*self._player(data))
+        self._publish(game)
+
+    def on_reset_points(self, data):
+        game = self._game(data)
+        game.reset_points(*self._player(data))
+        self._publish(game)
+
+    def on_set_topic(self, data):
+        game = self._game(data)
+        game.set_topic(*self._player(data), data.get("topic", ""))
+        self._publish(game)
+
+    def on_skip_topic_writer(self, data):
+        game = self._game(data)
+        game.skip_topic_writer(*self._player(data))
+        self._publish(game)
+
+    def on_submit_answer(self, data):
+        game = self._game(data)
+        game.submit_answer(*self._player(data), data.get("answer", ""))
+        self._publish(game)
+
+    def on_submit_match(self, data):
+        game = self._game(data)
+        player_id, session_key = self._player(data)
+        player, guessed_answer, guessed_player_answer = game.validate_match(
+            player_id, session_key, data.get("answer_id", ""), data.get("guessed_player_id", ""))
+        json.dumps({"player": player.to_dict(), "guessed_answer": guessed_answer.to_dict(),
+                    "guessed_player": guessed_player_answer.player.to_dict()})
+        self.timeline.schedule(MATCH_RESULT_DELAY_S, self.finalize, game.id, player_id, guessed_answer.id, guessed_player_answer.id)
+
+    def finalize(self, game_id, player_id, *answer_ids):
+        game = self.manager.get_game(game_id)
+        if game is None:
+            return
+        result = game.finalize_match(player_id, *answer_ids)
+        self._publish(game)
+        if result and game.info.state == GameState.round_complete:
+            self.timeline.schedule(ROUND_COMPLETE_DELAY_S + NEXT_ROUND_DELAY_S, self.round_started, game_id)
+
+    def round_started(self, game_id):
+        game = self.manager.get_game(game_id)
+        if game is not None:
+            game.start_round()
+            self._publish(game)
+
+    def on_request_update(self, data):
+        game = self._game(data)
+        game.validate_player(*self._player(data), can_be_observer=True)
+        self._publish(game)
+        json.dumps({"game": game.snapshot()})
+
+    def on_get_random_topic(self, data):
+        # Kept so the topic draws take their turn on the random generator
+        game_id = data.get("game_id", "")
+        game = self.manager.get_game(game_id)
+        if game is None:
+            game_id = ""
+        else:
+            game.validate_player(*self._player(data))
+        self.topics.get_random_topic(game_id, data.get("pack", ""))
+
+
+class SocketIOTarget(object):
+    """Sends recorded events through the server's handlers, one Flask-SocketIO test client per recorded sid"""
+    drain_every = 100
+
+    def __init__(self, timeline: Timeline):
+        from things_game.config import Config
+        from things_game.server import create_app
+        # Replayed clients send as fast as the replay goes, and the log would measure the disk
+        config = Config.from_env(rate_limits={event: (0, 0) for event in DEFAULT_LIMITS},
+                                 log_level=os.getenv("THINGS_GAME_LOG_LEVEL", "WARNING"))
+        self.app = create_app(config)
+        self.socketio = self.app.extensions["socketio"]
+        self.state = self.app.extensions["things_game"]
+        self.state.start()
+        self.timeline = timeline
+        # Steps the handlers schedule run on the replay's timeline instead of the background thread
+        self.state.scheduler.run_in = self._schedule
+        self.clients = {}
+        self.session_keys = {}
+        self._handled = 0
+
+    def _schedule(self, delay, task, *args, **kwargs):
+        self.timeline.schedule(delay, self._run_task, task, *args, **kwargs)
+
+    def _run_task(self, task, *args, **kwargs):
+        self.state.run_task(task, args, kwargs)
+
+    def _client(self, sid):
+        client = self.clients.get(sid)
+        if client is None:
+            client = self.clients[sid] = self.socketio.test_client(self.app)
+        return client
+
+    def _drain(self, client):
+        for message in client.get_received():
+            if message["name"] == "player_id":
+                ids = message["args"][0]
+                self.session_keys[ids["player_id"]] = ids["session_key"]
+
+    def handle(self, sid, event, data):
+        if event == "connect":
+            self._client(sid)
+            return True
+        if event == "disconnect":
+            client = self.clients.pop(sid, None)
+            if client is not None:
+                client.disconnect()
+            return True
+        client = self._client(sid)
+        if isinstance(data, dict) and "session_key" in data:
+            data = dict(data, session_key=self.session_keys.get(data.get("player_id", ""), ""))
+        if data is None:
+            client.emit(event)
+        else:
+            client.emit(event, data)
+        self._drain(client)
+        self._handled += 1
+        if self._handled % self.drain_every == 0:
+            for other in self.clients.values():
+                self._drain(other)
+        return True
+
+
+def replay(path, socketio=False, speed=0.0):
+    header, events = read_capture(path)
+    # Seeded before the manager is created, like the server does when capturing
+    rand.seed(header["seed"])
+    timeline = Timeline(events, speed)
+    target = (SocketIOTarget if socketio else DirectTarget)(timeline)
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    missing = defaultdict(int)
+    skipped = defaultdict(int)
+    t_start = time.perf_counter()
+    for sid, event, data in timeline:
+        t_event = time.perf_counter()
+        try:
+            if sid is None:
+                data()
+                event = f"({event})"
+            elif not target.handle(sid, event, data):
+                skipped[event] += 1
+                continue
+        except (GameStateError, PlayerError, InputError):
+            errors[event] += 1
+        except _MissingGame:
+            missing[event] += 1
+        latencies[event].append(time.perf_counter() - t_event)
+    elapsed = time.perf_counter() - t_start
+
+    handled = sum(len(timings) for timings in latencies.values())
+    print(f"{path}: {len(events)} events recorded over {events[-1][0] if events else 0:.1f}s, replayed "
+          f"{handled} (including scheduled steps) in {elapsed:.2f}s, {handled / elapsed if elapsed else 0:.0f}/s")
+    print(f"{'event':>22} {'count':>7} {'errors':>7} {'missing':>7} {'p50':>9} {'p99':>9} {'max':>9}")
+    for event, timings in sorted(latencies.items(), key=lambda item: -sum(item[1])):
+        timings.sort()
+        print(f"{event:>22} {len(timings):>7} {errors[event]:>7} {missing[event]:>7} "
+              f"{statistics.median(timings) * 1e6:>7.0f}us {timings[int(len(timings) * 0.99)] * 1e6:>7.0f}us "
+              f"{timings[-1] * 1e6:>7.0f}us")
+    if skipped:
+        print("not replayed: " + ", ".join(f"{event} x{count}" for event, count in sorted(skipped.items())))
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="capture file written by a server with THINGS_GAME_CAPTURE_DIR set")
+    parser.add_argument("--socketio", action="store_true", help="go through the Flask-SocketIO handlers")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="1 replays at the recorded pace, 2 twice as fast, 0 (default) as fast as possible")
+    args = parser.parse_args()
+    replay(args.capture, args.socketio, args.speed)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,68 @@
+"""
+Compares the reflective utils.to_dict with the Serializer field plans, with every player and answer changed since
+the last call or none of them (each caches its own serialized form), and the per-revision cache in ThingsGame.
+
+    python -m benchmarks.serialization
+"""
+import timeit
+
+from things_game.logic import ThingsGame, GameState, Player, Answer, GameInfo
+from things_game.utils import to_dict
+
+
+def _legacy_player(player: Player):
+    return to_dict(player, omit="session_key")
+
+
+def _legacy_answer(answer: Answer):
+    return to_dict(answer, None if answer.matched else "player", replace=dict(player=_legacy_player(answer.player)))
+
+
+def _legacy_game_info(info: GameInfo):
+    # Mirrors the recursive to_dict calls the models made before they had Serializers
+    replace = dict(players=[_legacy_player(p) for p in info.players],
+                   observers=[_legacy_player(p) for p in info.observers],
+                   topic_writer=_legacy_player(info.topic_writer) if info.topic_writer else None,
+                   guesser=_legacy_player(info.guesser) if info.guesser else None,
+                   answers=[])
+    if info.state in [GameState.matching, GameState.round_complete]:
+        replace["answers"] = [_legacy_answer(a) for a in info.answers]
+    return to_dict(info, replace=replace)
+
+
+def build_game(participants, game_cls=ThingsGame):
+    game = game_cls("bench")
+    players = [game.add_player(f"player {i}", is_observer=False) for i in range(participants)]
+    game.start_game(players[0].id, players[0].session_key)
+    for p in players:
+        if p.is_topic_writer:
+            game.set_topic(p.id, p.session_key, "things you find in a kitchen")
+    for i, p in enumerate(players):
+        game.submit_answer(p.id, p.session_key, f"answer {i}")
+    return game
+
+
+def _touch_all(info: GameInfo):
+    # Setting any attribute drops the entity's cached serialized form
+    for p in info.players:
+        p.score = p.score
+    for a in info.answers:
+        a.matched = a.matched
+
+
+def run(number=200):
+    print(f"{'participants':>12} {'to_dict':>12} {'all changed':>12} {'none changed':>12} {'cached':>12}")
+    for participants in (3, 20, 200):
+        game = build_game(participants)
+        assert _legacy_game_info(game.info) == game.info.to_dict() == game.to_dict()
+        legacy = timeit.timeit(lambda: _legacy_game_info(game.info), number=number) / number
+        touch = timeit.timeit(lambda: _touch_all(game.info), number=number) / number
+        changed = timeit.timeit(lambda: (_touch_all(game.info), game.info.to_dict()), number=number) / number - touch
+        unchanged = timeit.timeit(lambda: game.info.to_dict(), number=number) / number
+        cached = timeit.timeit(lambda: game.to_dict(), number=number) / number
+        print(f"{participants:>12} {legacy * 1e6:>10.1f}us {changed * 1e6:>10.1f}us {unchanged * 1e6:>10.1f}us "
+              f"{cached * 1e6:>10.1f}us")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,70 @@
+"""
+Measures how long readers take to get a game's snapshot and lobby entry from many threads while a writer keeps
+changing and publishing a large game, reading the published GameSnapshot and for reads taken under the game's lock.
+
+    python -m benchmarks.snapshots
+"""
+import statistics
+import threading
+import time
+
+from things_game.lobby import lobby_entry
+from things_game.logic import ThingsGame
+
+
+def _published_read(game: ThingsGame):
+    return game.snapshot(), lobby_entry(game)
+
+
+def _locked_read(game: ThingsGame):
+    """Reads consistent only by holding the lock, waiting out whatever mutation or publish is running"""
+    with game.lock:
+        return dict(game.snapshot()), {"state": game.info.state.value, "players": len(game.info.players),
+                                       "observers": len(game.info.observers)}
+
+
+def run_case(read, players=200, readers=4, duration=1.0):
+    game = ThingsGame("benchmark", game_id="BENCH")
+    for i in range(players):
+        game.add_player(f"player {i}", is_observer=False)
+    game.publish_patch()
+    stop = threading.Event()
+    latencies = [[] for _ in range(readers)]
+    publishes = [0]
+
+    def writer():
+        while not stop.is_set():
+            player = game.add_player("newcomer", is_observer=False)
+            game.publish_patch()
+            game.drop_player(player.id)
+            game.publish_patch()
+            publishes[0] += 2
+
+    def reader(samples):
+        while not stop.is_set():
+            start = time.perf_counter()
+            read(game)
+            samples.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(latencies[i],)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    samples = sorted(s for thread_samples in latencies for s in thread_samples)
+    p99 = samples[int(len(samples) * 0.99)]
+    print(f"{read.__name__:>16} publishes={publishes[0]:>6} reads={len(samples):>8} "
+          f"median={statistics.median(samples) * 1e6:>6.1f}us p99={p99 * 1e6:>8.1f}us max={samples[-1] * 1e3:>6.1f}ms")
+
+
+def run():
+    for read in (_locked_read, _published_read):
+        run_case(read)
+
+
+if __name__ == "__main__":
+    run()
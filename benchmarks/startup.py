@@ -0,0 +1,64 @@
+"""
+Measures how long a fresh interpreter takes to import the game logic, import the server, create an app, start it and
+handle a first connection, the steps a test run, a tool or a new worker goes through.
+
+    python -m benchmarks.startup [--samples 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Runs in a new interpreter for every sample, so nothing is already imported or cached
+_CHILD = r"""
+import json, time
+t = [time.perf_counter()]
+import things_game.logic
+t.append(time.perf_counter())
+from things_game.server import create_app
+from things_game.config import Config
+t.append(time.perf_counter())
+app = create_app(Config.from_env(log_level="WARNING"))
+t.append(time.perf_counter())
+app.extensions["things_game"].start()
+t.append(time.perf_counter())
+client = app.extensions["socketio"].test_client(app)
+client.emit("get_games", {})
+t.append(time.perf_counter())
+print(json.dumps([b - a for a, b in zip(t, t[1:])]))
+"""
+STEPS = ["import things_game.logic", "import things_game.server", "create_app", "start", "first event"]
+
+
+def run_sample(root):
+    t_start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", _CHILD], cwd=root, check=True, capture_output=True,
+                            env=dict(os.environ, PYTHONWARNINGS="ignore")).stdout
+    total = time.perf_counter() - t_start
+    return json.loads(output.decode().strip().splitlines()[-1]), total
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=10)
+    args = parser.parse_args()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    steps = [[] for _ in STEPS]
+    totals = []
+    for _ in range(args.samples):
+        timings, total = run_sample(root)
+        for step, timing in zip(steps, timings):
+            step.append(timing)
+        totals.append(total)
+    print(f"{'step':>26} {'median':>9} {'max':>9}")
+    for name, timings in zip(STEPS, steps):
+        print(f"{name:>26} {statistics.median(timings) * 1000:>7.1f}ms {max(timings) * 1000:>7.1f}ms")
+    print(f"{'process, end to end':>26} {statistics.median(totals) * 1000:>7.1f}ms {max(totals) * 1000:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    run()
@@ -14,7 +14,20 @@ import 'material-design-icons-iconfont/dist/material-design-icons.css';
 import './assets/css/global.css';
 
 
-const connection = io.connect("http://" + window.location.host);
+// Behind shard-per-core workers nginx routes on these: the game the client is in, or a random key until it has one
+const connection = io.connect("http://" + window.location.host, {
+  query: {game_id: store.state.gameId || "", shard_key: Math.random().toString(36).slice(2)}
+});
+// The game lives on another worker: reconnect there and send the event again, once per game
+let redirectedTo = "";
+connection.on("wrong_shard", ({game_id, event, data}) => {
+  if (redirectedTo === game_id)
+    return;
+  redirectedTo = game_id;
+  connection.io.opts.query = {game_id: game_id, shard_key: connection.io.opts.query.shard_key};
+  connection.once("connect", () => connection.emit(event, data));
+  connection.disconnect().connect();
+});
 
 Vue.config.productionTip = false;
 
@@ -7,6 +7,40 @@ Vue.use(Vuex);
 
 function inFifteenMinutes() { return new Date(new Date().getTime() + 15 * 60 * 1000);}
 
+const COLLECTIONS = ["players", "observers", "answers"];
+
+// Applies a versioned patch from the server (see things_game/delta.py). Snapshots replace the game outright, patches
+// are only applied on top of the version they were built from, otherwise a fresh snapshot is requested.
+function updateGame(state, message) {
+  if (message.game) {
+    state.game = message.game;
+    state.gameId = message.game.game_id;
+    state.needsUpdate = false;
+    return;
+  }
+  const patch = message.patch;
+  if (!patch || !state.game || patch.version <= state.game.version)
+    return;
+  if (patch.base_version !== state.game.version) {
+    state.needsUpdate = true;
+    return;
+  }
+  const game = Object.assign({}, state.game, patch.fields || {}, {version: patch.version});
+  for (const name of COLLECTIONS) {
+    const diff = patch[name];
+    if (!diff)
+      continue;
+    const byId = {};
+    for (const item of state.game[name])
+      byId[item.id] = item;
+    for (const [id, changes] of Object.entries(diff.changed || {}))
+      byId[id] = Object.assign({}, byId[id], changes);
+    const order = diff.order || state.game[name].map(item => item.id);
+    game[name] = order.map(id => byId[id]);
+  }
+  state.game = game;
+}
+
 
 export default new Vuex.Store({
   plugins: [createPersistedState({
@@ -23,6 +57,7 @@ export default new Vuex.Store({
     playerId: '',
     sessionKey: '',
     game: null,
+    needsUpdate: false,
     error: null,
     message: '',
     color: '',
@@ -77,14 +112,13 @@ export default new Vuex.Store({
     },
 
     SOCKET_player_joined(state, message) {
-      state.game = message.game;
-      state.gameId = message.game.game_id;
+      updateGame(state, message);
       if (state.playerId !== message.player.id)
         state.message = message.player.name + " joined the game";
     },
 
     SOCKET_player_left(state, message) {
-      state.game = message.game;
+      updateGame(state, message);
       state.message = message.player.name + " left the game";
     },
 
@@ -101,7 +135,7 @@ export default new Vuex.Store({
       else {
         state.message = message.player.name + " has been removed from the game";
       }
-      state.game = message.game;
+      updateGame(state, message);
     },
 
     SOCKET_player_id(state, message) {
@@ -110,27 +144,35 @@ export default new Vuex.Store({
     },
 
     SOCKET_game_started(state, message) {
-      state.game = message.game;
+      updateGame(state, message);
       state.message = "Game has started!"
     },
 
     SOCKET_round_started(state, message) {
-      state.game = message.game;
+      updateGame(state, message);
       state.message = "Next round has started!"
     },
 
     SOCKET_topic_set(state, message) {
-      state.game = message.game;
+      updateGame(state, message);
       state.message = "Topic has been set!"
     },
 
     SOCKET_answer_submitted(state, message) {
-      state.game = message.game;
+      updateGame(state, message);
     },
 
     SOCKET_match_result(state, message) {
       console.log("Got match result");
-      state.game = message.game;
+      updateGame(state, message);
+    },
+
+    SOCKET_topic_writer_skipped(state, message) {
+      updateGame(state, message);
+    },
+
+    SOCKET_game_patch(state, message) {
+      updateGame(state, message);
     },
 
     SOCKET_error(state, message) {
@@ -147,13 +189,13 @@ export default new Vuex.Store({
         state.error = '';
       }
       else {
-        state.game = message.game;
+        updateGame(state, message);
       }
     },
 
     SOCKET_points_reset(state, message) {
       state.message = "Points have been reset! New game in progress";
-      state.game = message.game
+      updateGame(state, message);
     },
 
     setUsername(state, username) {
@@ -0,0 +1,8 @@
+# Loaded by gunicorn from the working directory. wsgi:app only loads the word id and topic lists when it is imported,
+# so it can be preloaded in the master and shared by every worker
+
+
+def post_worker_init(worker):
+    # After the fork, so the scheduler, log and journal threads, the store and recovered games belong to the worker.
+    # Started before the worker accepts connections, the first client doesn't wait for them
+    worker.wsgi.extensions["things_game"].start()
@@ -0,0 +1,65 @@
+import threading
+import unittest
+
+from things_game.background_scheduler import BackgroundTaskScheduler
+
+
+class BackgroundTaskSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = BackgroundTaskScheduler()
+        self.scheduler.start()
+        self.addCleanup(self.scheduler.stop)
+
+    def test_runs_in_deadline_order(self):
+        ran = []
+        done = threading.Event()
+        self.scheduler.run_in(0.06, lambda: (ran.append("last"), done.set()))
+        self.scheduler.run_in(0.02, ran.append, "first")
+        self.scheduler.run_in(0.04, ran.append, "second")
+        self.assertTrue(done.wait(2))
+        self.assertEqual(ran, ["first", "second", "last"])
+
+    def test_cancelled_task_never_runs(self):
+        ran = []
+        done = threading.Event()
+        task = self.scheduler.run_in(0.02, ran.append, "cancelled")
+        self.scheduler.run_in(0.04, done.set)
+        self.assertEqual(self.scheduler.queue_depth, 2)
+        task.cancel()
+        task.cancel()
+        self.assertEqual(self.scheduler.queue_depth, 1)
+        self.assertTrue(done.wait(2))
+        self.assertEqual(ran, [])
+
+    def test_cancelled_tasks_are_compacted(self):
+        tasks = [self.scheduler.run_in(60, lambda: None) for _ in range(10)]
+        for task in tasks[:6]:
+            task.cancel()
+        self.assertEqual(self.scheduler.queue_depth, 4)
+        self.assertEqual(len(self.scheduler.tasks), 4)
+
+    def test_periodic_task_requeues_until_cancelled(self):
+        runs = []
+        done = threading.Event()
+
+        def tick():
+            runs.append(1)
+            if len(runs) == 3:
+                task.cancel()
+                self.scheduler.run_in(0.05, done.set)
+
+        task = self.scheduler.run_every(0.01, tick)
+        self.assertTrue(done.wait(2))
+        self.assertEqual(len(runs), 3)
+        self.assertEqual(self.scheduler.queue_depth, 0)
+
+    def test_failing_task_does_not_stop_the_scheduler(self):
+        done = threading.Event()
+        with self.assertLogs("things_game.background_scheduler"):
+            self.scheduler.run_in(0, lambda: 1 / 0)
+            self.scheduler.run_in(0.01, done.set)
+            self.assertTrue(done.wait(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
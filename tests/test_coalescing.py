@@ -0,0 +1,65 @@
+import unittest
+
+from things_game.coalescing import BroadcastCoalescer
+
+
+class ManualScheduler(object):
+    def __init__(self):
+        self.tasks = []
+
+    def run_in(self, delay, task, *args):
+        self.tasks.append((delay, task, args))
+
+    def run_all(self):
+        tasks, self.tasks = self.tasks, []
+        for _, task, args in tasks:
+            task(*args)
+
+
+class BroadcastCoalescerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = ManualScheduler()
+        self.flushed = []
+        self.coalescer = BroadcastCoalescer(self.scheduler, 0.05,
+                                            lambda room, updates: self.flushed.append((room, updates)))
+
+    def test_updates_within_the_window_go_out_once(self):
+        self.assertFalse(self.coalescer.defer("GAME", "game_update"))
+        self.assertTrue(self.coalescer.defer("GAME", "game_update"))
+        self.assertTrue(self.coalescer.defer("GAME", "answer_submitted"))
+        self.assertEqual([delay for delay, _, _ in self.scheduler.tasks], [0.05])
+        self.assertEqual(len(self.coalescer), 1)
+
+        self.scheduler.run_all()
+        self.assertEqual(self.flushed, [("GAME", [("answer_submitted", None)])])
+        self.assertEqual(len(self.coalescer), 0)
+
+    def test_rooms_are_flushed_separately(self):
+        self.coalescer.defer("GAME", "game_update")
+        self.coalescer.defer("OTHER", "game_update")
+        self.scheduler.run_all()
+        self.assertEqual(sorted(room for room, _ in self.flushed), ["GAME", "OTHER"])
+
+    def test_every_player_payload_is_kept(self):
+        first, second = {"id": "first"}, {"id": "second"}
+        self.coalescer.defer("GAME", "game_update")
+        self.coalescer.defer("GAME", "player_left", first)
+        self.coalescer.defer("GAME", "game_update")
+        self.coalescer.defer("GAME", "player_left", second)
+        self.coalescer.defer("GAME", "game_update")
+        self.scheduler.run_all()
+        self.assertEqual(self.flushed, [("GAME", [
+            ("player_left", first), ("player_left", second), ("game_update", None),
+        ])])
+
+    def test_update_after_a_flush_starts_a_new_window(self):
+        self.coalescer.defer("GAME", "game_update")
+        self.scheduler.run_all()
+        self.assertFalse(self.coalescer.defer("GAME", "game_update"))
+        self.assertEqual(len(self.scheduler.tasks), 1)
+        self.scheduler.run_all()
+        self.assertEqual(len(self.flushed), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
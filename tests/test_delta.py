@@ -0,0 +1,69 @@
+import unittest
+
+from things_game.delta import apply_patch, diff_game
+from things_game.logic import GameState, ThingsGame
+
+
+class DiffGameTest(unittest.TestCase):
+    def test_unchanged_game_has_no_patch(self):
+        game = {"name": "game", "players": [{"id": "a", "score": 0}], "observers": [], "answers": []}
+        self.assertIsNone(diff_game(game, dict(game)))
+
+    def test_only_changes_are_sent(self):
+        old = {"name": "game", "state": "not_started",
+               "players": [{"id": "a", "score": 0, "name": "A"}, {"id": "b", "score": 0, "name": "B"}]}
+        new = {"name": "game", "state": "writing_topic",
+               "players": [{"id": "a", "score": 1, "name": "A"}, {"id": "b", "score": 0, "name": "B"}]}
+        patch = diff_game(old, new)
+        self.assertEqual(patch, {"fields": {"state": "writing_topic"}, "players": {"changed": {"a": {"score": 1}}}})
+        self.assertEqual(apply_patch(old, patch), new)
+
+    def test_order_is_sent_when_members_come_and_go(self):
+        old = {"players": [{"id": "a"}, {"id": "b"}]}
+        new = {"players": [{"id": "b"}, {"id": "c"}]}
+        patch = diff_game(old, new)
+        self.assertEqual(patch["players"], {"changed": {"c": {"id": "c"}}, "order": ["b", "c"]})
+        self.assertEqual(apply_patch(old, patch), new)
+
+
+class PatchRoundTripTest(unittest.TestCase):
+    def test_client_follows_a_whole_round(self):
+        game = ThingsGame("game")
+        client = dict(game.snapshot())
+
+        def publish():
+            patch = game.publish_patch()
+            if patch:
+                self.assertEqual(patch["base_version"], client["version"])
+                client.update(apply_patch(client, patch))
+            self.assertEqual(client, game.snapshot())
+
+        players = [game.add_player(f"player {i}", is_observer=False) for i in range(4)]
+        publish()
+        watcher = game.add_player("watcher", is_observer=True)
+        publish()
+        game.start_game(players[0].id, players[0].session_key)
+        publish()
+        writer = game.info.topic_writer
+        game.set_topic(writer.id, writer.session_key, "things")
+        publish()
+        for player in players:
+            game.submit_answer(player.id, player.session_key, f"answer of {player.name}")
+            publish()
+        while game.info.state == GameState.matching:
+            guesser = game.info.guesser
+            guessed = next(p for p in game.info.get_guessers() if p is not guesser)
+            answer = game.info.find_player_answer(guessed)
+            game.validate_match(guesser.id, guesser.session_key, answer.id, guessed.id)
+            game.finalize_match(guesser.id, answer.id, answer.id)
+            publish()
+        game.drop_player(watcher.id)
+        game.drop_player(players[-1].id)
+        publish()
+        game.start_round()
+        publish()
+        self.assertIsNone(game.publish_patch())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from things_game.expiry import ExpiryIndex
+from things_game.logic import ThingsGame
+
+
+def game_updated_at(name, update_time, players=2):
+    game = ThingsGame(name)
+    for i in range(players):
+        game.add_player(f"player {i}", is_observer=False)
+    game.last_update_time = update_time
+    return game
+
+
+class ExpiryIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = ExpiryIndex()
+
+    def test_returns_games_updated_before_the_cutoff(self):
+        games = [game_updated_at(f"game {i}", 100 + i) for i in range(5)]
+        for game in games:
+            self.index.touch(game)
+        self.assertEqual(sorted(self.index.expired(102)), sorted(g.id for g in games[:3]))
+        self.assertEqual(sorted(self.index.expired(102)), sorted(g.id for g in games[:3]))
+        self.assertEqual(len(self.index), 5)
+
+    def test_touch_moves_the_game_later(self):
+        game = game_updated_at("game", 100)
+        self.index.touch(game)
+        game.last_update_time = 200
+        self.index.touch(game)
+        self.assertEqual(self.index.expired(150), [])
+        self.assertEqual(self.index.expired(200), [game.id])
+
+    def test_direct_updates_are_noticed(self):
+        game = game_updated_at("game", 100)
+        self.index.touch(game)
+        game.last_update_time = 200
+        self.assertEqual(self.index.expired(150), [])
+        self.assertEqual(self.index.expired(250), [game.id])
+
+    def test_discarded_games_are_forgotten(self):
+        game = game_updated_at("game", 100)
+        self.index.touch(game)
+        self.index.discard(game.id)
+        self.assertEqual(self.index.expired(150), [])
+        self.assertEqual(len(self.index), 0)
+
+    def test_games_left_with_one_player_are_returned_once(self):
+        game = game_updated_at("game", 100, players=1)
+        self.index.touch(game)
+        self.assertEqual(self.index.expired(50), [game.id])
+        self.assertEqual(self.index.expired(50), [])
+
+    def test_heap_is_rebuilt(self):
+        game = game_updated_at("game", 100)
+        for update_time in range(100, 200):
+            game.last_update_time = update_time
+            self.index.touch(game)
+        self.assertLess(len(self.index._heap), 100)
+        self.assertEqual(self.index.expired(198), [])
+        self.assertEqual(self.index.expired(199), [game.id])
+
+
+if __name__ == "__main__":
+    unittest.main()
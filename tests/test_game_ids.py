@@ -0,0 +1,70 @@
+import unittest
+
+import fakeredis
+
+from things_game.game_ids import FALLBACK_ID_LENGTH, GameIdPool, RedisGameIdPool
+
+WORDS = ["APPLE", "BREAD", "CHAIR", "DANCE", "EAGLE"]
+
+
+class GameIdPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = GameIdPool(WORDS)
+
+    def test_every_word_is_handed_out_once(self):
+        game_ids = [self.pool.allocate() for _ in WORDS]
+        self.assertEqual(sorted(game_ids), WORDS)
+        self.assertEqual(len(self.pool), 0)
+
+    def test_falls_back_to_random_ids(self):
+        for _ in WORDS:
+            self.pool.allocate()
+        game_id = self.pool.allocate()
+        self.assertEqual(len(game_id), FALLBACK_ID_LENGTH)
+        self.pool.release(game_id)
+        self.assertEqual(len(self.pool), 0)
+
+    def test_released_ids_are_recycled(self):
+        game_ids = [self.pool.allocate() for _ in WORDS]
+        self.pool.release(game_ids[1])
+        self.pool.release(game_ids[1])
+        self.assertEqual(len(self.pool), 1)
+        self.assertEqual(self.pool.allocate(), game_ids[1])
+
+    def test_reserved_ids_are_not_handed_out(self):
+        self.pool.reserve_all(["BREAD", "EAGLE", "MISSING"])
+        self.assertEqual(len(self.pool), 3)
+        self.assertEqual(sorted(self.pool.allocate() for _ in range(3)), ["APPLE", "CHAIR", "DANCE"])
+        self.pool.release("EAGLE")
+        self.assertEqual(self.pool.allocate(), "EAGLE")
+
+    def test_only_owned_ids_are_handed_out(self):
+        pool = GameIdPool(WORDS, owns=lambda game_id: game_id[0] in "ABC")
+        self.assertEqual(sorted(pool.allocate() for _ in range(3)), ["APPLE", "BREAD", "CHAIR"])
+        for _ in range(5):
+            self.assertIn(pool.allocate()[0], "ABC")
+
+
+class RedisGameIdPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.redis.sadd("used", "CHAIR")
+        self.pool = RedisGameIdPool(self.redis, "free", "used", WORDS)
+
+    def test_used_ids_are_not_handed_out(self):
+        self.assertEqual(len(self.pool), 4)
+        self.assertEqual(sorted(self.pool.allocate() for _ in range(4)), ["APPLE", "BREAD", "DANCE", "EAGLE"])
+        self.assertEqual(len(self.pool.allocate()), FALLBACK_ID_LENGTH)
+
+    def test_ids_released_by_another_pool_are_recycled(self):
+        other = RedisGameIdPool(self.redis, "free", "used", WORDS)
+        self.pool.reserve_all(["APPLE", "BREAD", "DANCE"])
+        self.assertEqual(self.pool.allocate(), "EAGLE")
+        other.release("EAGLE")
+        other.release("NOT A WORD")
+        self.assertEqual(self.pool.allocate(), "EAGLE")
+        self.assertEqual(len(self.pool), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
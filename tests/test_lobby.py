@@ -0,0 +1,86 @@
+import unittest
+
+from things_game.errors import InputError
+from things_game.lobby import LobbyFilter, LobbyIndex
+from things_game.logic import ThingsGame
+
+
+def entry(game_id, create_time, players=3, state="not_started", password_protected=False):
+    return {"id": game_id, "name": game_id.lower(), "password_protected": password_protected, "password_salt": "",
+            "state": state, "players": players, "observers": 0, "create_time": create_time}
+
+
+class LobbyIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = LobbyIndex()
+        self.index.sync(entry(f"GAME{i}", 100.5 + i) for i in range(7))
+
+    def ids(self, page):
+        return [game["id"] for game in page["games"]]
+
+    def test_pages_newest_first(self):
+        page = self.index.page(limit=3)
+        self.assertEqual(self.ids(page), ["GAME6", "GAME5", "GAME4"])
+        self.assertEqual(page["total"], 7)
+        page = self.index.page(after=page["next"], limit=3)
+        self.assertEqual(self.ids(page), ["GAME3", "GAME2", "GAME1"])
+        page = self.index.page(after=page["next"], limit=3)
+        self.assertEqual(self.ids(page), ["GAME0"])
+        self.assertEqual(page["next"], "")
+
+    def test_pages_stay_stable_while_games_come_and_go(self):
+        page = self.index.page(limit=3)
+        self.index.remove("GAME3")
+        self.index.sync([entry("GAME7", 200)] + [entry(f"GAME{i}", 100.5 + i) for i in range(7) if i != 3])
+        page = self.index.page(after=page["next"], limit=3)
+        self.assertEqual(self.ids(page), ["GAME2", "GAME1", "GAME0"])
+
+    def test_filters(self):
+        self.index.sync([
+            entry("FULL", 1, players=8), entry("EMPTY", 2, players=1), entry("LOCKED", 3, password_protected=True),
+            entry("PLAYING", 4, state="writing_answers"),
+        ])
+        self.assertEqual(self.ids(self.index.page(LobbyFilter(min_players=2, max_players=4))), ["PLAYING", "LOCKED"])
+        self.assertEqual(self.ids(self.index.page(LobbyFilter(not_started=True, no_password=True))),
+                         ["EMPTY", "FULL"])
+
+    def test_filtered_page_cursor(self):
+        self.index.sync([entry(f"GAME{i}", 100.5 + i, players=i) for i in range(7)])
+        lobby_filter = LobbyFilter(min_players=2)
+        page = self.index.page(lobby_filter, limit=2)
+        self.assertEqual(self.ids(page), ["GAME6", "GAME5"])
+        page = self.index.page(lobby_filter, after=page["next"], limit=2)
+        self.assertEqual(self.ids(page), ["GAME4", "GAME3"])
+        page = self.index.page(lobby_filter, after=page["next"], limit=2)
+        self.assertEqual(self.ids(page), ["GAME2"])
+        self.assertEqual(page["next"], "")
+
+    def test_pages_are_cached_until_a_change(self):
+        page = self.index.page(limit=3)
+        self.assertIs(self.index.page(limit=3), page)
+        self.assertEqual(self.index.sync([entry(f"GAME{i}", 100.5 + i) for i in range(7)]), ([], []))
+        self.assertIs(self.index.page(limit=3), page)
+        self.index.remove("GAME6")
+        self.assertEqual(self.ids(self.index.page(limit=3)), ["GAME5", "GAME4", "GAME3"])
+
+    def test_sync_reports_changes(self):
+        changed, removed = self.index.sync([entry("GAME0", 100.5, players=4), entry("GAME1", 101.5)])
+        self.assertEqual([game["id"] for game in changed], ["GAME0"])
+        self.assertEqual(sorted(removed), ["GAME2", "GAME3", "GAME4", "GAME5", "GAME6"])
+        self.assertEqual(len(self.index), 2)
+
+    def test_update_from_game(self):
+        game = ThingsGame("game")
+        game.add_player("owner", is_observer=False)
+        game.publish_patch()
+        self.assertEqual(self.index.update(game)["players"], 1)
+        self.assertIsNone(self.index.update(game))
+        self.assertEqual(self.ids(self.index.page(limit=1)), [game.id])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InputError):
+            self.index.page(after="yesterday:GAME1")
+
+
+if __name__ == "__main__":
+    unittest.main()
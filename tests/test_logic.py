@@ -0,0 +1,71 @@
+import unittest
+
+from things_game.logic import GameState, PlayerState, ThingsGame
+
+
+class InactivePlayerTest(unittest.TestCase):
+    def setUp(self):
+        self.game = ThingsGame("game")
+        self.players = [self.game.add_player(f"player {i}", is_observer=False) for i in range(4)]
+        owner = self.players[0]
+        self.game.start_game(owner.id, owner.session_key)
+
+    def disconnect(self, player):
+        self.game.set_player_state(player.id, PlayerState.inactive)
+
+    def test_topic_writer_turn_is_passed_on(self):
+        writer = self.game.info.topic_writer
+        self.disconnect(writer)
+        self.assertIsNot(self.game.info.topic_writer, writer)
+        self.assertTrue(self.game.info.topic_writer.is_topic_writer)
+        self.assertFalse(writer.is_topic_writer)
+
+    def test_rotation_skips_inactive_players(self):
+        writer = self.game.info.topic_writer
+        skipped = self.game.info.next_player(writer)
+        self.disconnect(skipped)
+        for _ in range(len(self.players)):
+            self.game.info.next_topic_writer()
+            self.assertIsNot(self.game.info.topic_writer, skipped)
+
+    def test_answers_do_not_wait_for_inactive_players(self):
+        writer = self.game.info.topic_writer
+        self.game.set_topic(writer.id, writer.session_key, "things")
+        absent, *answering = self.players
+        self.disconnect(absent)
+        for player in answering:
+            self.game.submit_answer(player.id, player.session_key, f"answer of {player.name}")
+        self.assertEqual(self.game.info.state, GameState.matching)
+        self.assertIsNot(self.game.info.guesser, absent)
+
+        guesser = self.game.info.guesser
+        self.disconnect(guesser)
+        self.assertIsNot(self.game.info.guesser, guesser)
+        self.assertIsNot(self.game.info.guesser, absent)
+
+    def test_answers_wait_for_players_who_reconnect(self):
+        writer = self.game.info.topic_writer
+        self.game.set_topic(writer.id, writer.session_key, "things")
+        returning, *answering = self.players
+        self.disconnect(returning)
+        self.game.set_player_state(returning.id, PlayerState.active)
+        for player in answering:
+            self.game.submit_answer(player.id, player.session_key, f"answer of {player.name}")
+        self.assertEqual(self.game.info.state, GameState.writing_answers)
+
+        self.game.submit_answer(returning.id, returning.session_key, "late answer")
+        self.assertEqual(self.game.info.state, GameState.matching)
+
+    def test_answers_stop_waiting_for_players_who_leave(self):
+        writer = self.game.info.topic_writer
+        self.game.set_topic(writer.id, writer.session_key, "things")
+        leaving, *answering = self.players
+        for player in answering:
+            self.game.submit_answer(player.id, player.session_key, f"answer of {player.name}")
+        self.disconnect(leaving)
+        self.assertEqual(self.game.info.state, GameState.matching)
+        self.assertEqual(len(self.game.info.get_guessers()), len(answering))
+
+
+if __name__ == "__main__":
+    unittest.main()
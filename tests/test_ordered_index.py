@@ -0,0 +1,69 @@
+import unittest
+
+from things_game.ordered_index import OrderedIndex
+
+
+class Item(object):
+    def __init__(self, item_id):
+        self.id = item_id
+
+    def to_dict(self):
+        return {"id": self.id}
+
+
+class OrderedIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.items = [Item(i) for i in "abcd"]
+        self.index = OrderedIndex(self.items)
+
+    def test_keeps_insertion_order(self):
+        self.assertEqual(list(self.index), self.items)
+        self.assertEqual(self.index.first(), self.items[0])
+        self.assertEqual(self.index.to_dict(), [{"id": i} for i in "abcd"])
+
+    def test_lookup_and_membership(self):
+        self.assertIs(self.index.get("c"), self.items[2])
+        self.assertIsNone(self.index.get("z"))
+        self.assertIn(self.items[1], self.index)
+        self.assertNotIn(Item("b"), self.index)
+        self.assertNotIn(None, self.index)
+
+    def test_next_after_wraps_around(self):
+        a, b, c, d = self.items
+        self.assertIs(self.index.next_after(a), b)
+        self.assertIs(self.index.next_after(d), a)
+
+    def test_removal_relinks_the_ring(self):
+        a, b, c, d = self.items
+        self.index.remove(b)
+        self.assertIs(self.index.next_after(a), c)
+        self.index.discard(d)
+        self.index.discard(d)
+        self.assertIs(self.index.next_after(c), a)
+        self.assertEqual(list(self.index), [a, c])
+        with self.assertRaises(ValueError):
+            self.index.remove(b)
+
+    def test_last_item_links_to_itself(self):
+        a, b, c, d = self.items
+        for item in (b, c, d):
+            self.index.remove(item)
+        self.assertIs(self.index.next_after(a), a)
+        self.index.remove(a)
+        self.assertEqual(len(self.index), 0)
+        self.assertIsNone(self.index.first())
+        self.index.append(b)
+        self.assertIs(self.index.next_after(b), b)
+
+    def test_duplicate_ids_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.index.append(Item("a"))
+
+    def test_iteration_survives_removal(self):
+        for item in self.index:
+            self.index.remove(item)
+        self.assertEqual(len(self.index), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from things_game.config import Config
+from things_game.logic import GameState, ThingsGame
+from things_game.persistence import GameJournal
+from things_game.server import create_app
+
+
+def matching_game():
+    game = ThingsGame("game")
+    players = [game.add_player(f"player {i}", is_observer=False) for i in range(3)]
+    game.start_game(players[0].id, players[0].session_key)
+    writer = game.info.topic_writer
+    game.set_topic(writer.id, writer.session_key, "things")
+    for player in players:
+        game.submit_answer(player.id, player.session_key, f"answer of {player.name}")
+    return game
+
+
+def submit_correct_match(game: ThingsGame):
+    guesser = game.info.guesser
+    guessed = next(p for p in game.info.get_guessers() if p is not guesser)
+    answer = game.info.find_player_answer(guessed)
+    game.validate_match(guesser.id, guesser.session_key, answer.id, guessed.id)
+    return guesser, answer
+
+
+class RecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def journal(self, *games):
+        journal = GameJournal(self.directory)
+        journal.start()
+        for game in games:
+            journal.put(game)
+        journal.stop()
+
+    def test_round_trip(self):
+        game = matching_game()
+        self.journal(game)
+        [recovered] = GameJournal(self.directory).recover()
+        self.assertEqual(recovered.snapshot(), game.snapshot())
+        self.assertEqual(recovered.to_dict(), game.to_dict())
+
+    def test_pending_match_is_cancelled(self):
+        game = matching_game()
+        submit_correct_match(game)
+        self.assertTrue(game.matching)
+        self.journal(game)
+
+        [recovered] = GameJournal(self.directory).recover()
+        self.assertFalse(recovered.matching)
+        self.assertEqual(recovered.info.state, GameState.matching)
+        # The guesser can guess again, and the match goes through this time
+        guesser, answer = submit_correct_match(recovered)
+        self.assertTrue(recovered.finalize_match(guesser.id, answer.id, answer.id))
+
+    def test_round_complete_starts_next_round(self):
+        game = matching_game()
+        while game.info.state == GameState.matching:
+            guesser, answer = submit_correct_match(game)
+            game.finalize_match(guesser.id, answer.id, answer.id)
+        self.assertEqual(game.info.state, GameState.round_complete)
+        self.journal(game)
+
+        app = create_app(Config(data_dir=self.directory, log_filename=os.path.join(self.directory, "log")))
+        state = app.extensions["things_game"]
+        scheduled = []
+        state.scheduler.run_in = lambda delay, task, *args: scheduled.append((task, args))
+        state.start()
+        self.addCleanup(state.stop)
+
+        [(task, args)] = [(task, args) for task, args in scheduled if game.id in args]
+        self.assertEqual(state.manager.get_game(game.id).info.state, GameState.round_complete)
+        state.run_task(task, args, {})
+        self.assertEqual(state.manager.get_game(game.id).info.state, GameState.writing_topic)
+
+
+if __name__ == "__main__":
+    unittest.main()
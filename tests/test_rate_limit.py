@@ -0,0 +1,63 @@
+import unittest
+from unittest import mock
+
+from things_game.rate_limit import DEFAULT, DEFAULT_LIMITS, RateLimiter, parse_limits
+
+
+class RateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.patch("things_game.rate_limit.time")
+        clock.start().monotonic.side_effect = lambda: self.now
+        self.addCleanup(clock.stop)
+        self.limiter = RateLimiter({DEFAULT: (2.0, 3), "request_update": (1.0, 1), "submit_answer": (0, 0)})
+
+    def allowed(self, event, count, sid="client"):
+        return [self.limiter.allow(sid, event)[0] for _ in range(count)]
+
+    def test_burst_then_refill(self):
+        self.assertEqual(self.allowed("set_topic", 4), [True, True, True, False])
+        self.now += 0.5
+        self.assertEqual(self.allowed("set_topic", 2), [True, False])
+        self.now += 10
+        self.assertEqual(self.allowed("set_topic", 4), [True, True, True, False])
+
+    def test_only_the_first_dropped_event_is_reported(self):
+        self.assertEqual(self.limiter.allow("client", "request_update"), (True, False))
+        self.assertEqual(self.limiter.allow("client", "request_update"), (False, True))
+        self.assertEqual(self.limiter.allow("client", "request_update"), (False, False))
+        self.now += 1
+        self.assertEqual(self.limiter.allow("client", "request_update"), (True, False))
+        self.assertEqual(self.limiter.allow("client", "request_update"), (False, True))
+
+    def test_buckets_are_per_event_and_connection(self):
+        self.assertEqual(self.allowed("request_update", 2), [True, False])
+        self.assertEqual(self.allowed("set_topic", 1), [True])
+        self.assertEqual(self.allowed("request_update", 1, sid="other"), [True])
+
+    def test_rate_of_zero_is_unlimited(self):
+        self.assertTrue(all(self.allowed("submit_answer", 100)))
+
+    def test_counters(self):
+        self.allowed("request_update", 3)
+        self.assertEqual(self.limiter.counters(), {"client": {"allowed": 1, "dropped": 2}})
+        self.limiter.forget("client")
+        self.assertEqual(self.limiter.counters(), {})
+
+
+class ParseLimitsTest(unittest.TestCase):
+    def test_overrides_defaults(self):
+        limits = parse_limits(" *=5/10, submit_answer=0 ,get_games=3")
+        self.assertEqual(limits[DEFAULT], (5.0, 10))
+        self.assertEqual(limits["submit_answer"], (0.0, 1))
+        self.assertEqual(limits["get_games"], (3.0, 3))
+        self.assertEqual(limits["request_update"], DEFAULT_LIMITS["request_update"])
+        self.assertEqual(parse_limits(""), DEFAULT_LIMITS)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            parse_limits("request_update=fast")
+
+
+if __name__ == "__main__":
+    unittest.main()
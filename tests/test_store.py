@@ -0,0 +1,166 @@
+import unittest
+
+import fakeredis
+
+from things_game.errors import ConcurrentUpdateError
+from things_game.lobby import lobby_entry
+from things_game.logic import ThingsGame
+from things_game.manager import GameManager
+from things_game.store import RedisGameStore
+
+
+class RedisGameStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = RedisGameStore(client=fakeredis.FakeRedis(decode_responses=True))
+
+    def add_game(self, game_id="GAME"):
+        game = ThingsGame("game", game_id=game_id)
+        game.add_player("owner", is_observer=False)
+        game.publish_patch()
+        self.assertTrue(self.store.add(game))
+        return game
+
+    def test_add_and_get(self):
+        game = self.add_game()
+        copy = self.store.get(game.id)
+        self.assertIsNot(copy, game)
+        self.assertEqual(copy.snapshot(), game.snapshot())
+        self.assertEqual(copy.version, game.version)
+        self.assertIn(game.id, self.store)
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store.game_ids(), [game.id])
+        self.assertIsNone(self.store.get("MISSING"))
+
+    def test_add_taken_id(self):
+        self.add_game()
+        self.assertFalse(self.store.add(ThingsGame("other", game_id="GAME")))
+        self.assertEqual(self.store.get("GAME").info.name, "game")
+
+    def test_save(self):
+        game = self.add_game()
+        copy = self.store.get(game.id)
+        copy.add_player("second", is_observer=False)
+        copy.publish_patch()
+        self.store.save(copy)
+        stored = self.store.get(game.id)
+        self.assertEqual([p.name for p in stored.info.players], ["owner", "second"])
+        self.assertEqual(stored.version, copy.version)
+        # A copy saved again after more changes needs no reload
+        copy.add_player("third", is_observer=False)
+        self.store.save(copy)
+        self.assertEqual(len(self.store.get(game.id).info.players), 3)
+
+    def test_concurrent_save_conflicts(self):
+        game = self.add_game()
+        first = self.store.get(game.id)
+        second = self.store.get(game.id)
+        first.add_player("first", is_observer=False)
+        self.store.save(first)
+        second.add_player("second", is_observer=False)
+        with self.assertRaises(ConcurrentUpdateError):
+            self.store.save(second)
+        self.assertEqual([p.name for p in self.store.get(game.id).info.players], ["owner", "first"])
+        # The losing copy is never written, even if saved again
+        self.store.save(second)
+        self.assertEqual(len(self.store.get(game.id).info.players), 2)
+
+    def test_save_conflicts_with_write_during_transaction(self):
+        game = self.add_game()
+        copy = self.store.get(game.id)
+        copy.add_player("second", is_observer=False)
+        original_pipeline = self.store.redis.pipeline
+
+        def pipeline(*args, **kwargs):
+            pipe = original_pipeline(*args, **kwargs)
+            watched_hget = pipe.hget
+
+            def hget_then_write(*hget_args):
+                result = watched_hget(*hget_args)
+                # Another worker writes after WATCH, EXEC must fail
+                self.store.redis.hset(self.store._game_key(game.id), "state", "{}")
+                return result
+
+            pipe.hget = hget_then_write
+            return pipe
+
+        self.store.redis.pipeline = pipeline
+        with self.assertRaises(ConcurrentUpdateError):
+            self.store.save(copy)
+
+    def test_remove_if(self):
+        game = self.add_game()
+        self.assertIsNone(self.store.remove_if(game.id, lambda g: False))
+        removed = self.store.remove_if(game.id, lambda g: True)
+        self.assertEqual(removed.id, game.id)
+        self.assertNotIn(game.id, self.store)
+        self.assertEqual(self.store.expiry_candidates(float("inf")), [])
+
+    def test_lobby_entries(self):
+        game = self.add_game()
+        self.assertEqual(self.store.lobby_entries(), [lobby_entry(game)])
+        copy = self.store.get(game.id)
+        copy.add_player("second", is_observer=True)
+        copy.publish_patch()
+        self.store.save(copy)
+        [entry] = self.store.lobby_entries()
+        self.assertEqual((entry["players"], entry["observers"]), (1, 1))
+        self.store.remove_if(game.id, lambda g: True)
+        self.assertEqual(self.store.lobby_entries(), [])
+
+    def test_sid_index(self):
+        self.add_game("ONE")
+        self.add_game("TWO")
+        self.store.set_sid("ONE", "p1", "sid1")
+        self.store.set_sid("TWO", "p1", "sid1")
+        self.store.set_sid("ONE", "p2", "sid2")
+        self.assertEqual(self.store.get_sid("ONE", "p1"), "sid1")
+        self.assertEqual(self.store.get_sid("ONE", "missing"), "")
+
+        # Reconnecting with another sid moves the player off the old connection
+        self.store.set_sid("ONE", "p2", "sid3")
+        self.assertEqual(self.store.pop_connection("sid2"), [])
+        self.assertEqual(self.store.get_sid("ONE", "p2"), "sid3")
+
+        self.assertEqual(sorted(self.store.pop_connection("sid1")), [("ONE", "p1"), ("TWO", "p1")])
+        self.assertEqual(self.store.get_sid("ONE", "p1"), "")
+        self.assertEqual(self.store.pop_connection("sid1"), [])
+
+        self.assertEqual(self.store.pop_sid("ONE", "p2"), "sid3")
+        self.assertEqual(self.store.pop_sid("ONE", "p2"), "")
+        self.assertEqual(self.store.pop_connection("sid3"), [])
+
+    def test_pop_sids(self):
+        self.add_game()
+        self.store.set_sid("GAME", "p1", "sid1")
+        self.store.set_sid("GAME", "p2", "sid2")
+        self.assertEqual(self.store.pop_sids("GAME"), {"p1": "sid1", "p2": "sid2"})
+        self.assertEqual(self.store.pop_sids("GAME"), {})
+        self.assertEqual(self.store.pop_connection("sid1"), [])
+
+
+
+class RedisGameIdPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+
+    def worker(self):
+        store = RedisGameStore(client=self.redis)
+        return GameManager(store, store.game_id_pool(["IN", "USE"]))
+
+    def test_workers_share_free_ids(self):
+        self.worker().store.add(ThingsGame("taken", game_id="IN"))
+        first, second = self.worker(), self.worker()
+        self.assertEqual(len(first.game_ids), 1)
+
+        self.assertEqual(first.create_game("first", "", "").id, "USE")
+        # Every word is in use, the other worker falls back to random ids
+        self.assertNotIn(second.create_game("second", "", "").id, ("IN", "USE"))
+
+        # Pruned by the other worker, the id is free again for both
+        second.store.remove_if("USE", lambda g: True)
+        second.game_ids.release("USE")
+        self.assertEqual(first.create_game("again", "", "").id, "USE")
+
+
+if __name__ == "__main__":
+    unittest.main()
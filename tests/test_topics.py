@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from things_game.errors import InputError
+from things_game.topics import ShuffleBag, TopicLibrary
+
+
+class ShuffleBagTest(unittest.TestCase):
+    def test_draws_everything_once_per_cycle(self):
+        bag = ShuffleBag(50)
+        for _ in range(3):
+            self.assertEqual(sorted(bag.draw() for _ in range(50)), list(range(50)))
+            self.assertEqual(bag._moved, {})
+
+    def test_single_item(self):
+        bag = ShuffleBag(1)
+        self.assertEqual([bag.draw() for _ in range(3)], [0, 0, 0])
+
+
+class TopicLibraryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.default_file = self.write("default.txt", ["things in a fridge", "", "things you forget"])
+        self.library = TopicLibrary(self.default_file, os.path.join(self.directory, "packs"))
+
+    def write(self, filename, topics):
+        filename = os.path.join(self.directory, filename)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename + ".tmp", "w") as f:
+            f.write("\n".join(topics))
+        os.replace(filename + ".tmp", filename)
+        return filename
+
+    def test_games_see_every_topic_before_a_repeat(self):
+        topics = [self.library.get_random_topic("game") for _ in range(2)]
+        self.assertEqual(sorted(topics), ["things in a fridge", "things you forget"])
+        self.library.forget("game")
+        self.assertIn(self.library.get_random_topic("game"), topics)
+
+    def test_reload_picks_up_packs(self):
+        with self.assertRaises(InputError):
+            self.library.get_random_topic("game", "animals")
+        self.write("packs/animals.txt", ["things that bark"])
+        self.library.reload()
+        self.assertEqual(self.library.pack_sizes(), {"animals": 1, "default": 2})
+        self.assertEqual(self.library.get_random_topic("game", "animals"), "things that bark")
+
+        os.remove(os.path.join(self.directory, "packs", "animals.txt"))
+        self.library.reload()
+        self.assertEqual(self.library.pack_sizes(), {"default": 2})
+
+    def test_changed_pack_starts_a_new_bag(self):
+        self.library.get_random_topic("game")
+        pack = self.library.packs["default"]
+        self.write("default.txt", ["things that are new"])
+        os.utime(self.default_file, (pack.mtime + 10, pack.mtime + 10))
+        self.library.reload()
+        self.assertEqual(self.library.get_random_topic("game"), "things that are new")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +0,0 @@
-from things_game.server import app, socketio
-
-
-if __name__ == '__main__':
-    socketio.run(app, host='0.0.0.0', debug=True)
@@ -0,0 +1,14 @@
+import eventlet
+eventlet.monkey_patch()
+
+import os
+
+from things_game.server import create_app
+
+
+if __name__ == '__main__':
+    app = create_app()
+    # Debug mode serves from a child of the reloader, the watching parent must not recover or prune the games too
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        app.extensions["things_game"].start()
+    app.extensions["socketio"].run(app, host='0.0.0.0', debug=True)
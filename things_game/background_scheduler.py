@@ -1,6 +1,8 @@
+import heapq
+import itertools
 import threading
 import time
-from typing import List
+from typing import Callable, List, Optional
 import logging
 
 
@@ -8,104 +10,136 @@ logger = logging.getLogger(__name__)
 
 
 class _Task(object):
-    @property
-    def expired(self):
-        return NotImplementedError
-
-    @property
-    def should_remove(self):
-        return NotImplementedError
-
-    def execute(self):
-        return NotImplementedError
-
-
-class _SingleShotTask(_Task):
-    def __init__(self, scheduled_time, action, args, kwargs):
-        self.scheduled_time = scheduled_time
+    def __init__(self, scheduler, deadline, action, args, kwargs):
+        self._scheduler = scheduler
+        self.deadline = deadline
         self.action = action
         self.args = args
         self.kwargs = kwargs
-        self.executed = False
+        self.cancelled = False
 
     @property
-    def expired(self):
-        return time.time() >= self.scheduled_time
+    def reschedules(self):
+        return False
 
-    @property
-    def should_remove(self):
-        return self.executed
+    def cancel(self):
+        """Prevent the task from running again. Safe to call more than once or from inside the task"""
+        self._scheduler._cancel(self)
 
     def execute(self):
         self.action(*self.args, **self.kwargs)
-        self.executed = True
+
+
+class _SingleShotTask(_Task):
+    pass
 
 
 class _PeriodicTask(_Task):
-    def __init__(self, period, action, args, kwargs):
+    def __init__(self, scheduler, period, action, args, kwargs):
+        super(_PeriodicTask, self).__init__(scheduler, time.monotonic() + period, action, args, kwargs)
         self.period = period
-        self.action = action
-        self.args = args
-        self.kwargs = kwargs
-        self.last_run_time = time.time()
-        self.cancelled = False
 
     @property
-    def expired(self):
-        return (time.time() - self.last_run_time) > self.period
-
-    @property
-    def should_remove(self):
-        return self.cancelled
-
-    def execute(self):
-        self.last_run_time = time.time()
-        self.action(*self.args, **self.kwargs)
-
-    def cancel(self):
-        self.cancelled = True
+    def reschedules(self):
+        return not self.cancelled
 
 
 class BackgroundTaskScheduler(object):
-    def __init__(self, tick_interval=0.5):
+    """
+    Runs tasks on a single background thread, sleeping until the earliest deadline in a min-heap.
+
+    `run_in` and `run_every` return a handle with a `cancel()` method. Cancelled tasks are discarded lazily when they
+    reach the top of the heap, the heap is compacted if they make up most of it. `observe_lateness` is called with
+    how many seconds past its deadline each task started. `run_task`, if given, is called with each task's action,
+    args and kwargs to run it.
+    """
+    def __init__(self, observe_lateness: Optional[Callable[[float], None]] = None,
+                 run_task: Optional[Callable[[Callable, tuple, dict], None]] = None):
+        self.observe_lateness = observe_lateness
+        self.run_task = run_task
         self.thread = threading.Thread(target=self.run, daemon=True)
-        self.lock = threading.Lock()
-        self.tick_interval = tick_interval
-        self.tasks: List[_Task] = []
-        self.stop_event = threading.Event()
+        self.condition = threading.Condition()
+        self.tasks: List[tuple] = []
+        self.stopped = False
+        self._counter = itertools.count()
+        self._cancelled_count = 0
+
+    @property
+    def queue_depth(self):
+        """Number of tasks waiting to run, not counting cancelled ones"""
+        return max(0, len(self.tasks) - self._cancelled_count)
 
     def run_in(self, time_seconds, task, *args, **kwargs):
-        task = _SingleShotTask(time.time() + time_seconds, task, args, kwargs)
-        with self.lock:
-            self.tasks.append(task)
+        task = _SingleShotTask(self, time.monotonic() + time_seconds, task, args, kwargs)
+        self._push(task)
+        return task
 
     def run_every(self, time_seconds, task, *args, **kwargs):
-        task = _PeriodicTask(time_seconds, task, args, kwargs)
-        with self.lock:
-            self.tasks.append(task)
+        task = _PeriodicTask(self, time_seconds, task, args, kwargs)
+        self._push(task)
+        return task
+
+    def _push(self, task: _Task):
+        with self.condition:
+            # The counter breaks ties between equal deadlines so tasks are never compared directly
+            heapq.heappush(self.tasks, (task.deadline, next(self._counter), task))
+            if self.tasks[0][2] is task:
+                self.condition.notify()
+
+    def _cancel(self, task: _Task):
+        with self.condition:
+            if task.cancelled:
+                return
+            task.cancelled = True
+            self._cancelled_count += 1
+            if self._cancelled_count > len(self.tasks) // 2:
+                self.tasks = [entry for entry in self.tasks if not entry[2].cancelled]
+                heapq.heapify(self.tasks)
+                self._cancelled_count = 0
 
     def start(self):
         self.thread.start()
 
-    def stop(self):
-        self.stop_event.set()
-        self.thread.join(self.tick_interval*4)
+    def stop(self, timeout=2):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join(timeout)
+
+    def _next_due_task(self):
+        """Block until a task is due and pop it, returns None once stopped"""
+        with self.condition:
+            while not self.stopped:
+                if not self.tasks:
+                    self.condition.wait()
+                    continue
+                deadline, _, task = self.tasks[0]
+                if task.cancelled:
+                    heapq.heappop(self.tasks)
+                    self._cancelled_count = max(0, self._cancelled_count - 1)
+                    continue
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+                heapq.heappop(self.tasks)
+                return task
+            return None
 
     def run(self):
-        # Very primitive, could be made much better
-        while not self.stop_event.is_set():
-            time.sleep(self.tick_interval)
-            tasks_to_remove = []
-            with self.lock:
-                tasks_to_check = self.tasks[:]
-            for task in tasks_to_check:
-                if task.expired:
-                    try:
-                        task.execute()
-                    except Exception as e:
-                        logger.exception(e)
-                if task.should_remove:
-                    tasks_to_remove.append(task)
-            with self.lock:
-                for task in tasks_to_remove:
-                    self.tasks.remove(task)
+        while True:
+            task = self._next_due_task()
+            if task is None:
+                return
+            if self.observe_lateness:
+                self.observe_lateness(time.monotonic() - task.deadline)
+            try:
+                if self.run_task:
+                    self.run_task(task.action, task.args, task.kwargs)
+                else:
+                    task.execute()
+            except Exception as e:
+                logger.exception(e)
+            if task.reschedules:
+                task.deadline = max(task.deadline + task.period, time.monotonic())
+                self._push(task)
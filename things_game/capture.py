@@ -0,0 +1,89 @@
+import json
+import os
+import time
+from typing import List, Tuple
+import logging
+
+from things_game.utils import native_module
+
+_threading = native_module("threading")
+_queue = native_module("queue")
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_VERSION = 1
+# Secrets a replay doesn't need, it uses the session keys of the players it creates itself
+_REDACTED = ("session_key",)
+
+
+class TrafficRecorder(object):
+    """
+    Appends every inbound socket event to a capture file for `benchmarks.replay`.
+
+    The file starts with a JSON header holding the seed the game's random generator was given, followed by one
+    compact JSON array per event: [seconds since start, sid, event, game id, data]. Like GameJournal, `record` only
+    queues the event and a background OS thread does the writing.
+    """
+    def __init__(self, path, seed):
+        self.path = path
+        self.seed = seed
+        self.start_time = time.time()
+        self._start = time.monotonic()
+        self.queue = _queue.Queue()
+        self.thread = _threading.Thread(target=self.run, name="TrafficRecorder", daemon=True)
+        self._file = None
+
+    @classmethod
+    def in_directory(cls, directory, seed):
+        """A recorder writing a new file in `directory`, one per process so workers never share one"""
+        os.makedirs(directory, exist_ok=True)
+        filename = f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl"
+        return cls(os.path.join(directory, filename), seed)
+
+    def start(self):
+        self._file = open(self.path, "a", encoding="utf8")
+        header = {"version": CAPTURE_VERSION, "seed": self.seed, "start_time": self.start_time}
+        self._file.write(json.dumps(header) + "\n")
+        self.thread.start()
+
+    def stop(self, timeout=10):
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def record(self, sid, event, data):
+        game_id = data.get("game_id", "") if isinstance(data, dict) else ""
+        if isinstance(data, dict) and any(key in data for key in _REDACTED):
+            data = {k: "" if k in _REDACTED else v for k, v in data.items()}
+        self.queue.put((round(time.monotonic() - self._start, 4), sid, event, game_id, data))
+
+    def run(self):
+        running = True
+        while running:
+            items = [self.queue.get()]
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except _queue.Empty:
+                    break
+            lines = []
+            for item in items:
+                if item is None:
+                    running = False
+                else:
+                    lines.append(json.dumps(item, separators=(",", ":")))
+            try:
+                if lines:
+                    self._file.write("\n".join(lines) + "\n")
+                    self._file.flush()
+            except Exception as e:
+                logger.exception(e)
+        self._file.close()
+
+
+def read_capture(path) -> Tuple[dict, List[Tuple[float, str, str, str, object]]]:
+    """The header and events of a capture file"""
+    with open(path, "r", encoding="utf8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != CAPTURE_VERSION:
+            raise ValueError(f"Unsupported capture version {header.get('version')} in {path}")
+        return header, [tuple(json.loads(line)) for line in f if line.strip()]
@@ -0,0 +1,46 @@
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+from things_game.background_scheduler import BackgroundTaskScheduler
+
+
+class BroadcastCoalescer(object):
+    """
+    Holds back room updates so that everything a room gets within `window` seconds goes out as one.
+
+    The first `defer` for a room schedules `flush(room, updates)` for the end of the window, later ones within it only
+    add to the (event, player) updates that will be sent. Game updates are patches against the last published state,
+    so the first update sent at the end carries every change made during the window. An update without a player is
+    replaced by the next one, those with a player are all kept so clients hear about every player they name.
+    """
+    def __init__(self, scheduler: BackgroundTaskScheduler, window,
+                 flush: Callable[[str, List[Tuple[str, Optional[dict]]]], None]):
+        self.scheduler = scheduler
+        self.window = window
+        self.flush = flush
+        self.lock = Lock()
+        # room -> updates, oldest first, only the last may be without a player
+        self._pending: Dict[str, List[Tuple[str, Optional[dict]]]] = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def defer(self, room, event, player: Optional[dict] = None) -> bool:
+        """Returns True if the update joined one already waiting for the room"""
+        with self.lock:
+            updates = self._pending.get(room)
+            merged = updates is not None
+            if not merged:
+                updates = self._pending[room] = []
+            elif updates[-1][1] is None:
+                updates.pop()
+            updates.append((event, player))
+        if not merged:
+            self.scheduler.run_in(self.window, self._flush, room)
+        return merged
+
+    def _flush(self, room):
+        with self.lock:
+            updates = self._pending.pop(room, None)
+        if updates:
+            self.flush(room, updates)
@@ -0,0 +1,119 @@
+import os
+
+from things_game.rate_limit import DEFAULT_LIMITS, parse_limits
+from things_game.wire import JSON, MSGPACK, check_format
+
+
+def _flag(value):
+    return value not in ("", "0")
+
+
+def _list(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+# setting -> (environment variable, parser)
+_ENVIRONMENT = {
+    "log_level": ("THINGS_GAME_LOG_LEVEL", str),
+    "log_json": ("THINGS_GAME_LOG_JSON", _flag),
+    "log_expected_tracebacks": ("THINGS_GAME_LOG_EXPECTED_TRACEBACKS", _flag),
+    "log_repeat_burst": ("THINGS_GAME_LOG_REPEAT_BURST", int),
+    "redis_url": ("THINGS_GAME_REDIS_URL", str),
+    "message_queue": ("THINGS_GAME_MESSAGE_QUEUE", str),
+    "data_dir": ("THINGS_GAME_DATA_DIR", str),
+    "snapshot_interval_s": ("THINGS_GAME_SNAPSHOT_INTERVAL", int),
+    "recovery_budget_s": ("THINGS_GAME_RECOVERY_BUDGET", float),
+    "prune_interval_s": ("THINGS_GAME_PRUNE_INTERVAL", int),
+    "topic_packs_dir": ("THINGS_GAME_TOPIC_PACKS", str),
+    "payload_sample_every": ("THINGS_GAME_METRICS_PAYLOAD_SAMPLE", lambda value: max(1, int(value))),
+    "lobby_sync_interval_s": ("THINGS_GAME_LOBBY_SYNC_INTERVAL", int),
+    "coalesce_window_ms": ("THINGS_GAME_COALESCE_WINDOW_MS", float),
+    "msgpack_enabled": ("THINGS_GAME_MSGPACK", _flag),
+    "compression_threshold": ("THINGS_GAME_COMPRESSION_THRESHOLD", int),
+    "rate_limits": ("THINGS_GAME_RATE_LIMITS", parse_limits),
+    "reconnect_grace_s": ("THINGS_GAME_RECONNECT_GRACE", float),
+    "disconnect_action": ("THINGS_GAME_DISCONNECT_ACTION", str),
+    "capture_dir": ("THINGS_GAME_CAPTURE_DIR", str),
+    "admin_token": ("THINGS_GAME_ADMIN_TOKEN", str),
+    "secret_key": ("THINGS_GAME_SECRET_KEY", str),
+    "shards": ("THINGS_GAME_SHARDS", _list),
+    "shard": ("THINGS_GAME_SHARD", str),
+}
+
+
+class Config(object):
+    """
+    Settings for `server.create_app`. Anything not passed keeps the default below, `from_env` reads the
+    THINGS_GAME_* environment variables instead.
+    """
+    def __init__(self, **settings):
+        self.log_filename = os.path.join(os.path.expanduser("~"), "things_game.log")
+        self.log_level = "INFO"
+        self.log_json = False
+        # Player mistakes like a wrong password or an out of turn move are logged without a traceback unless this is set
+        self.log_expected_tracebacks = False
+        # Warnings and errors logged from the same line more often than this many per minute are dropped
+        self.log_repeat_burst = 10
+        # Setting a Redis URL keeps games in Redis and relays room broadcasts through it, so more than one worker can
+        # run. The message queue defaults to the same URL
+        self.redis_url = ""
+        self.message_queue = None
+        # Setting a data directory journals every game change to disk and recovers live games from it on startup
+        self.data_dir = ""
+        self.snapshot_interval_s = 5*60
+        self.recovery_budget_s = 10.0
+        self.prune_interval_s = 30
+        # Every .txt file in this directory is served as a topic pack named after the file, next to the default one
+        self.topic_packs_dir = ""
+        # Measuring the size of an update means encoding it a second time, so only one in this many is measured
+        self.payload_sample_every = 10
+        # With Redis other workers change games too, the lobby picks those up this often
+        self.lobby_sync_interval_s = 5
+        # Updates to a room within this many milliseconds are sent as one, 0 sends every update right away
+        self.coalesce_window_ms = 0.0
+        # Lets clients connect with ?wire=msgpack to get game payloads as MessagePack in the normalized schema. Every
+        # room broadcast is then encoded for both formats
+        self.msgpack_enabled = False
+        # Long-polling responses at least this large are compressed. Patches are mostly smaller and aren't worth the
+        # CPU, full snapshots are larger
+        self.compression_threshold = 2048
+        # Per connection token buckets, see rate_limit.parse_limits
+        self.rate_limits = dict(DEFAULT_LIMITS)
+        # A player whose connection closed has this long to reconnect before they are marked inactive, or removed
+        # from the game with disconnect_action "remove"
+        self.reconnect_grace_s = 30.0
+        self.disconnect_action = "inactive"
+        # Setting a directory records every inbound socket event there for benchmarks.replay. The game's random
+        # generator is seeded for the recording to be replayable, which makes game and player ids predictable
+        self.capture_dir = ""
+        # Bearer token for the admin routes (profiling), they are not served at all without one
+        self.admin_token = ""
+        self.secret_key = ""
+        # Shard-per-core mode: the host:port of every worker, in the same order as the nginx upstream generated by
+        # things_game.sharding, and this worker's own entry. Each worker only holds the games whose ids hash to it
+        self.shards = []
+        self.shard = ""
+
+        for name, value in settings.items():
+            if not hasattr(self, name):
+                raise TypeError(f"Unknown setting '{name}'")
+            setattr(self, name, value)
+        if self.message_queue is None:
+            self.message_queue = self.redis_url
+        if self.shards and self.shard not in self.shards:
+            raise ValueError(f"This worker's shard '{self.shard}' must be one of {', '.join(self.shards)}")
+        if self.shards and self.redis_url:
+            raise ValueError("Shard-per-core mode keeps games in each worker, it can't be combined with Redis")
+
+    @classmethod
+    def from_env(cls, environ=None, **settings):
+        """Settings from THINGS_GAME_* environment variables, `settings` take precedence"""
+        environ = os.environ if environ is None else environ
+        from_environ = {name: parse(environ[variable]) for name, (variable, parse) in _ENVIRONMENT.items()
+                        if variable in environ}
+        return cls(**dict(from_environ, **settings))
+
+    @property
+    def wire_formats(self):
+        """Formats clients can ask for, raises ValueError if msgpack is enabled without the package installed"""
+        return (JSON, check_format(MSGPACK)) if self.msgpack_enabled else (JSON,)
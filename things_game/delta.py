@@ -0,0 +1,73 @@
+from typing import Optional
+
+
+COLLECTIONS = ("players", "observers", "answers")
+
+_MISSING = object()
+
+
+def _changed(old_value, new_value):
+    # Unchanged players and answers serialize to the very same dict, no need to compare their contents
+    return old_value is not new_value and old_value != new_value
+
+
+def _diff_entity(old: dict, new: dict):
+    changed = {k: v for k, v in new.items() if _changed(old.get(k, _MISSING), v)}
+    changed.update({k: None for k in old if k not in new})
+    return changed
+
+
+def _diff_collection(old_items: list, new_items: list):
+    old_by_id = {item["id"]: item for item in old_items}
+    changed = {}
+    for item in new_items:
+        previous = old_by_id.get(item["id"])
+        if previous is None:
+            changed[item["id"]] = item
+        elif _changed(previous, item):
+            changed[item["id"]] = _diff_entity(previous, item)
+
+    diff = {}
+    if changed:
+        diff["changed"] = changed
+    new_order = [item["id"] for item in new_items]
+    if new_order != [item["id"] for item in old_items]:
+        diff["order"] = new_order
+    return diff
+
+
+def diff_game(old: dict, new: dict) -> Optional[dict]:
+    """
+    Build a patch turning serialized game `old` into `new`.
+
+    Scalar fields that changed go in "fields". Players, observers and answers are keyed by id: "changed" holds only the
+    modified members of each entity (the full entity if it is new) and "order" is only sent when ids were added, removed
+    or reordered. Returns None when nothing changed.
+    """
+    patch = {}
+    fields = {k: v for k, v in new.items() if k not in COLLECTIONS and _changed(old.get(k, _MISSING), v)}
+    if fields:
+        patch["fields"] = fields
+    for name in COLLECTIONS:
+        collection_diff = _diff_collection(old.get(name, []), new.get(name, []))
+        if collection_diff:
+            patch[name] = collection_diff
+    return patch or None
+
+
+def apply_patch(state: dict, patch: dict) -> dict:
+    """Apply a patch produced by `diff_game`, returning a new state dict"""
+    new_state = dict(state)
+    new_state.update(patch.get("fields", {}))
+    for name in COLLECTIONS:
+        collection_diff = patch.get(name)
+        if not collection_diff:
+            continue
+        by_id = {item["id"]: item for item in state.get(name, [])}
+        for item_id, changes in collection_diff.get("changed", {}).items():
+            by_id[item_id] = dict(by_id.get(item_id, {}), **changes)
+        order = collection_diff.get("order", [item["id"] for item in state.get(name, [])])
+        new_state[name] = [by_id[item_id] for item_id in order]
+    if "version" in patch:
+        new_state["version"] = patch["version"]
+    return new_state
@@ -9,3 +9,7 @@ class PlayerError(BaseException):
 
 class InputError(BaseException):
     pass
+
+
+class ConcurrentUpdateError(BaseException):
+    pass
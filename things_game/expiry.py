@@ -0,0 +1,60 @@
+import heapq
+from typing import Dict, List, Set, Tuple
+
+from things_game.logic import ThingsGame
+
+
+class ExpiryIndex(object):
+    """
+    Orders games by last update so the ones that went stale can be found without looking at the others.
+
+    Every `touch` pushes a (last update, id) entry on a min-heap and entries made obsolete by a later touch are skipped
+    when they surface, so touching is O(log n) and finding k expired games is O(k log n). The heap is rebuilt once
+    obsolete entries make up most of it.
+
+    A game that lost its last player is stale no matter when it was updated, so games touched with at most one player
+    since the last `expired` call are returned too. A single change removes at most one player, and the touch comes
+    before it.
+    """
+    def __init__(self):
+        self._games: Dict[str, ThingsGame] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._touched: Set[str] = set()
+
+    def __len__(self):
+        return len(self._games)
+
+    def touch(self, game: ThingsGame):
+        self._games[game.id] = game
+        if len(game.info.players) <= 1:
+            self._touched.add(game.id)
+        heapq.heappush(self._heap, (game.last_update_time, game.id))
+        if len(self._heap) > 2 * len(self._games) + 64:
+            self._heap = [(g.last_update_time, game_id) for game_id, g in self._games.items()]
+            heapq.heapify(self._heap)
+
+    def discard(self, game_id):
+        self._games.pop(game_id, None)
+        self._touched.discard(game_id)
+
+    def expired(self, cutoff) -> List[str]:
+        """Ids of games last updated at or before `cutoff` or that may have been emptied, they stay indexed"""
+        candidates = set(game_id for game_id in self._touched if game_id in self._games)
+        self._touched.clear()
+        expired = set()
+        while self._heap and self._heap[0][0] <= cutoff:
+            update_time, game_id = heapq.heappop(self._heap)
+            game = self._games.get(game_id)
+            if game is None or game_id in expired:
+                continue
+            if game.last_update_time != update_time:
+                # Normally a later touch left another entry, but file it under its real time in case it was changed
+                # directly. Duplicates are dropped when the heap is rebuilt
+                heapq.heappush(self._heap, (game.last_update_time, game_id))
+                continue
+            expired.add(game_id)
+        # Kept in the heap until discarded, in case the caller decides not to remove them after all
+        for game_id in expired:
+            heapq.heappush(self._heap, (self._games[game_id].last_update_time, game_id))
+        candidates.update(expired)
+        return list(candidates)
@@ -0,0 +1,117 @@
+import os
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional
+
+from things_game.utils import generate_id, rand
+
+
+WORD_LIST_FILE = os.path.join(os.path.dirname(__file__), "word_id_list.txt")
+# Longer than any word so fallback ids can never collide with one
+FALLBACK_ID_LENGTH = 8
+
+
+def load_word_ids(filename=WORD_LIST_FILE) -> List[str]:
+    with open(filename, "r") as f:
+        return [line.strip().upper() for line in f if line.strip()]
+
+
+class GameIdPool(object):
+    """
+    Hands out word game ids without repeats, in O(1).
+
+    The free words are kept shuffled in a list with each word's position alongside, so allocating pops the last one
+    and releasing or reserving a word is a swap with the end. Released words go to a random position to keep the
+    order unpredictable. Once every word is in use, ids fall back to random letters longer than any word. With `owns`,
+    only ids it accepts are handed out, e.g. those that hash to this worker's shard.
+    """
+    def __init__(self, words: Iterable[str] = None, owns: Optional[Callable[[str], bool]] = None):
+        self.lock = Lock()
+        self.owns = owns
+        self._free: List[str] = [word for word in (load_word_ids() if words is None else words)
+                                 if owns is None or owns(word)]
+        rand.shuffle(self._free)
+        self._words = frozenset(self._free)
+        self._positions: Dict[str, int] = {word: i for i, word in enumerate(self._free)}
+
+    def __len__(self):
+        return len(self._free)
+
+    def allocate(self):
+        with self.lock:
+            if not self._free:
+                while True:
+                    game_id = generate_id(FALLBACK_ID_LENGTH)
+                    if self.owns is None or self.owns(game_id):
+                        return game_id
+            word = self._free.pop()
+            del self._positions[word]
+            return word
+
+    def release(self, game_id):
+        """Return the id of a removed game to the pool, fallback ids are simply forgotten"""
+        with self.lock:
+            if game_id not in self._words or game_id in self._positions:
+                return
+            position = rand.randrange(len(self._free) + 1)
+            self._free.append(game_id)
+            self._positions[game_id] = len(self._free) - 1
+            self._swap(position, len(self._free) - 1)
+
+    def reserve_all(self, game_ids: Iterable[str]):
+        for game_id in game_ids:
+            self.reserve(game_id)
+
+    def reserve(self, game_id):
+        """Take an id out of the pool that is in use without having been allocated, e.g. by a recovered game"""
+        with self.lock:
+            position = self._positions.pop(game_id, None)
+            if position is None:
+                return
+            last = self._free.pop()
+            if last != game_id:
+                self._free[position] = last
+                self._positions[last] = position
+
+    def _swap(self, i, j):
+        self._free[i], self._free[j] = self._free[j], self._free[i]
+        self._positions[self._free[i]] = i
+        self._positions[self._free[j]] = j
+
+
+class RedisGameIdPool(object):
+    """
+    A GameIdPool shared by every worker keeping games in the same Redis, so an id released by the worker that pruned
+    its game can be handed out by any other. The free words are a Redis set, popped at random.
+
+    The set is rebuilt from the words minus the ids in `used_key` whenever a pool is created. An id popped by another
+    worker that hasn't stored its game yet may come back that way, the store refusing to add a taken id settles it.
+    """
+    def __init__(self, client, free_key, used_key, words: Iterable[str] = None):
+        self.redis = client
+        self.free_key = free_key
+        self._words = frozenset(load_word_ids() if words is None else words)
+        with self.redis.pipeline() as pipe:
+            pipe.delete(free_key)
+            if self._words:
+                pipe.sadd(free_key, *self._words)
+                pipe.sdiffstore(free_key, [free_key, used_key])
+            pipe.execute()
+
+    def __len__(self):
+        return self.redis.scard(self.free_key)
+
+    def allocate(self):
+        game_id = self.redis.spop(self.free_key)
+        return game_id if game_id is not None else generate_id(FALLBACK_ID_LENGTH)
+
+    def release(self, game_id):
+        if game_id in self._words:
+            self.redis.sadd(self.free_key, game_id)
+
+    def reserve_all(self, game_ids: Iterable[str]):
+        game_ids = list(game_ids)
+        if game_ids:
+            self.redis.srem(self.free_key, *game_ids)
+
+    def reserve(self, game_id):
+        self.redis.srem(self.free_key, game_id)
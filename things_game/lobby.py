@@ -0,0 +1,150 @@
+from bisect import bisect_left, bisect_right, insort
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from things_game.errors import InputError
+from things_game.logic import GameState, ThingsGame
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Cached pages are dropped all at once on the next change, this only bounds how many distinct queries pile up between
+_MAX_CACHED_PAGES = 256
+
+
+def lobby_entry(game: ThingsGame) -> dict:
+    """What the lobby shows of a game, as of its last published version"""
+    published = game.published
+    return {
+        "id": game.id,
+        "name": published.name,
+        "password_protected": game.password != "",
+        "password_salt": game.salt,
+        "state": published.state,
+        "players": published.players,
+        "observers": published.observers,
+        "create_time": game.create_time,
+    }
+
+
+def _parse_cursor(cursor: str) -> Tuple[float, str]:
+    create_time, _, game_id = cursor.partition(":")
+    try:
+        return -float(create_time), game_id
+    except ValueError:
+        raise InputError(f"Invalid lobby cursor '{cursor}'")
+
+
+class LobbyFilter(object):
+    __slots__ = ("not_started", "no_password", "min_players", "max_players")
+
+    def __init__(self, not_started=False, no_password=False, min_players=0, max_players=0):
+        self.not_started = bool(not_started)
+        self.no_password = bool(no_password)
+        self.min_players = int(min_players or 0)
+        self.max_players = int(max_players or 0)
+
+    def key(self):
+        return self.not_started, self.no_password, self.min_players, self.max_players
+
+    def __call__(self, entry):
+        if self.not_started and entry["state"] != GameState.not_started.value:
+            return False
+        if self.no_password and entry["password_protected"]:
+            return False
+        if entry["players"] < self.min_players:
+            return False
+        if self.max_players and entry["players"] > self.max_players:
+            return False
+        return True
+
+
+class LobbyIndex(object):
+    """
+    The lobby's view of every game, kept up to date as games change instead of being built from all of them per
+    request.
+
+    Entries are ordered newest game first and paged with a cursor naming the position after the last game of the
+    previous page, so pages stay stable while games come and go. Built pages are cached until the next change to any
+    entry.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self._entries: Dict[str, dict] = {}
+        # (-create time, id), sorted
+        self._order: List[Tuple[float, str]] = []
+        self._pages: Dict[tuple, dict] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self, game: ThingsGame) -> Optional[dict]:
+        """Refresh the entry of a game, returns it if it changed"""
+        with self.lock:
+            # Read under the lock so of two concurrent updates of a game, the last one sees its latest state
+            return self._put(lobby_entry(game))
+
+    def _put(self, entry: dict) -> Optional[dict]:
+        game_id = entry["id"]
+        current = self._entries.get(game_id)
+        if current == entry:
+            return None
+        if current is None:
+            insort(self._order, (-entry["create_time"], game_id))
+        self._entries[game_id] = entry
+        self._pages.clear()
+        return entry
+
+    def remove(self, game_id) -> bool:
+        with self.lock:
+            entry = self._entries.pop(game_id, None)
+            if entry is None:
+                return False
+            position = bisect_left(self._order, (-entry["create_time"], game_id))
+            del self._order[position]
+            self._pages.clear()
+        return True
+
+    def sync(self, entries: Iterable[dict]) -> Tuple[List[dict], List[str]]:
+        """
+        Bring the index in line with the entries of every game (GameStore.lobby_entries) after changes made elsewhere,
+        returns changed entries and removed ids
+        """
+        changed = []
+        seen = set()
+        for entry in entries:
+            seen.add(entry["id"])
+            with self.lock:
+                if self._put(entry):
+                    changed.append(entry)
+        removed = [game_id for game_id in list(self._entries) if game_id not in seen and self.remove(game_id)]
+        return changed, removed
+
+    def page(self, lobby_filter: LobbyFilter = None, after="", limit=DEFAULT_PAGE_SIZE) -> dict:
+        """
+        Up to `limit` matching entries after the cursor `after`, and the cursor for the next page ("" on the last).
+        Returns the cached page when nothing changed since it was built, it must not be modified.
+        """
+        lobby_filter = lobby_filter or LobbyFilter()
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        key = (lobby_filter.key(), after, limit)
+        with self.lock:
+            page = self._pages.get(key)
+            if page is not None:
+                return page
+            start = bisect_right(self._order, _parse_cursor(after)) if after else 0
+            games = []
+            cursor = ""
+            for position in range(start, len(self._order)):
+                entry = self._entries[self._order[position][1]]
+                if not lobby_filter(entry):
+                    continue
+                if len(games) == limit:
+                    cursor = f"{games[-1]['create_time']!r}:{games[-1]['id']}"
+                    break
+                games.append(entry)
+            page = {"games": games, "next": cursor, "total": len(self._entries)}
+            if len(self._pages) >= _MAX_CACHED_PAGES:
+                self._pages.clear()
+            self._pages[key] = page
+        return page
@@ -0,0 +1,126 @@
+import atexit
+import json
+import logging
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from typing import Dict, List
+
+from things_game.utils import native_module
+
+
+_threading = native_module("threading")
+_queue = native_module("queue")
+
+FORMAT = "[%(asctime)s] [%(threadName)s] [%(name)s.%(funcName)s:%(lineno)s] [%(levelname)s]: %(message)s"
+# Records waiting for the writer thread, beyond this they are dropped rather than holding up the caller
+QUEUE_SIZE = 10000
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "function": record.funcName,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Lets through at most `burst` identical warnings or errors from the same line of code every `period` seconds. The
+    first one let through after some were dropped says how many.
+    """
+    max_tracked = 10000
+
+    def __init__(self, burst=10, period=60.0):
+        super(RepeatFilter, self).__init__()
+        self.burst = burst
+        self.period = period
+        # (logger, line, message) -> [window start, records in window, dropped]
+        self._windows: Dict[tuple, List] = {}
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING or self.burst <= 0:
+            return True
+        key = (record.name, record.lineno, record.getMessage())
+        now = time.monotonic()
+        if len(self._windows) >= self.max_tracked:
+            self._windows = {k: w for k, w in self._windows.items() if now - w[0] < self.period}
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.period:
+            dropped = window[2] if window else 0
+            window = self._windows[key] = [now, 0, 0]
+            if dropped:
+                record.msg = f"{record.getMessage()} ({dropped} similar messages dropped)"
+                record.args = None
+        window[1] += 1
+        if window[1] > self.burst:
+            window[2] += 1
+            return False
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    def __init__(self, queue):
+        super(_QueueHandler, self).__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The message is fixed while its arguments are current, tracebacks are formatted later by the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except _queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(QueueListener):
+    def start(self):
+        # A real OS thread even under eventlet, so formatting and writing never run in the hub
+        self._thread = _threading.Thread(target=self._monitor, name="LogWriter", daemon=True)
+        self._thread.start()
+
+
+def configure_logger(stream_level="INFO", filename="", file_level="INFO", json_format=False, repeat_burst=10,
+                     repeat_period=60.0):
+    """
+    Sends every record through a queue to a background thread that writes it to stderr and, for the things_game
+    loggers, to `filename` rotated daily. Returns the listener running that thread, its `queue_handler.dropped` counts
+    the records dropped because the queue was full.
+    """
+    formatter = JsonFormatter() if json_format else logging.Formatter(FORMAT)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setLevel(stream_level)
+    handlers = [stream_handler]
+    if filename:
+        file_handler = TimedRotatingFileHandler(filename, when="midnight", backupCount=14)
+        file_handler.setLevel(file_level)
+        file_handler.addFilter(logging.Filter("things_game"))
+        handlers.append(file_handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue = _queue.Queue(QUEUE_SIZE)
+    queue_handler = _QueueHandler(queue)
+    queue_handler.addFilter(RepeatFilter(repeat_burst, repeat_period))
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(min(handler.level for handler in handlers))
+
+    listener = _QueueListener(queue, *handlers, respect_handler_level=True)
+    listener.queue_handler = queue_handler
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
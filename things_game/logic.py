@@ -1,13 +1,13 @@
-from typing import List, Optional, Dict
+from typing import Optional, Dict
 from enum import Enum
-import random
+import sys
 import time
 from threading import RLock
 
+from things_game.delta import diff_game
 from things_game.errors import GameStateError, PlayerError, InputError
-from things_game.utils import to_dict, generate_id, generate_key
-
-rand = random.SystemRandom()
+from things_game.ordered_index import OrderedIndex
+from things_game.utils import Serializer, generate_id, generate_key, rand
 
 
 class GameState(Enum):
@@ -26,10 +26,14 @@ class PlayerState(Enum):
 
 
 class Player(object):
+    __slots__ = ("name", "state", "id", "session_key", "is_observer", "is_owner", "is_topic_writer", "is_guessing",
+                 "submitted_answer", "answer", "score", "color", "_serialized", "_state")
+
     def __init__(self, name, player_id="", is_observer=False, is_owner=False, color="blue"):
         self.name = name
         self.state = PlayerState.active
         self.id = player_id or generate_id()
+        # Kept in the base64 form clients send back, every command compares it as is
         self.session_key = generate_key()
         self.is_observer = is_observer
         self.is_owner = is_owner
@@ -38,10 +42,46 @@ class Player(object):
         self.submitted_answer = False
         self.answer = ""
         self.score = 0
-        self.color = color
+        # Colors come from a small palette, share one string per color across all players
+        self.color = sys.intern(color)
+
+    def __setattr__(self, name, value):
+        # Any change drops the serialized forms cached by to_dict and to_state
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, "_serialized", None)
+        object.__setattr__(self, "_state", None)
 
     def to_dict(self):
-        return to_dict(self, omit="session_key")
+        """Cached until the player changes, so publishing a game only serializes the players that did"""
+        serialized = self._serialized
+        if serialized is None:
+            serialized = _serialize_player(self)
+            object.__setattr__(self, "_serialized", serialized)
+        return serialized
+
+    def to_state(self):
+        state = self._state
+        if state is None:
+            state = dict(self.to_dict(), session_key=self.session_key)
+            object.__setattr__(self, "_state", state)
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        player = cls.__new__(cls)
+        player.name = state["name"]
+        player.state = PlayerState(state["state"])
+        player.id = state["id"]
+        player.session_key = state["session_key"]
+        player.is_observer = state["is_observer"]
+        player.is_owner = state["is_owner"]
+        player.is_topic_writer = state["is_topic_writer"]
+        player.is_guessing = state["is_guessing"]
+        player.submitted_answer = state["submitted_answer"]
+        player.answer = state["answer"]
+        player.score = state["score"]
+        player.color = sys.intern(state["color"])
+        return player
 
     def __eq__(self, other):
         if not isinstance(other, Player):
@@ -53,15 +93,41 @@ class Player(object):
 
 
 class Answer(object):
+    __slots__ = ("id", "text", "player", "matched", "_serialized", "_state")
+
     def __init__(self, answer_id, player, text):
         self.id = answer_id
         self.text = text
         self.player = player
         self.matched = False
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, "_serialized", None)
+        object.__setattr__(self, "_state", None)
+
     def to_dict(self):
-        omit = None if self.matched else "player"
-        return to_dict(self, omit)
+        """Cached like Player.to_dict, a matched answer is serialized again when its player changes"""
+        serialized = self._serialized
+        if serialized is None or (self.matched and serialized["player"] is not self.player.to_dict()):
+            serialized = _serialize_answer(self) if self.matched else _serialize_hidden_answer(self)
+            object.__setattr__(self, "_serialized", serialized)
+        return serialized
+
+    def to_state(self):
+        player_state = self.player.to_state()
+        state = self._state
+        if state is None or state["player"] is not player_state:
+            # The full player state since they may have left the game once the round is complete
+            state = {"id": self.id, "text": self.text, "player": player_state, "matched": self.matched}
+            object.__setattr__(self, "_state", state)
+        return state
+
+    @classmethod
+    def from_state(cls, state, resolve_player):
+        answer = cls(state["id"], resolve_player(state["player"]), state["text"])
+        answer.matched = state["matched"]
+        return answer
 
     def __eq__(self, other):
         if not isinstance(other, Answer):
@@ -70,51 +136,119 @@ class Answer(object):
 
 
 class GameInfo(object):
+    __slots__ = ("name", "game_id", "score_limit", "state", "players", "observers", "topic_writer", "guesser",
+                 "current_topic", "answers", "_answers_by_player", "_guessers")
+
     def __init__(self, name, game_id, score_limit):
         self.name = name
         self.game_id = game_id
         self.score_limit = score_limit
         self.state = GameState.not_started
-        self.players: List[Player] = []
-        self.observers: List[Player] = []
+        self.players = OrderedIndex()
+        self.observers = OrderedIndex()
         self.topic_writer: Optional[Player] = None
         self.guesser: Optional[Player] = None
         self.current_topic = ""
-        self.answers: List[Answer] = []
+        self.answers = OrderedIndex()
+        self._answers_by_player: Dict[str, Answer] = {}
+        # Players that submitted an answer that hasn't been matched yet, in player order. Filled when matching starts
+        self._guessers = OrderedIndex()
 
     def to_dict(self):
-        replace = dict(answers=[])
         if self.state in [GameState.matching, GameState.round_complete]:
-            replace = None
-        return to_dict(self, replace=replace)
+            return _serialize_game_info(self)
+        return _serialize_game_info_hidden_answers(self)
+
+    def to_state(self):
+        """Everything needed to rebuild this object with `from_state`, unlike `to_dict` which is sent to clients"""
+        return {
+            "name": self.name,
+            "game_id": self.game_id,
+            "score_limit": self.score_limit,
+            "state": self.state.value,
+            "players": [p.to_state() for p in self.players],
+            "observers": [p.to_state() for p in self.observers],
+            # Full states, the topic writer or guesser may have already left the game
+            "topic_writer": self.topic_writer.to_state() if self.topic_writer else None,
+            "guesser": self.guesser.to_state() if self.guesser else None,
+            "current_topic": self.current_topic,
+            "answers": [a.to_state() for a in self.answers],
+            "guessers": [p.id for p in self._guessers],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        info = cls(state["name"], state["game_id"], state["score_limit"])
+        info.state = GameState(state["state"])
+        info.players = OrderedIndex(Player.from_state(p) for p in state["players"])
+        info.observers = OrderedIndex(Player.from_state(p) for p in state["observers"])
+
+        def resolve(player_state):
+            if not player_state:
+                return None
+            return info.players.get(player_state["id"]) or Player.from_state(player_state)
+
+        info.topic_writer = resolve(state["topic_writer"])
+        info.guesser = resolve(state["guesser"])
+        info.current_topic = state["current_topic"]
+        for answer_state in state["answers"]:
+            info.add_answer(Answer.from_state(answer_state, resolve))
+        guessers = (info.players.get(player_id) for player_id in state["guessers"])
+        info._guessers = OrderedIndex(p for p in guessers if p)
+        return info
 
     def find_answer(self, answer_id):
-        for a in self.answers:
-            if a.id == answer_id:
-                return a
-        return None
+        return self.answers.get(answer_id)
+
+    def find_player_answer(self, player):
+        return self._answers_by_player.get(player.id)
+
+    def add_answer(self, answer: Answer):
+        self.answers.append(answer)
+        self._answers_by_player[answer.player.id] = answer
 
     def remove_answer(self, player):
-        for a in self.answers:
-            if player == a.player:
-                self.answers.remove(a)
-                return
+        answer = self._answers_by_player.pop(player.id, None)
+        self.answers.discard(answer)
+
+    def clear_answers(self):
+        self.answers = OrderedIndex()
+        self._answers_by_player = {}
+        self._guessers.clear()
+
+    def shuffle_answers(self):
+        answers = list(self.answers)
+        rand.shuffle(answers)
+        self.answers = OrderedIndex(answers)
 
     def reveal_all_answers(self):
         for a in self.answers:
             a.matched = True
 
+    def start_guessing(self):
+        self._guessers = OrderedIndex(p for p in self.players if p.submitted_answer and not p.answer)
+
     def get_guessers(self):
-        return [p for p in self.players if p.submitted_answer and not p.answer]
+        return self._guessers
+
+    def remove_guesser(self, player):
+        self._guessers.discard(player)
 
-    def next_player(self, player: Player, player_list: List[Player] = None):
+    def next_player(self, player: Player, player_list: OrderedIndex = None):
         if player_list is None:
             player_list = self.players
         if player in player_list:
-            index_next = player_list.index(player) + 1
+            following = player_list.next_after(player)
         else:
-            index_next = 1
-        return player_list[index_next % len(player_list)]
+            # Same as stepping to index 1 of the list
+            following = player_list.next_after(player_list.first())
+        # Disconnected players are passed over, unless nobody else is left to take the turn
+        candidate = following
+        while candidate.state == PlayerState.inactive:
+            candidate = player_list.next_after(candidate)
+            if candidate is following:
+                break
+        return candidate
 
     def next_guesser(self):
         guessers = self.get_guessers()
@@ -127,7 +261,8 @@ class GameInfo(object):
 
     def next_topic_writer(self):
         if not self.topic_writer:
-            self.topic_writer = rand.choice(self.players)
+            active = [p for p in self.players if p.state != PlayerState.inactive]
+            self.topic_writer = rand.choice(active or list(self.players))
         else:
             self.topic_writer.is_topic_writer = False
             self.topic_writer = self.next_player(self.topic_writer)
@@ -139,7 +274,35 @@ class GameInfo(object):
         return self.game_id == other.game_id
 
 
+_serialize_player = Serializer(omit=["session_key"])
+_serialize_answer = Serializer()
+_serialize_hidden_answer = Serializer(omit=["player"])
+_serialize_game_info = Serializer()
+_serialize_game_info_hidden_answers = Serializer(replace=dict(answers=[]))
+
+
+class GameSnapshot(object):
+    """
+    A game as of one published version. Never modified once built, a newer version replaces it as a whole, so readers
+    share it without taking the game's lock and always see one consistent state.
+    """
+    __slots__ = ("version", "game", "name", "state", "players", "observers")
+
+    def __init__(self, version, state: dict):
+        self.version = version
+        # The payload clients get, every reader is handed this same dict so it must not be modified
+        self.game = dict(state, version=version)
+        self.name = state.get("name", "")
+        self.state = state.get("state", GameState.not_started.value)
+        self.players = len(state.get("players", ()))
+        self.observers = len(state.get("observers", ()))
+
+
 class ThingsGame(object):
+    __slots__ = ("info", "password", "salt", "create_time", "last_update_time", "owner", "lock", "matching",
+                 "published", "_published_revision", "_revision", "_serialized", "_serialized_revision",
+                 "store_token", "on_updated", "_answers_owed")
+
     def __init__(self, name, password_hash="", salt="", game_id="", score_limit=11):
         self.info = GameInfo(name, game_id or generate_id(), score_limit)
         self.password = password_hash
@@ -149,42 +312,128 @@ class ThingsGame(object):
         self.owner: Optional[Player] = None
         self.lock = RLock()
         self.matching = False
+        # Bumped by every mutation, the serialized state is cached until it changes
+        self._revision = 0
+        self._serialized = None
+        self._serialized_revision = -1
+        # Replaced, never modified, by `publish_patch`. Readers only ever look at this
+        self.published = GameSnapshot(0, self.info.to_dict())
+        self._published_revision = self._revision
+        # Opaque bookkeeping for the GameStore holding this game
+        self.store_token = None
+        # Called with the game after every change, lets the store keep its expiry order
+        self.on_updated = None
+        # Players still expected to answer this round, those who haven't and aren't inactive
+        self._answers_owed = 0
 
     @property
     def id(self):
         return self.info.game_id
 
+    @property
+    def version(self):
+        return self.published.version
+
     def to_dict(self):
-        return self.info.to_dict()
+        with self.lock:
+            if self._serialized_revision != self._revision:
+                self._serialized = self.info.to_dict()
+                self._serialized_revision = self._revision
+            return self._serialized
+
+    def publish_patch(self):
+        """
+        Diff the current state against the last published one and, if anything changed, publish the next version.
+        Returns the patch to broadcast, or None if there is nothing new.
+        """
+        with self.lock:
+            if self._published_revision == self._revision:
+                return None
+            state = self.to_dict()
+            self._published_revision = self._revision
+            published = self.published
+            patch = diff_game(published.game, state)
+            if not patch:
+                return None
+            patch["base_version"] = published.version
+            patch["version"] = published.version + 1
+            self.published = GameSnapshot(patch["version"], state)
+            return patch
+
+    def state_changed(self):
+        """Whether the game moved to another GameState since the last published version"""
+        return self.published.state != self.info.state.value
+
+    def snapshot(self):
+        """Full state as of the last published version, shared between callers and must not be modified"""
+        return self.published.game
 
-    def _generate_id(self, id_list):
+    @property
+    def revision(self):
+        return self._revision
+
+    def to_state(self):
+        """
+        Made of the cached states of the players and answers, which are replaced rather than modified when they change,
+        so it can be handed to another thread to encode as is. Must not be modified.
+        """
+        with self.lock:
+            return {
+                "info": self.info.to_state(),
+                "password": self.password,
+                "salt": self.salt,
+                "create_time": self.create_time,
+                "last_update_time": self.last_update_time,
+                "matching": self.matching,
+                "version": self.published.version,
+                "published_state": self.published.game,
+                "published_revision": self._published_revision,
+                "revision": self._revision,
+            }
+
+    @classmethod
+    def from_state(cls, state):
+        game = cls(state["info"]["name"], state["password"], state["salt"], state["info"]["game_id"])
+        game.info = GameInfo.from_state(state["info"])
+        game.create_time = state["create_time"]
+        game.last_update_time = state["last_update_time"]
+        game.matching = state["matching"]
+        game.published = GameSnapshot(state["version"], state["published_state"])
+        game._published_revision = state["published_revision"]
+        game._revision = state["revision"]
+        game._answers_owed = sum(game._owes_answer(p) for p in game.info.players)
+        return game
+
+    def _generate_id(self, *indexes: OrderedIndex):
         item_id = generate_id()
-        while item_id in id_list:
+        while any(index.get(item_id) for index in indexes):
             item_id = generate_id()
         return item_id
 
     def _generate_player_id(self):
-        return self._generate_id([p.id for p in self.info.players + self.info.observers])
+        return self._generate_id(self.info.players, self.info.observers)
 
     def _generate_answer_id(self):
-        return self._generate_id([a.id for a in self.info.answers])
-
-    def _find_player(self, player_id, player_list: List[Player] = None):
-        if player_list is None:
-            player_list = self.info.players
-
-        for p in player_list:
-            if player_id == p.id:
-                return p
-        return PlayerError(f"Unable to find player with id {player_id}")
+        return self._generate_id(self.info.answers)
+
+    def _find_player(self, player_id, include_observers=False):
+        player = self.info.players.get(player_id)
+        if player is None and include_observers:
+            player = self.info.observers.get(player_id)
+        if player is None:
+            raise PlayerError(f"Unable to find player with id {player_id}")
+        return player
 
     def _updated(self):
         with self.lock:
             self.last_update_time = time.time()
+            self._revision += 1
+            if self.on_updated:
+                self.on_updated(self)
 
     def add_player(self, name, is_observer, color="blue"):
-        self._updated()
         with self.lock:
+            self._updated()
             player_id = self._generate_player_id()
 
             player = Player(name, player_id, is_observer, not self.info.players, color)
@@ -192,22 +441,69 @@ class ThingsGame(object):
                 self.info.observers.append(player)
             else:
                 self.info.players.append(player)
+                self._answers_owed += self._owes_answer(player)
             return player
 
     def force_remove_player(self, owner_id, owner_session_key, player_id):
         with self.lock:
+            self._updated()
             self.validate_player(owner_id, owner_session_key, can_be_observer=True, must_be_owner=True)
-            player = self._find_player(player_id, self.info.players + self.info.observers)
+            player = self._find_player(player_id, include_observers=True)
             self._remove_player(player)
             return player
 
     def remove_player(self, player_id, session_key):
         with self.lock:
+            self._updated()
             player = self.validate_player(player_id, session_key, can_be_observer=True)
             self._remove_player(player)
             return player
 
+    def set_player_state(self, player_id, state: PlayerState):
+        """Mark whether a player is connected, returns the player or None if they already left the game"""
+        with self.lock:
+            player = self.info.players.get(player_id) or self.info.observers.get(player_id)
+            if player is not None and player.state != state:
+                self._updated()
+                owed = self._owes_answer(player)
+                player.state = state
+                self._answers_owed += self._owes_answer(player) - owed
+                if state == PlayerState.inactive:
+                    self._skip_inactive_turns()
+            return player
+
+    def _skip_inactive_turns(self):
+        """Hand the turn on from a disconnected topic writer or guesser, and stop waiting for disconnected answers"""
+        info = self.info
+        if info.state == GameState.writing_topic and info.topic_writer.state == PlayerState.inactive:
+            info.next_topic_writer()
+        elif info.state == GameState.writing_answers and self._answers_complete():
+            self.start_matching()
+        elif info.state == GameState.matching and not self.matching and info.guesser.state == PlayerState.inactive:
+            info.next_guesser()
+
+    @staticmethod
+    def _owes_answer(player: Player):
+        return not player.is_observer and not player.submitted_answer and player.state != PlayerState.inactive
+
+    def _answers_complete(self):
+        answers = len(self.info.answers)
+        if answers == len(self.info.players):
+            return True
+        # Matching needs someone to guess and someone to be guessed
+        return self._answers_owed == 0 and answers >= 2
+
+    def drop_player(self, player_id):
+        """Remove a player that is gone without them asking, returns the player or None if they already left"""
+        with self.lock:
+            player = self.info.players.get(player_id) or self.info.observers.get(player_id)
+            if player is not None:
+                self._updated()
+                self._remove_player(player)
+            return player
+
     def _remove_player(self, player: Player):
+        self._answers_owed -= self._owes_answer(player)
         if player.is_observer:
             self.info.observers.remove(player)
             return
@@ -218,7 +514,7 @@ class ThingsGame(object):
         elif self.info.state == GameState.writing_answers:
             self.info.remove_answer(player)
             self.info.players.remove(player)
-            if len(self.info.answers) == len(self.info.players):
+            if self._answers_complete():
                 self.start_matching()
         elif self.info.state == GameState.matching:
             self.info.remove_answer(player)
@@ -229,21 +525,19 @@ class ThingsGame(object):
                     self.info.state = GameState.round_complete
                 elif player is self.info.guesser:
                     self.info.next_guesser()
+            self.info.remove_guesser(player)
             self.info.players.remove(player)
         else:
             self.info.players.remove(player)
 
         if player.is_owner and self.info.players:
-            self.info.players[0].is_owner = True
+            self.info.players.first().is_owner = True
         return player
 
     def validate_player(self, player_id, session_key, can_be_observer=False,
                         must_be_owner=False, must_be_topic_writer=False, must_be_guessing=False):
         with self.lock:
-            players = self.info.players[:]
-            if can_be_observer:
-                players.extend(self.info.observers[:])
-            player = self._find_player(player_id, players)
+            player = self._find_player(player_id, include_observers=can_be_observer)
             if player.session_key != session_key:
                 raise PlayerError("Invalid session key for player")
             if must_be_owner and not player.is_owner:
@@ -254,9 +548,15 @@ class ThingsGame(object):
                 raise PlayerError("Player is not guessing")
             return player
 
+    def change_color(self, player_id, session_key, color):
+        with self.lock:
+            self._updated()
+            player = self.validate_player(player_id, session_key)
+            player.color = sys.intern(color)
+
     def start_game(self, player_id, session_key):
-        self._updated()
         with self.lock:
+            self._updated()
             self.validate_player(player_id, session_key, can_be_observer=True, must_be_owner=True)
             if len(self.info.players) < 3:
                 raise GameStateError("Not enough players have joined the game")
@@ -266,29 +566,31 @@ class ThingsGame(object):
             self.start_round()
 
     def reset_points(self, player_id, session_key):
-        self._updated()
         with self.lock:
+            self._updated()
             self.validate_player(player_id, session_key, can_be_observer=True, must_be_owner=True)
             for p in self.info.players:
                 p.score = 0
 
     def start_round(self):
-        self._updated()
         with self.lock:
+            self._updated()
             self.info.state = GameState.writing_topic
-            self.info.answers = []
+            self.info.clear_answers()
             self.info.guesser = None
             self.info.current_topic = ""
 
+            self._answers_owed = 0
             for player in self.info.players:
                 player.answer = ""
                 player.submitted_answer = False
                 player.is_guessing = False
+                self._answers_owed += self._owes_answer(player)
             self.info.next_topic_writer()
 
     def set_topic(self, player_id: str, session_key: str, topic: str):
-        self._updated()
         with self.lock:
+            self._updated()
             if self.info.state != GameState.writing_topic:
                 raise GameStateError("Cannot set topic in this game state")
             player = self.validate_player(player_id, session_key, must_be_topic_writer=True)
@@ -299,8 +601,8 @@ class ThingsGame(object):
             self.info.state = GameState.writing_answers
 
     def skip_topic_writer(self, player_id: str, session_key: str):
-        self._updated()
         with self.lock:
+            self._updated()
             if self.info.state != GameState.writing_topic:
                 raise GameStateError("Cannot set topic in this game state")
             player = self.validate_player(player_id, session_key)
@@ -310,8 +612,8 @@ class ThingsGame(object):
             self.info.next_topic_writer()
 
     def submit_answer(self, player_id: str, session_key: str, answer: str):
-        self._updated()
         with self.lock:
+            self._updated()
             if self.matching:
                 raise GameStateError("Already in the process of matching")
             if self.info.state != GameState.writing_answers:
@@ -327,25 +629,22 @@ class ThingsGame(object):
             else:
                 answer = answer.upper()
 
-            updated = False
             # See if the user already answered, if so update that instead
-            for a in self.info.answers:
-                if a.player == player:
-                    a.text = answer
-                    updated = True
-                    break
-
-            if not updated:
-                self.info.answers.append(Answer(self._generate_answer_id(), player, answer))
+            existing_answer = self.info.find_player_answer(player)
+            if existing_answer:
+                existing_answer.text = answer
+            else:
+                self.info.add_answer(Answer(self._generate_answer_id(), player, answer))
 
+            self._answers_owed -= self._owes_answer(player)
             player.submitted_answer = True
 
-            if len(self.info.answers) == len(self.info.players):
+            if self._answers_complete():
                 self.start_matching()
 
     def skip_answer(self, player_id: str, session_key: str):
-        self._updated()
         with self.lock:
+            self._updated()
             if self.matching:
                 raise GameStateError("Already in the process of matching")
             if self.info.state != GameState.writing_answers:
@@ -355,15 +654,16 @@ class ThingsGame(object):
                 raise PlayerError("Already submitted answer, cannot skip")
 
     def start_matching(self):
-        self._updated()
         with self.lock:
-            rand.shuffle(self.info.answers)
+            self._updated()
+            self.info.shuffle_answers()
+            self.info.start_guessing()
             self.info.next_guesser()
             self.info.state = GameState.matching
 
     def validate_match(self, player_id, session_key, answer_id, guessed_player_id):
-        self._updated()
         with self.lock:
+            self._updated()
             if self.matching:
                 raise GameStateError("Already in the process of performing a match")
             if self.info.state != GameState.matching:
@@ -383,20 +683,30 @@ class ThingsGame(object):
             if guessed_player not in guessers:
                 raise GameStateError("Cannot guess a player that's not a remaining guesser")
 
-            guessed_player_answer = None
-            for a in self.info.answers:
-                if a.player == guessed_player:
-                    guessed_player_answer = a
-                    break
+            guessed_player_answer = self.info.find_player_answer(guessed_player)
             if not guessed_player_answer:
                 raise GameStateError("Unable to find guessed player's answer")
             self.matching = True
             return player, guessed_answer, guessed_player_answer
 
-    def finalize_match(self, player: Player, guessed_answer: Answer, guessed_player_answer: Answer):
-        self._updated()
+    def cancel_match(self):
+        """Forget a pending match whose result will never come, the guesser guesses again"""
+        with self.lock:
+            if self.matching:
+                self._updated()
+                self.matching = False
+
+    def finalize_match(self, player_id, guessed_answer_id, guessed_player_answer_id):
+        """Takes ids rather than the objects from `validate_match` so it also works on a reloaded copy of the game"""
         with self.lock:
+            self._updated()
             self.matching = False
+            player = self.info.players.get(player_id)
+            guessed_answer = self.info.find_answer(guessed_answer_id)
+            guessed_player_answer = self.info.find_answer(guessed_player_answer_id)
+            if self.info.state != GameState.matching or not player or not guessed_player_answer:
+                # The guesser or guessed player left while the match was pending
+                return False
             if guessed_answer != guessed_player_answer:
                 self.info.next_guesser()
                 return False
@@ -404,10 +714,14 @@ class ThingsGame(object):
             player.score += 1
             guessed_player_answer.player.answer = guessed_player_answer.text
             guessed_player_answer.matched = True
+            self.info.remove_guesser(guessed_player_answer.player)
 
             if len(self.info.get_guessers()) == 1:
                 player.score += 1
                 self.info.state = GameState.round_complete
                 self.info.reveal_all_answers()
+            else:
+                # A guesser who disconnected while their match was pending doesn't keep the turn
+                self._skip_inactive_turns()
 
             return True
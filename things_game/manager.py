@@ -1,87 +1,86 @@
-from threading import Lock
-from typing import Dict
+from typing import Callable, Optional
 import logging
 import time
 from things_game.logic import ThingsGame
-from things_game.utils import generate_id, generate_game_id
+from things_game.store import GameStore, MemoryGameStore
 
 
 logger = logging.getLogger(__name__)
 
 
-def _sid_key(game_id, player_id):
-    return f"{game_id}.{player_id}"
-
-
 class GameManager(object):
-    def __init__(self):
-        self.lock = Lock()
-        self.games: Dict[str, ThingsGame] = {}
-        self.player_sids = {}
+    """
+    Owns every live game and the socket ids of their players, kept in a GameStore.
+
+    With the default MemoryGameStore `get_game` returns the live object. Other stores return a copy, so changes must
+    be written back with `save_game`. Game ids come from the store's pool unless `game_ids` is given. With
+    `owns_game_id`, as in shard-per-core mode, `create_game` only hands out ids it accepts.
+    """
+    def __init__(self, store: Optional[GameStore] = None, game_ids=None,
+                 owns_game_id: Optional[Callable[[str], bool]] = None):
+        self.store = store if store is not None else MemoryGameStore()
+        self.game_ids = game_ids if game_ids is not None else self.store.game_id_pool(owns=owns_game_id)
+        self.owns_game_id = owns_game_id
+        self.game_ids.reserve_all(self.store.game_ids())
 
     def update_player_sid(self, game_id, player_id, sid):
-        with self.lock:
-            self.player_sids[_sid_key(game_id, player_id)] = sid
+        self.store.set_sid(game_id, player_id, sid)
 
     def get_player_sid(self, game_id, player_id):
-        with self.lock:
-            return self.player_sids.get(_sid_key(game_id, player_id), "")
+        return self.store.get_sid(game_id, player_id)
 
     def remove_player_sid(self, game_id, player_id):
-        with self.lock:
-            sid = ""
-            key = _sid_key(game_id, player_id)
-            if key in self.player_sids:
-                sid = self.player_sids[key]
-                del self.player_sids[key]
-            return sid
+        return self.store.pop_sid(game_id, player_id)
+
+    def disconnect(self, sid):
+        """Forget a closed connection, returns the (game id, player id) pairs it was connected as"""
+        return self.store.pop_connection(sid)
+
+    @staticmethod
+    def _is_stale(game: ThingsGame, now, stale_time_seconds):
+        return now - game.last_update_time > stale_time_seconds or not game.info.players
 
     def prune(self, stale_time_seconds=15*60):
         games_to_remove = {}
         now = time.time()
-        with self.lock:
-            for game_id, game in self.games.items():
-                t_since_last_update = now - game.last_update_time
-                if t_since_last_update > stale_time_seconds or not game.info.players:
-                    games_to_remove[game_id] = []
-                    logger.info(f"Pruning game {game_id}, {int(t_since_last_update)} seconds since last update "
-                                f"(created {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(game.create_time))}). "
-                                f"Players: {len(game.info.players)}")
-
-            for game_id in games_to_remove:
-                del self.games[game_id]
-
-            game_players_to_remove = []
-            for game_player_id, sid in self.player_sids.items():
-                game_id, player_id = game_player_id.split(".")
-                if game_id in games_to_remove:
-                    games_to_remove[game_id].append(player_id)
-                    game_players_to_remove.append(game_player_id)
-
-            for p in game_players_to_remove:
-                del self.player_sids[p]
-            return games_to_remove
+        # The store only hands back games that may be stale, each is checked again as it is removed on its own so
+        # lookups are never blocked and a game updated in the meantime is kept
+        for game_id in self.store.expiry_candidates(now - stale_time_seconds):
+            removed = self.store.remove_if(game_id, lambda g: self._is_stale(g, now, stale_time_seconds))
+            if not removed:
+                continue
+            games_to_remove[game_id] = list(self.store.pop_sids(game_id))
+            self.game_ids.release(game_id)
+            t_since_last_update = now - removed.last_update_time
+            logger.info(f"Pruning game {game_id}, {int(t_since_last_update)} seconds since last update "
+                        f"(created {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(removed.create_time))}). "
+                        f"Players: {len(removed.info.players)}")
+        return games_to_remove
 
     def get_games(self):
-        with self.lock:
-            return self.games.values()[:]
+        return self.store.games()
+
+    def lobby_entries(self):
+        return self.store.lobby_entries()
+
+    def count_participants(self):
+        """Returns the number of live games, players and observers as of their last published versions"""
+        entries = self.store.lobby_entries()
+        return len(entries), sum(e["players"] for e in entries), sum(e["observers"] for e in entries)
 
     def create_game(self, name, password_hash, password_salt):
-        with self.lock:
-            game_id = generate_game_id()
-            i = 0
-            while game_id in self.games:
-                if i < 100:
-                    game_id = generate_game_id()
-                else:
-                    game_id = generate_id()
-
-            if not name:
-                name = game_id
-            game = ThingsGame(name, password_hash, password_salt, game_id)
-            self.games[game_id] = game
-            return game
+        while True:
+            game_id = self.game_ids.allocate()
+            if self.owns_game_id is not None and not self.owns_game_id(game_id):
+                # Only possible with a pool that wasn't built for this shard
+                continue
+            game = ThingsGame(name or game_id, password_hash, password_salt, game_id)
+            if self.store.add(game):
+                return game
+            # Taken by another process sharing the store, whichever process removes that game releases the id
 
     def get_game(self, game_id):
-        with self.lock:
-            return self.games.get(game_id, None)
\ No newline at end of file
+        return self.store.get(game_id)
+
+    def save_game(self, game: ThingsGame):
+        self.store.save(game)
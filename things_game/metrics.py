@@ -0,0 +1,167 @@
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+import time
+
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(object):
+    kind = ""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(name suffix, formatted labels, value) for every sample to expose"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        super(Counter, self).__init__(name, help_text, label_names)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, labels=(), amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        return [("", _format_labels(self.label_names, labels), value) for labels, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Either set directly, or read from `func` when scraped. `func` returns a value, or a dict of labels to values"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, label_names=(), func: Callable = None):
+        super(Gauge, self).__init__(name, help_text, label_names)
+        self.func = func
+        self._values: Dict[tuple, float] = {}
+
+    def set(self, value, labels=()):
+        self._values[labels] = value
+
+    def samples(self):
+        values = self._values
+        if self.func:
+            values = self.func()
+            if not isinstance(values, dict):
+                values = {(): values}
+        return [("", _format_labels(self.label_names, labels), value) for labels, value in values.items()]
+
+
+class Histogram(_Metric):
+    """Bucket counts are kept per bucket and only summed up when scraped, so `observe` is a bisect and two additions"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., count over the last bucket, sum]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value, labels=()):
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def time(self, labels=()):
+        return _Timer(self, labels)
+
+    def samples(self):
+        samples = []
+        for labels, counts in self._values.items():
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                total += count
+                samples.append(("_bucket", _format_labels(self.label_names, labels, f'le="{_format_value(bound)}"'),
+                                total))
+            samples.append(("_sum", _format_labels(self.label_names, labels), counts[-1]))
+            samples.append(("_count", _format_labels(self.label_names, labels), total))
+        return samples
+
+
+class _Timer(object):
+    __slots__ = ("histogram", "labels", "t_start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.t_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.t_start, self.labels)
+
+
+class MetricsRegistry(object):
+    """
+    Holds the metrics of one process and renders them in the Prometheus text format.
+
+    Updates are plain dict and list operations with no locking. Under eventlet nothing yields in the middle of one,
+    and a rare lost increment from a real thread is an acceptable price for keeping them this cheap.
+    """
+    def __init__(self, prefix="things_game"):
+        self.prefix = prefix
+        self.metrics: Dict[str, _Metric] = {}
+        self.collectors: List[Callable[[], None]] = []
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, label_names=()) -> Counter:
+        return self._add(Counter(f"{self.prefix}_{name}", help_text, label_names))
+
+    def gauge(self, name, help_text, label_names=(), func=None) -> Gauge:
+        return self._add(Gauge(f"{self.prefix}_{name}", help_text, label_names, func))
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(f"{self.prefix}_{name}", help_text, label_names, buckets))
+
+    def add_collector(self, func: Callable[[], None]):
+        """`func` is called before every scrape, to set gauges that are costly to keep up to date"""
+        self.collectors.append(func)
+
+    def render(self):
+        for collector in self.collectors:
+            collector()
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
@@ -0,0 +1,72 @@
+class OrderedIndex(object):
+    """
+    Insertion ordered collection of items keyed by their `id`.
+
+    Lookup, membership, append and removal are O(1). Items are also linked in a ring so the item after any member can
+    be found without scanning, which is what turn rotation needs. Serializes to a list in insertion order.
+    """
+    __slots__ = ("_items", "_next", "_prev")
+
+    def __init__(self, items=()):
+        self._items = {}
+        self._next = {}
+        self._prev = {}
+        for item in items:
+            self.append(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(list(self._items.values()))
+
+    def __contains__(self, item):
+        return item is not None and self._items.get(item.id) == item
+
+    def get(self, item_id, default=None):
+        return self._items.get(item_id, default)
+
+    def first(self):
+        return next(iter(self._items.values()), None)
+
+    def append(self, item):
+        if item.id in self._items:
+            raise ValueError(f"Item with id {item.id} is already in the index")
+        if self._items:
+            first_id = next(iter(self._items))
+            last_id = self._prev[first_id]
+            self._next[last_id] = item.id
+            self._prev[first_id] = item.id
+            self._next[item.id] = first_id
+            self._prev[item.id] = last_id
+        else:
+            self._next[item.id] = item.id
+            self._prev[item.id] = item.id
+        self._items[item.id] = item
+
+    def remove(self, item):
+        if item not in self:
+            raise ValueError(f"Item with id {item.id} is not in the index")
+        self.discard(item)
+
+    def discard(self, item):
+        if item is None or item.id not in self._items:
+            return
+        prev_id = self._prev.pop(item.id)
+        next_id = self._next.pop(item.id)
+        if prev_id != item.id:
+            self._next[prev_id] = next_id
+            self._prev[next_id] = prev_id
+        del self._items[item.id]
+
+    def clear(self):
+        self._items.clear()
+        self._next.clear()
+        self._prev.clear()
+
+    def next_after(self, item):
+        """The item following `item` in insertion order, wrapping around at the end"""
+        return self._items[self._next[item.id]]
+
+    def to_dict(self):
+        return [item.to_dict() for item in self._items.values()]
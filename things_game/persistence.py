@@ -0,0 +1,239 @@
+import json
+import os
+import time
+from typing import Dict, List, Tuple
+import logging
+
+from things_game.logic import ThingsGame
+from things_game.store import GameStore
+from things_game.utils import native_module
+
+
+logger = logging.getLogger(__name__)
+
+# The writer does blocking file I/O, so it needs a real OS thread and queue even when eventlet has patched them
+_threading = native_module("threading")
+_queue = native_module("queue")
+
+SNAPSHOT_FILENAME = "games.snapshot"
+JOURNAL_FILENAME = "games.journal"
+
+_PUT = "P"
+_DELETE = "D"
+_SNAPSHOT = "S"
+
+
+def _read_records(paths) -> Dict[str, str]:
+    """Replay snapshot and journal files in order, returns the latest JSON state line per game id"""
+    records = {}
+    for path in paths:
+        if not os.path.isfile(path):
+            continue
+        with open(path, "r", encoding="utf8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split(" ", 2)
+                if parts[0] == _PUT and len(parts) == 3:
+                    records[parts[1]] = parts[2]
+                elif parts[0] == _DELETE and len(parts) == 2:
+                    records.pop(parts[1], None)
+                # Anything else is a line cut short by a crash, skip it
+    return records
+
+
+class GameJournal(object):
+    """
+    Persists games as a snapshot file plus an append-only journal of the game states written since.
+
+    `put`/`delete` only hand the record to a queue, a background OS thread encodes and appends it. `snapshot` asks the
+    same thread to fold the journal into a new snapshot, so it never races with the records it covers.
+    """
+    def __init__(self, directory, fsync=False, max_journal_records=100000):
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILENAME)
+        self.journal_path = os.path.join(directory, JOURNAL_FILENAME)
+        self.fsync = fsync
+        self.max_journal_records = max_journal_records
+        self.queue = _queue.Queue()
+        self.thread = _threading.Thread(target=self.run, name="GameJournal", daemon=True)
+        self._journal = None
+        self._journal_records = 0
+
+    def start(self):
+        self._journal = open(self.journal_path, "a", encoding="utf8")
+        self.thread.start()
+
+    def stop(self, timeout=10):
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def put(self, game: ThingsGame):
+        # Only gathers the cached states of the game's members, encoding them is left to the writer thread
+        self.queue.put((_PUT, game.id, game.to_state()))
+
+    def delete(self, game_id):
+        self.queue.put((_DELETE, game_id, None))
+
+    def snapshot(self):
+        self.queue.put((_SNAPSHOT, None, None))
+
+    def recover(self, budget_seconds=10.0, stale_time_seconds=15*60) -> List[ThingsGame]:
+        """
+        Rebuild games from disk, must be called before `start`.
+
+        Games that would be pruned anyway are skipped and the most recently updated ones are rebuilt first. Anything
+        left when `budget_seconds` runs out is dropped so a huge backlog can't hold up the server starting.
+        """
+        t_start = time.monotonic()
+        deadline = t_start + budget_seconds
+        records = _read_records([self.snapshot_path, self.journal_path])
+        now = time.time()
+        states = []
+        for line in records.values():
+            state = json.loads(line)
+            if now - state["last_update_time"] <= stale_time_seconds and state["info"]["players"]:
+                states.append(state)
+        states.sort(key=lambda s: s["last_update_time"], reverse=True)
+
+        games = []
+        for state in states:
+            if time.monotonic() > deadline:
+                break
+            game = ThingsGame.from_state(state)
+            # A match being finalized when the process stopped lost its scheduled step
+            game.cancel_match()
+            games.append(game)
+        # Queued for the writer so the next snapshot forgets everything that wasn't recovered
+        kept = set(game.id for game in games)
+        for game_id in records:
+            if game_id not in kept:
+                self.delete(game_id)
+        dropped = len(states) - len(games)
+        logger.info(f"Recovered {len(games)} games from {len(records)} on disk in "
+                    f"{time.monotonic() - t_start:.2f}s" + (f", dropped {dropped} over budget" if dropped else ""))
+        return games
+
+    def _write(self, batch: List[Tuple[str, str, dict]]):
+        for op, game_id, state in batch:
+            if op == _PUT:
+                self._journal.write(f"{_PUT} {game_id} {json.dumps(state, separators=(',', ':'))}\n")
+            else:
+                self._journal.write(f"{_DELETE} {game_id}\n")
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._journal_records += len(batch)
+
+    def _compact(self):
+        t_start = time.monotonic()
+        self._journal.close()
+        records = _read_records([self.snapshot_path, self.journal_path])
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            for game_id, line in records.items():
+                f.write(f"{_PUT} {game_id} {line}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        # Replacing is atomic, replaying the old journal on top of the new snapshot after a crash is harmless
+        os.replace(tmp_path, self.snapshot_path)
+        self._journal = open(self.journal_path, "w", encoding="utf8")
+        self._journal_records = 0
+        logger.info(f"Wrote snapshot of {len(records)} games in {time.monotonic() - t_start:.2f}s")
+
+    def run(self):
+        running = True
+        while running:
+            items = [self.queue.get()]
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except _queue.Empty:
+                    break
+
+            batch = []
+            compact = False
+            for item in items:
+                if item is None:
+                    running = False
+                elif item[0] == _SNAPSHOT:
+                    compact = True
+                else:
+                    batch.append(item)
+            try:
+                if batch:
+                    self._write(batch)
+                if compact or self._journal_records >= self.max_journal_records:
+                    self._compact()
+            except Exception as e:
+                logger.exception(e)
+        self._journal.close()
+
+
+class JournaledGameStore(GameStore):
+    """Wraps another store, recording every game it adds, changes or removes in a GameJournal"""
+    def __init__(self, store: GameStore, journal: GameJournal):
+        self.store = store
+        self.journal = journal
+        # game id -> (revision, version) last written to the journal
+        self._journaled: Dict[str, Tuple[int, int]] = {}
+
+    def _record(self, game: ThingsGame):
+        marker = (game.revision, game.version)
+        if self._journaled.get(game.id) != marker:
+            self._journaled[game.id] = marker
+            self.journal.put(game)
+
+    def get(self, game_id):
+        return self.store.get(game_id)
+
+    def add(self, game):
+        if not self.store.add(game):
+            return False
+        self._record(game)
+        return True
+
+    def save(self, game):
+        self.store.save(game)
+        self._record(game)
+
+    def remove_if(self, game_id, predicate):
+        game = self.store.remove_if(game_id, predicate)
+        if game:
+            self._journaled.pop(game_id, None)
+            self.journal.delete(game_id)
+        return game
+
+    def expiry_candidates(self, cutoff):
+        return self.store.expiry_candidates(cutoff)
+
+    def games(self):
+        return self.store.games()
+
+    def game_id_pool(self, words=None, owns=None):
+        return self.store.game_id_pool(words, owns)
+
+    def lobby_entries(self):
+        return self.store.lobby_entries()
+
+    def game_ids(self):
+        return self.store.game_ids()
+
+    def __contains__(self, game_id):
+        return game_id in self.store
+
+    def __len__(self):
+        return len(self.store)
+
+    def set_sid(self, game_id, player_id, sid):
+        self.store.set_sid(game_id, player_id, sid)
+
+    def get_sid(self, game_id, player_id):
+        return self.store.get_sid(game_id, player_id)
+
+    def pop_sid(self, game_id, player_id):
+        return self.store.pop_sid(game_id, player_id)
+
+    def pop_sids(self, game_id):
+        return self.store.pop_sids(game_id)
+
+    def pop_connection(self, sid):
+        return self.store.pop_connection(sid)
@@ -0,0 +1,160 @@
+import cProfile
+import marshal
+import pstats
+import random
+import sys
+from collections import Counter
+from typing import Dict, Optional
+
+from things_game.utils import native_module
+
+_threading = native_module("threading")
+_time = native_module("time")
+
+CPROFILE = "cprofile"
+SAMPLE = "sample"
+MODES = (CPROFILE, SAMPLE)
+# Applies to every label without a rate of its own
+DEFAULT = "*"
+# Sampled stacks on which the profiled call wasn't running, e.g. while it waited on Redis
+WAITING = "(waiting)"
+
+
+class HandlerProfiler(object):
+    """
+    Profiles a fraction of the calls made through `call`, per label (socket event, or scheduled:<step>).
+
+    In cprofile mode each chosen call runs under cProfile and the results are merged into one pstats table per label.
+    In sample mode a background OS thread records the chosen call's stack every `interval` seconds as collapsed stacks
+    for flamegraphs. One call is profiled at a time, calls made meanwhile run as usual. Under eventlet a handler
+    waiting on IO lets other greenlets run, cProfile counts their work as part of the handler.
+
+    Nothing is profiled until `configure` sets some rates, until then `enabled` is False and callers skip `call`.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.enabled = False
+        self.mode = CPROFILE
+        self.rates: Dict[str, float] = {}
+        # Results are read from the routes' greenlets and written from the sampler thread
+        self.lock = _threading.Lock()
+        self._random = random.Random()
+        self._busy = False
+        self._stats: Dict[str, pstats.Stats] = {}
+        self._stacks: Dict[str, Counter] = {}
+        self._profiled: Counter = Counter()
+        # OS thread id -> label of the call being sampled on it
+        self._sampling: Dict[int, str] = {}
+        self._sampler = None
+
+    def configure(self, rates: Dict[str, float], mode=CPROFILE):
+        """Profile this fraction of the calls for each label, no rates turns profiling off"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}', expected one of {', '.join(MODES)}")
+        try:
+            rates = {str(label): float(rate) for label, rate in rates.items()}
+        except (AttributeError, TypeError, ValueError):
+            raise ValueError("Profiling rates must map labels to fractions between 0 and 1")
+        if any(not 0 <= rate <= 1 for rate in rates.values()):
+            raise ValueError("Profiling rates must be between 0 and 1")
+        self.mode = mode
+        self.rates = {label: rate for label, rate in rates.items() if rate > 0}
+        self.enabled = bool(self.rates)
+        if self.enabled and mode == SAMPLE and (self._sampler is None or not self._sampler.is_alive()):
+            self._sampler = _threading.Thread(target=self._run_sampler, name="ProfileSampler", daemon=True)
+            self._sampler.start()
+
+    def reset(self):
+        with self.lock:
+            self._stats.clear()
+            self._stacks.clear()
+            self._profiled.clear()
+
+    def call(self, label, func, *args, **kwargs):
+        rate = self.rates.get(label, self.rates.get(DEFAULT, 0))
+        if rate <= 0 or self._busy or self._random.random() >= rate:
+            return func(*args, **kwargs)
+        self._busy = True
+        try:
+            if self.mode == SAMPLE:
+                return self._sample(label, func, args, kwargs)
+            return self._cprofile(label, func, args, kwargs)
+        finally:
+            self._busy = False
+
+    def _cprofile(self, label, func, args, kwargs):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self.lock:
+                stats = self._stats.get(label)
+                if stats is None:
+                    self._stats[label] = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+                self._profiled[label] += 1
+
+    def _sample(self, label, func, args, kwargs):
+        ident = _threading.get_ident()
+        self._sampling[ident] = label
+        try:
+            return func(*args, **kwargs)
+        finally:
+            del self._sampling[ident]
+            with self.lock:
+                self._profiled[label] += 1
+
+    def _run_sampler(self):
+        while self.enabled and self.mode == SAMPLE:
+            _time.sleep(self.interval)
+            if not self._sampling:
+                continue
+            frames = sys._current_frames()
+            for ident, label in list(self._sampling.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    stack = _collapse(frame)
+                    with self.lock:
+                        self._stacks.setdefault(label, Counter())[stack] += 1
+        self._sampler = None
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {"enabled": self.enabled, "mode": self.mode, "rates": dict(self.rates),
+                    "profiled": dict(self._profiled),
+                    "labels": sorted(set(self._stats) | set(self._stacks))}
+
+    def pstats_dump(self, label=None) -> Optional[bytes]:
+        """The profile of `label`, or of every label, in the format pstats.Stats loads. None if there is none"""
+        with self.lock:
+            tables = list(self._stats.values()) if label is None else [self._stats[label]] if label in self._stats else []
+            if not tables:
+                return None
+            merged = pstats.Stats()
+            merged.add(*tables)
+            return marshal.dumps(merged.stats)
+
+    def collapsed_stacks(self, label=None) -> Optional[str]:
+        """Sampled stacks of `label`, or of every label, one "frame;frame;... count" line each for flamegraph.pl"""
+        with self.lock:
+            labels = list(self._stacks) if label is None else [label] if label in self._stacks else []
+            if not labels:
+                return None
+            return "".join(f"{name};{stack} {count}\n" for name in labels
+                           for stack, count in self._stacks[name].items())
+
+
+def _collapse(frame) -> str:
+    """The stack from the profiled call down to `frame`, root first"""
+    names = []
+    while frame is not None:
+        if frame.f_code is HandlerProfiler._sample.__code__:
+            return ";".join(reversed(names))
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    # Under eventlet the thread was running another greenlet at the time
+    return WAITING
@@ -0,0 +1,96 @@
+import time
+from threading import Lock
+from typing import Dict, Tuple
+
+
+# Applies to every event without a limit of its own
+DEFAULT = "*"
+# events per second, burst. Requests that serialize a whole game or list get less room than gameplay commands
+DEFAULT_LIMITS = {
+    DEFAULT: (20.0, 40),
+    "request_update": (2.0, 5),
+    "get_games": (2.0, 5),
+    "get_random_topic": (2.0, 5),
+    "get_topic_packs": (1.0, 3),
+}
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[float, int]]:
+    """
+    Limits from a string like "*=20/40,request_update=2/5": events per second and burst for each event, applied on
+    top of DEFAULT_LIMITS. A rate of 0 lifts the limit.
+    """
+    limits = dict(DEFAULT_LIMITS)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        event, _, limit = item.partition("=")
+        rate, _, burst = limit.partition("/")
+        try:
+            limits[event.strip()] = (float(rate), int(burst or max(1, float(rate))))
+        except ValueError:
+            raise ValueError(f"Invalid rate limit '{item}', expected event=rate/burst")
+    return limits
+
+
+class _Bucket(object):
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class _Client(object):
+    __slots__ = ("buckets", "allowed", "dropped", "limited")
+
+    def __init__(self):
+        self.buckets: Dict[str, _Bucket] = {}
+        self.allowed = 0
+        self.dropped = 0
+        # Whether the last event was dropped, so only the first of a run of dropped events is reported
+        self.limited = False
+
+
+class RateLimiter(object):
+    """
+    Token buckets per connection and event. Each bucket holds up to `burst` tokens and refills at `rate` per second,
+    an event that finds it empty is dropped. Checking is a dict lookup and a little arithmetic under a lock, so a
+    flooding client costs next to nothing once it is limited.
+    """
+    def __init__(self, limits: Dict[str, Tuple[float, int]] = None):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.lock = Lock()
+        self._clients: Dict[str, _Client] = {}
+
+    def allow(self, sid, event) -> Tuple[bool, bool]:
+        """Returns whether the event may be handled, and whether it is the first dropped since the last allowed one"""
+        rate, burst = self.limits.get(event) or self.limits.get(DEFAULT, (0, 0))
+        with self.lock:
+            client = self._clients.get(sid)
+            if client is None:
+                client = self._clients[sid] = _Client()
+            if rate > 0:
+                now = time.monotonic()
+                bucket = client.buckets.get(event)
+                if bucket is None:
+                    bucket = client.buckets[event] = _Bucket(burst, now)
+                else:
+                    bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+                    bucket.updated = now
+                if bucket.tokens < 1:
+                    client.dropped += 1
+                    first = not client.limited
+                    client.limited = True
+                    return False, first
+                bucket.tokens -= 1
+            client.allowed += 1
+            client.limited = False
+            return True, False
+
+    def forget(self, sid):
+        with self.lock:
+            self._clients.pop(sid, None)
+
+    def counters(self) -> Dict[str, dict]:
+        """Events allowed and dropped for every connection seen"""
+        with self.lock:
+            return {sid: {"allowed": c.allowed, "dropped": c.dropped} for sid, c in self._clients.items()}
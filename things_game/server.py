@@ -1,158 +1,635 @@
 import os
+import functools
+import hmac
+import itertools
+import json
 import logging
-from logging.handlers import TimedRotatingFileHandler
-
-import eventlet
-eventlet.monkey_patch()
+import threading
+import time
+from typing import Optional
 
 import flask
 from flask import Flask
 from flask_socketio import SocketIO, join_room, leave_room, send, emit
+from werkzeug.local import LocalProxy
 
-from things_game.logic import GameState, ThingsGame
+from things_game.config import Config
+from things_game.game_ids import load_word_ids
+from things_game.lobby import LobbyFilter, LobbyIndex, DEFAULT_PAGE_SIZE
+from things_game.log import configure_logger
+from things_game.logic import GameState, PlayerState, ThingsGame
 from things_game.manager import GameManager
-from things_game.utils import unpack
-from things_game.errors import GameStateError, PlayerError, InputError
+from things_game.metrics import MetricsRegistry, COUNT_BUCKETS, SIZE_BUCKETS
+from things_game.utils import unpack, rand
+from things_game.errors import GameStateError, PlayerError, InputError, ConcurrentUpdateError
 from things_game.background_scheduler import BackgroundTaskScheduler
-from things_game.topics import TopicsList
-
-
-def configure_logger(stream_level="DEBUG", filename="", file_level="INFO"):
-    fmt = "[%(asctime)s] [%(threadName)s] [%(name)s.%(funcName)s:%(lineno)s] [%(levelname)s]: %(message)s"
-    logging.basicConfig(format=fmt, level=stream_level)
-    if filename:
-        file_handler = TimedRotatingFileHandler(filename, when="midnight", backupCount=14)
-        file_handler.setLevel(file_level)
-        file_handler.setFormatter(logging.Formatter(fmt))
-        tg_logger = logging.getLogger("things_game")
-        tg_logger.addHandler(file_handler)
-
+from things_game.capture import TrafficRecorder
+from things_game.rate_limit import RateLimiter
+from things_game.sharding import HashRing
+from things_game.coalescing import BroadcastCoalescer
+from things_game.profiling import HandlerProfiler
+from things_game.persistence import GameJournal, JournaledGameStore
+from things_game.store import MemoryGameStore, RedisGameStore
+from things_game.topics import TopicLibrary, RELOAD_INTERVAL_S as TOPIC_RELOAD_INTERVAL_S
+from things_game.wire import JSON, encode
 
-LOG_FILENAME = os.path.join(os.path.expanduser("~"), "things_game.log")
-configure_logger(filename=LOG_FILENAME)
 
 logger = logging.getLogger(__name__)
 
-
-app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
-app.secret_key = os.getenv("THINGS_GAME_SECRET_KEY", "")
-
 DEFAULT_PLAYER_COLOR = "blue"
-
-
-manager = GameManager()
-background_scheduler = BackgroundTaskScheduler()
-background_scheduler.start()
-topics = TopicsList()
+# Never held back, like any update that moves the game to another state: clients react to these and the player they
+# carry must not be replaced by a later one. Joins are published before the joiner gets a snapshot that includes them
+IMMEDIATE_EVENTS = frozenset(["game_started", "round_started", "points_reset", "player_removed", "player_joined",
+                              "game_patch"])
+# Game ids are upper case, so this room can't clash with a game's
+LOBBY_ROOM = "lobby"
+# Connection lifecycle events can't be flooded and must always run
+UNLIMITED_EVENTS = frozenset(["connect", "disconnect"])
+# Times a command or scheduled step runs on a fresh copy of a game another worker changed under it
+COMMAND_ATTEMPTS = 3
+# Seconds clients get to show a submitted match before its result, the round's result before announcing the winner,
+# and the winner before the next round starts
+MATCH_RESULT_DELAY_S = 3
+ROUND_COMPLETE_DELAY_S = 2
+NEXT_ROUND_DELAY_S = 6
+
+# Logging is set up once per process, by the first app to start
+_log_listener = None
+
+
+def _configure_logging(config: Config):
+    global _log_listener
+    if _log_listener is None:
+        _log_listener = configure_logger(config.log_level, config.log_filename, json_format=config.log_json,
+                                         repeat_burst=config.log_repeat_burst)
+
+
+class ServerState(object):
+    """
+    Everything one app holds besides its handlers: settings, games, the background scheduler and metrics. Handlers
+    and scheduled tasks reach the state of the app they run for through `state`.
+
+    Creating it only loads the word id and topic lists. Threads, the store and anything that draws random numbers wait
+    for `start`, which gunicorn.conf.py calls in each worker after the fork. Apps that weren't started, in tests and
+    tools, start on their first socket event or request.
+    """
+    def __init__(self, app: Flask, socketio: SocketIO, config: Config):
+        self.app = app
+        self.socketio = socketio
+        self.config = config
+        self.wire_formats = config.wire_formats
+        self.started = False
+        self._start_lock = threading.Lock()
+        # sid -> wire format, only for clients that asked for one other than JSON
+        self.client_formats = {}
+        # (game id, player id) -> grace timer of a player whose connection closed
+        self.grace_timers = {}
+        self.updates_sent = itertools.count()
+
+        self.metrics = metrics = MetricsRegistry()
+        self.handler_latency = metrics.histogram("handler_seconds", "Time spent handling a socket event", ["event"])
+        self.handler_errors = metrics.counter("handler_errors_total",
+                                              "Errors sent back for or raised by a socket event", ["event"])
+        self.update_bytes = metrics.histogram("update_payload_bytes",
+                                              "Encoded size of a sample of the game updates sent", ["event"],
+                                              buckets=SIZE_BUCKETS)
+        self.update_fanout = metrics.histogram("update_fanout", "Connections in the room a game update is sent to",
+                                               ["event"], buckets=COUNT_BUCKETS)
+        self.scheduler_lateness = metrics.histogram("scheduler_lateness_seconds",
+                                                    "How long after their deadline scheduled tasks run")
+        metrics.gauge("scheduler_queue_depth", "Tasks waiting in the background scheduler",
+                      func=lambda: self.scheduler.queue_depth)
+        metrics.gauge("log_records_dropped", "Log records dropped because the writer thread fell behind",
+                      func=lambda: _log_listener.queue_handler.dropped if _log_listener else 0)
+        self.live_games = metrics.gauge("live_games", "Games currently held")
+        self.live_players = metrics.gauge("live_players", "Players in all live games")
+        self.live_observers = metrics.gauge("live_observers", "Observers in all live games")
+        self.events_dropped = metrics.counter("events_rate_limited_total",
+                                              "Socket events dropped by the per connection rate limit", ["event"])
+        self.updates_coalesced = metrics.counter("updates_coalesced_total",
+                                                 "Game updates merged into one already waiting to be sent", ["event"])
+        metrics.add_collector(self._count_participants)
+
+        self.word_ids = load_word_ids()
+        self.topics = TopicLibrary(packs_directory=config.topic_packs_dir)
+        self.lobby = LobbyIndex()
+        self.rate_limiter = RateLimiter(config.rate_limits)
+        self.profiler = HandlerProfiler()
+        self.ring = HashRing(config.shards) if config.shards else None
+        self.scheduler = BackgroundTaskScheduler(observe_lateness=self.scheduler_lateness.observe,
+                                                 run_task=self.run_task)
+        self.recorder: Optional[TrafficRecorder] = None
+        self.manager: Optional[GameManager] = None
+        self.coalescer: Optional[BroadcastCoalescer] = None
+
+    def start(self):
+        if self.started:
+            return
+        with self._start_lock:
+            if self.started:
+                return
+            config = self.config
+            _configure_logging(config)
+            if config.capture_dir:
+                # Seeded before anything draws from the generator, the game id pool shuffles with it below
+                capture_seed = int.from_bytes(os.urandom(8), "big")
+                rand.seed(capture_seed)
+                self.recorder = TrafficRecorder.in_directory(config.capture_dir, capture_seed)
+                self.recorder.start()
+            self.scheduler.start()
+            owns_game_id = self.owns_game_id if self.ring is not None else None
+            store = self._create_store()
+            self.manager = GameManager(store, store.game_id_pool(self.word_ids, owns_game_id), owns_game_id)
+            self.lobby.sync(self.manager.lobby_entries())
+            self.scheduler.run_every(TOPIC_RELOAD_INTERVAL_S, self.topics.reload)
+            # Pruning only looks at games that may have expired, so it can run often enough to free them soon after
+            self.scheduler.run_every(config.prune_interval_s, _prune_task)
+            if config.redis_url:
+                self.scheduler.run_every(config.lobby_sync_interval_s, _sync_lobby)
+            if config.coalesce_window_ms > 0:
+                self.coalescer = BroadcastCoalescer(self.scheduler, config.coalesce_window_ms / 1000, _flush_update)
+            self.started = True
+
+    def stop(self):
+        """Stops the background scheduler and capture, games are left as they are"""
+        self.scheduler.stop()
+        if self.recorder is not None:
+            self.recorder.stop()
+
+    def _create_store(self):
+        config = self.config
+        if config.redis_url:
+            return RedisGameStore(config.redis_url)
+        store = MemoryGameStore()
+        if not config.data_dir:
+            return store
+        journal = GameJournal(config.data_dir)
+        for game in journal.recover(config.recovery_budget_s):
+            store.add(game)
+            if game.info.state == GameState.round_complete:
+                # The next round was scheduled by the process that stopped
+                self.scheduler.run_in(NEXT_ROUND_DELAY_S, _run_scheduled, game.id, _start_next_round)
+        journal.start()
+        self.scheduler.run_every(config.snapshot_interval_s, journal.snapshot)
+        return JournaledGameStore(store, journal)
+
+    def owns_game_id(self, game_id):
+        return self.ring is None or self.ring.server_for(game_id) == self.config.shard
+
+    def _count_participants(self):
+        if self.manager is None:
+            return
+        games, players, observers = self.manager.count_participants()
+        self.live_games.set(games)
+        self.live_players.set(players)
+        self.live_observers.set(observers)
+
+    def run_task(self, action, args, kwargs):
+        """Runs a scheduled task in the app's context, under the profiler if it is on"""
+        with self.app.app_context():
+            if not self.profiler.enabled:
+                return action(*args, **kwargs)
+            # Profiled after the step it runs, _run_scheduled(game_id, finalize) as scheduled:finalize
+            step = next((arg for arg in args if callable(arg)), action)
+            return self.profiler.call(f"scheduled:{getattr(step, '__name__', 'task')}", action, *args, **kwargs)
+
+
+# The state of the app handling the current event, request or scheduled task
+state: ServerState = LocalProxy(lambda: flask.current_app.extensions["things_game"])
+# (event, handler) of every socket handler, registered on each app's SocketIO by create_app
+_socket_handlers = []
+routes = flask.Blueprint("things_game", __name__)
+
+
+def create_app(config: Optional[Config] = None) -> Flask:
+    """
+    A Flask app serving the game, with its own SocketIO in app.extensions["socketio"] and its own games, scheduler and
+    metrics in app.extensions["things_game"]. Settings come from the environment unless `config` is given.
+    """
+    config = config if config is not None else Config.from_env()
+    app = Flask(__name__)
+    app.secret_key = config.secret_key
+    socketio = SocketIO(app, cors_allowed_origins="*", message_queue=config.message_queue or None,
+                        http_compression=True, compression_threshold=config.compression_threshold)
+    app.extensions["things_game"] = ServerState(app, socketio, config)
+    for event, handler in _socket_handlers:
+        socketio.on(event)(handler)
+    app.register_blueprint(routes)
+    return app
+
+
+@routes.before_app_request
+def _start_state():
+    state.start()
+
+
+def update_lobby(game: ThingsGame):
+    entry = state.lobby.update(game)
+    if entry:
+        publish_lobby_changes([entry])
+
+
+def publish_lobby_changes(changed=(), removed=()):
+    if changed or removed:
+        state.socketio.emit("lobby_update", {"games": list(changed), "removed": list(removed)}, room=LOBBY_ROOM)
 
 
 def _prune_task():
-    logger.debug("Pruning games...")
-    games_removed = manager.prune()
+    games_removed = state.manager.prune()
     for game_id in games_removed:
-        socketio.close_room(game_id)
-
-
-background_scheduler.run_every(15*60, _prune_task)
+        for wire_format in state.wire_formats:
+            state.socketio.close_room(_game_room(game_id, wire_format))
+        state.topics.forget(game_id)
+    publish_lobby_changes(removed=[game_id for game_id in games_removed if state.lobby.remove(game_id)])
+
+
+def _sync_lobby():
+    publish_lobby_changes(*state.lobby.sync(state.manager.lobby_entries()))
+
+
+def on_event(event):
+    """
+    Registers a socket event handler like socketio.on, recording its latency and any error it raises. Events over the
+    connection's rate limit are dropped before the handler runs, and in shard-per-core mode events for a game owned by
+    another worker are sent back as `wrong_shard`.
+    """
+    labels = (event,)
+    limited = event not in UNLIMITED_EVENTS
+
+    def decorator(func):
+        @functools.wraps(func)
+        def handler(*args, **kwargs):
+            state.start()
+            flask.g.event = event
+            if state.recorder is not None:
+                state.recorder.record(flask.request.sid, event, args[0] if args else None)
+            if limited:
+                allowed, first_dropped = state.rate_limiter.allow(flask.request.sid, event)
+                if not allowed:
+                    state.events_dropped.inc(labels)
+                    # Only once per run of dropped events, so a flood doesn't turn into log lines and replies
+                    if first_dropped:
+                        logger.warning(f"Rate limiting {event} from {flask.request.sid}")
+                        emit("rate_limited", {"event": event})
+                    return
+            if state.ring is not None and args and isinstance(args[0], dict):
+                game_id = args[0].get("game_id")
+                if game_id and not state.owns_game_id(game_id):
+                    # The game lives on another shard, the client reconnects with ?game_id= and sends it again
+                    emit("wrong_shard", {"game_id": game_id, "event": event, "data": args[0]})
+                    return
+            t_start = time.perf_counter()
+            try:
+                if state.profiler.enabled:
+                    return state.profiler.call(event, func, *args, **kwargs)
+                return func(*args, **kwargs)
+            except BaseException:
+                state.handler_errors.inc(labels)
+                raise
+            finally:
+                state.handler_latency.observe(time.perf_counter() - t_start, labels)
+
+        _socket_handlers.append((event, handler))
+        return handler
+    return decorator
+
+
+@routes.route("/metrics")
+def get_metrics():
+    return flask.Response(state.metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+def admin_route(rule, **options):
+    """Registers a route only served to requests sending the app's admin_token as a Bearer token"""
+    def decorator(func):
+        @functools.wraps(func)
+        def view(*args, **kwargs):
+            admin_token = state.config.admin_token
+            if not admin_token:
+                flask.abort(404)
+            authorization = flask.request.headers.get("Authorization", "")
+            if not hmac.compare_digest(authorization.encode(), f"Bearer {admin_token}".encode()):
+                flask.abort(401)
+            return func(*args, **kwargs)
+
+        return routes.route(rule, **options)(view)
+    return decorator
+
+
+@admin_route("/rate_limits")
+def get_rate_limits():
+    """Events allowed and dropped per connected sid, admin only since a sid is enough to take over its session"""
+    return flask.jsonify(state.rate_limiter.counters())
+
+
+@admin_route("/profile", methods=["GET", "POST"])
+def profile_settings():
+    """
+    POST {"rates": {"submit_match": 0.5, "*": 0.01}, "mode": "cprofile" or "sample", "reset": true} to change what
+    is profiled, empty rates turn profiling off. Both return what is being profiled and the labels with results
+    """
+    profiler = state.profiler
+    if flask.request.method == "POST":
+        settings = flask.request.get_json(force=True, silent=True) or {}
+        try:
+            profiler.configure(settings.get("rates") or {}, settings.get("mode", profiler.mode))
+        except ValueError as e:
+            return flask.jsonify({"error": str(e)}), 400
+        if settings.get("reset"):
+            profiler.reset()
+        logger.info(f"Profiling {profiler.rates or 'off'} in {profiler.mode} mode")
+    return flask.jsonify(profiler.summary())
+
+
+@admin_route("/profile/<label>.pstats")
+def get_profile_stats(label):
+    """cProfile results for one label or "all", load with pstats.Stats(filename) or snakeviz"""
+    data = state.profiler.pstats_dump(None if label == "all" else label)
+    if data is None:
+        flask.abort(404)
+    return flask.Response(data, mimetype="application/octet-stream",
+                          headers={"Content-Disposition": f"attachment; filename={label}.pstats"})
+
+
+@admin_route("/profile/<label>.collapsed")
+def get_profile_stacks(label):
+    """Sampled stacks for one label or "all", for flamegraph.pl or speedscope"""
+    data = state.profiler.collapsed_stacks(None if label == "all" else label)
+    if data is None:
+        flask.abort(404)
+    return flask.Response(data, mimetype="text/plain")
 
 
 class GameCommand(unpack):
+    """
+    Looks up the game for a handler. Changes are written back by `send_update` before they are broadcast, a handler
+    changing the game without one calls `state.manager.save_game` itself. If another worker changed the game in the
+    meantime the handler runs again on a fresh copy, up to COMMAND_ATTEMPTS times.
+    """
     def __init__(self, *args, **kwargs):
         super(GameCommand, self).__init__(*args, **kwargs, game_id="")
 
     def __call__(self, func):
         def f(game_id, *args, **kwargs):
-            game = manager.get_game(game_id)
-            if not game:
-                send_error("Unable to find Game ID {}".format(game_id))
-                return
-            return func(game, *args, **kwargs)
+            for _ in range(COMMAND_ATTEMPTS):
+                game = state.manager.get_game(game_id)
+                if not game:
+                    send_error("Unable to find Game ID {}".format(game_id))
+                    return
+                try:
+                    return func(game, *args, **kwargs)
+                except ConcurrentUpdateError as e:
+                    error = e
+                    logger.warning(f"Game {game_id} was updated during {func.__name__}, retrying")
+            send_error(error)
 
         return super(GameCommand, self).__call__(f)
 
 
+EXPECTED_ERRORS = (PlayerError, InputError, GameStateError, ConcurrentUpdateError)
+
+
 def send_error(error):
-    exc_info = isinstance(error, BaseException)
-    logger.error(error, exc_info=exc_info)
+    if isinstance(error, EXPECTED_ERRORS):
+        logger.warning(error, exc_info=state.config.log_expected_tracebacks)
+    else:
+        logger.error(error, exc_info=isinstance(error, BaseException))
+    state.handler_errors.inc((flask.g.get("event", ""),))
     emit("error", dict(error=str(error)))
 
 
-def send_update(event, game, player=None, context_aware=True):
-    data = {"game": game.to_dict()}
-    if player:
-        data["player"] = player.to_dict()
-    emit_func = emit if context_aware else socketio.emit
-    emit_func(event, data, broadcast=True, room=game.info.game_id)
+def _game_room(game_id, wire_format=JSON):
+    # Clients of a game are split by wire format so each broadcast is encoded once per format
+    return game_id if wire_format == JSON else f"{game_id}/{wire_format}"
+
+
+def _client_format(sid=None):
+    return state.client_formats.get(sid or flask.request.sid, JSON)
+
+
+def join_game_room(game_id, sid=None):
+    sid = sid or flask.request.sid
+    room = _game_room(game_id, _client_format(sid))
+    # Clients poll request_update, only the first call for a connection has to join
+    if sid not in state.socketio.server.manager.rooms.get("/", {}).get(room, ()):
+        join_room(room, sid)
+
+
+def leave_game_room(game_id, sid=None):
+    leave_room(_game_room(game_id, _client_format(sid)), sid)
 
 
-@socketio.on("request_update")
+def emit_to_game(event, data, game_id, context_aware=True):
+    emit_func = emit if context_aware else state.socketio.emit
+    for wire_format in state.wire_formats:
+        emit_func(event, encode(data, wire_format), broadcast=True, room=_game_room(game_id, wire_format))
+
+
+def emit_to_client(event, data):
+    emit(event, encode(data, _client_format()))
+
+
+@on_event("connect")
+def connect():
+    requested = flask.request.args.get("wire")
+    if not requested:
+        return
+    wire_format = requested if requested in state.wire_formats else JSON
+    if wire_format != JSON:
+        state.client_formats[flask.request.sid] = wire_format
+    # Clients that asked for a format are told which one they got, a server without it enabled falls back to JSON
+    emit("wire_format", {"format": wire_format})
+
+
+@on_event("disconnect")
+def disconnect():
+    sid = flask.request.sid
+    state.client_formats.pop(sid, None)
+    state.rate_limiter.forget(sid)
+    for game_id, player_id in state.manager.disconnect(sid):
+        _cancel_grace_timer(game_id, player_id)
+        state.grace_timers[(game_id, player_id)] = state.scheduler.run_in(
+            state.config.reconnect_grace_s, _run_scheduled, game_id, _disconnected_action(game_id, player_id))
+
+
+def _cancel_grace_timer(game_id, player_id):
+    timer = state.grace_timers.pop((game_id, player_id), None)
+    if timer:
+        timer.cancel()
+
+
+def _disconnected_action(game_id, player_id):
+    def disconnected(game: ThingsGame):
+        state.grace_timers.pop((game_id, player_id), None)
+        if state.manager.get_player_sid(game_id, player_id):
+            # Reconnected, possibly to another worker
+            return
+        if state.config.disconnect_action == "remove":
+            initial_state = game.info.state
+            player = game.drop_player(player_id)
+            if player:
+                logger.info(f"Removing player '{player.name}' from game {game_id}, disconnected")
+                send_update("player_left", game, player, context_aware=False)
+                _start_round_if_complete(game, initial_state, context_aware=False)
+        elif game.set_player_state(player_id, PlayerState.inactive):
+            send_update("game_patch", game, context_aware=False, only_if_changed=True)
+
+    return disconnected
+
+
+def _start_round_if_complete(game: ThingsGame, initial_state, context_aware=True):
+    # Removing a player can end the round, the next one starts right away
+    if initial_state != game.info.state and game.info.state == GameState.round_complete:
+        game.start_round()
+        send_update("round_started", game, context_aware=context_aware)
+
+
+def _start_next_round(game: ThingsGame):
+    if game.info.state == GameState.round_complete:
+        game.start_round()
+        send_update("round_started", game, context_aware=False)
+
+
+def _run_scheduled(game_id, action, attempts=COMMAND_ATTEMPTS):
+    """Run `action(game)` from the background scheduler, reloading the game if another worker changed it meanwhile"""
+    for _ in range(attempts):
+        game = state.manager.get_game(game_id)
+        if not game:
+            return
+        try:
+            return action(game)
+        except ConcurrentUpdateError:
+            logger.warning(f"Game {game_id} was updated during a scheduled {action.__name__}, retrying")
+
+
+def _room_size(game_id):
+    # Only the connections of this process, other workers count their own
+    rooms = state.socketio.server.manager.rooms.get("/", {})
+    return sum(len(rooms.get(_game_room(game_id, wire_format), ())) for wire_format in state.wire_formats)
+
+
+def send_update(event, game, player=None, context_aware=True, only_if_changed=False):
+    player_data = player.to_dict() if player else None
+    if state.coalescer is not None and event not in IMMEDIATE_EVENTS and not game.state_changed():
+        # The flush sends a copy loaded from the store, which must already have this change
+        state.manager.save_game(game)
+        if state.coalescer.defer(game.id, event, player_data):
+            state.updates_coalesced.inc((event,))
+        return
+    _broadcast_update(event, game, player_data, context_aware, only_if_changed)
+
+
+def _flush_update(game_id, updates):
+    def flush(game):
+        # The first update carries the window's patch, the others only their player. Changes already sent by an update
+        # that bypassed the window aren't sent again, the players still are
+        for event, player_data in updates:
+            _broadcast_update(event, game, player_data, context_aware=False, only_if_changed=True)
+
+    _run_scheduled(game_id, flush)
+
+
+def _broadcast_update(event, game, player_data, context_aware, only_if_changed):
+    patch = game.publish_patch()
+    if only_if_changed and not patch:
+        if not player_data:
+            return
+        # Only telling clients about a player, there is nothing new to save
+    else:
+        # Saved before broadcasting so nobody sees a version that could still lose to a concurrent update
+        state.manager.save_game(game)
+    data = {"patch": patch}
+    if player_data:
+        data["player"] = player_data
+    labels = (event,)
+    if next(state.updates_sent) % state.config.payload_sample_every == 0:
+        state.update_bytes.observe(len(json.dumps(data)), labels)
+    state.update_fanout.observe(_room_size(game.id), labels)
+    emit_to_game(event, data, game.id, context_aware)
+    update_lobby(game)
+
+
+@on_event("request_update")
 @unpack(game_id="", player_id="", session_key="")
 def request_update(game_id, player_id, session_key):
     response = {"game": None}
-    game = manager.get_game(game_id)
+    game = state.manager.get_game(game_id)
     if game:
         try:
             game.validate_player(player_id, session_key, can_be_observer=True)
-            manager.update_player_sid(game_id, player_id, flask.request.sid)
+            state.manager.update_player_sid(game_id, player_id, flask.request.sid)
+            _cancel_grace_timer(game_id, player_id)
+            game.set_player_state(player_id, PlayerState.active)
             try:
-                join_room(game.id)
+                join_game_room(game.id)
             except Exception as e:
                 logger.exception(e)
-            response["game"] = game.info.to_dict()
-        except PlayerError as e:
+            # Anything not yet broadcast goes to the whole room so the snapshot matches what everyone else has
+            send_update("game_patch", game, only_if_changed=True)
+            response["game"] = game.snapshot()
+        except (PlayerError, ConcurrentUpdateError) as e:
             send_error(e)
-    emit("game_update", response)
+    emit_to_client("game_update", response)
+
+
+@on_event("get_games")
+@unpack(after="", limit=DEFAULT_PAGE_SIZE, not_started=False, no_password=False, min_players=0, max_players=0,
+        subscribe=False)
+def get_games(after, limit, not_started, no_password, min_players, max_players, subscribe):
+    try:
+        lobby_filter = LobbyFilter(not_started, no_password, min_players, max_players)
+        page = state.lobby.page(lobby_filter, after, limit)
+    except (InputError, ValueError, TypeError) as e:
+        send_error(e)
+        return
+    # Subscribers get every lobby change as a lobby_update from then on, no need to poll
+    if subscribe:
+        join_room(LOBBY_ROOM)
+    emit("games", page)
 
 
-@socketio.on("get_games")
-def get_games():
-    games = []
-    for game in manager.get_games():
-        games.append({
-            "id": game.info.id,
-            "name": game.info.name,
-            "password_protected": game.password != "",
-            "password_salt": game.salt,
-        })
-    emit("games", {"games": games})
+@on_event("unsubscribe_lobby")
+def unsubscribe_lobby():
+    leave_room(LOBBY_ROOM)
 
 
-@socketio.on("create_game")
+@on_event("create_game")
 @unpack(name="", password="", salt="", player_name="Unknown", color=DEFAULT_PLAYER_COLOR, observer=False)
 def create_game(name, password, salt, player_name, color, observer):
-    game = manager.create_game(name, password, salt)
+    game = state.manager.create_game(name, password, salt)
     player = game.add_player(player_name, observer, color)
-    manager.update_player_sid(game.id, player.id, flask.request.sid)
+    state.manager.update_player_sid(game.id, player.id, flask.request.sid)
     logger.info("Created game id {} for player '{}'".format(game.id, player_name))
 
-    join_room(game.info.game_id)
+    join_game_room(game.id)
     send_update("player_joined", game, player)
     emit("player_id", {"player_id": player.id, "session_key": player.session_key})
+    emit_to_client("game_update", {"game": game.snapshot()})
 
 
-@socketio.on("join_game")
+@on_event("join_game")
 @GameCommand(password="", player_name="Unknown", color=DEFAULT_PLAYER_COLOR, observer=False)
 def join_game(game: ThingsGame, password, player_name, color, observer):
     if game.password != password:
         send_error("Incorrect password")
         return
     player = game.add_player(player_name, observer, color)
-    manager.update_player_sid(game.id, player.id, flask.request.sid)
+    state.manager.update_player_sid(game.id, player.id, flask.request.sid)
     logger.info("Player '{}' joined game {}".format(player_name, game.id))
 
-    join_room(game.id)
+    join_game_room(game.id)
     send_update("player_joined", game, player)
     emit("player_id", {"player_id": player.id, "session_key": player.session_key})
+    emit_to_client("game_update", {"game": game.snapshot()})
 
 
-@socketio.on("leave_game")
+@on_event("leave_game")
 @GameCommand(player_id="", session_key="")
 def leave_game(game: ThingsGame, player_id, session_key):
     try:
         initial_state = game.info.state
-        leave_room(game.id)
-        manager.remove_player_sid(game.id, player_id)
+        leave_game_room(game.id)
+        state.manager.remove_player_sid(game.id, player_id)
         player = game.remove_player(player_id, session_key)
         new_state = game.info.state
         logger.info("Player '{}' left game {}".format(player.name, game.id))
@@ -166,7 +643,7 @@ def leave_game(game: ThingsGame, player_id, session_key):
         send_update("round_started", game)
 
 
-@socketio.on("remove_player")
+@on_event("remove_player")
 @GameCommand(player_id="", session_key="", player_id_to_remove="")
 def remove_player(game: ThingsGame, player_id, session_key, player_id_to_remove):
     try:
@@ -175,9 +652,9 @@ def remove_player(game: ThingsGame, player_id, session_key, player_id_to_remove)
         new_state = game.info.state
         send_update("player_removed", game, player)
 
-        player_sid = manager.remove_player_sid(game.id, player_id_to_remove)
+        player_sid = state.manager.remove_player_sid(game.id, player_id_to_remove)
         if player_sid:
-            leave_room(game.id, player_sid)
+            leave_game_room(game.id, player_sid)
     except PlayerError as e:
         send_error(e)
         return
@@ -186,19 +663,20 @@ def remove_player(game: ThingsGame, player_id, session_key, player_id_to_remove)
         send_update("round_started", game)
 
 
-@socketio.on("change_color")
+@on_event("change_color")
 @GameCommand(player_id="", session_key="", color="")
 def change_color(game: ThingsGame, player_id, session_key, color):
     try:
         if not color:
             raise InputError("Failed to set color")
-        player = game.validate_player(player_id, session_key)
-        player.color = color
+        game.change_color(player_id, session_key, color)
+        # Not broadcast, clients get the new color with the next update
+        state.manager.save_game(game)
     except (GameStateError, PlayerError, InputError) as e:
         send_error(e)
 
 
-@socketio.on("start_game")
+@on_event("start_game")
 @GameCommand(player_id="", session_key="")
 def start_game(game: ThingsGame, player_id, session_key):
     try:
@@ -209,7 +687,7 @@ def start_game(game: ThingsGame, player_id, session_key):
         send_error(e)
 
 
-@socketio.on("reset_points")
+@on_event("reset_points")
 @GameCommand(player_id="", session_key="")
 def reset_points(game: ThingsGame, player_id, session_key):
     try:
@@ -219,13 +697,33 @@ def reset_points(game: ThingsGame, player_id, session_key):
         send_error(e)
 
 
-@socketio.on("get_random_topic")
-def get_random_topic():
-    topic = topics.get_random_topic()
+@on_event("get_random_topic")
+@unpack(game_id="", player_id="", session_key="", pack="")
+def get_random_topic(game_id, player_id, session_key, pack):
+    # Topics are only kept from repeating within games that exist, and only its players draw from a game's bag
+    game = state.manager.get_game(game_id) if game_id else None
+    if game is None:
+        game_id = ""
+    else:
+        try:
+            game.validate_player(player_id, session_key)
+        except PlayerError as e:
+            send_error(e)
+            return
+    try:
+        topic = state.topics.get_random_topic(game_id, pack)
+    except InputError as e:
+        send_error(e)
+        return
     emit("random_topic", {"text": topic})
 
 
-@socketio.on("set_topic")
+@on_event("get_topic_packs")
+def get_topic_packs():
+    emit("topic_packs", {"packs": [{"name": name, "size": size} for name, size in state.topics.pack_sizes().items()]})
+
+
+@on_event("set_topic")
 @GameCommand(player_id="", session_key="", topic="")
 def set_topic(game: ThingsGame, player_id, session_key, topic):
     if not topic:
@@ -238,7 +736,7 @@ def set_topic(game: ThingsGame, player_id, session_key, topic):
         send_error(e)
 
 
-@socketio.on("skip_topic_writer")
+@on_event("skip_topic_writer")
 @GameCommand(player_id="", session_key="")
 def skip_topic_writer(game: ThingsGame, player_id, session_key):
     try:
@@ -248,7 +746,7 @@ def skip_topic_writer(game: ThingsGame, player_id, session_key):
         send_error(e)
 
 
-@socketio.on("submit_answer")
+@on_event("submit_answer")
 @GameCommand(player_id="", session_key="", answer="")
 def submit_answer(game: ThingsGame, player_id, session_key, answer):
     if not answer:
@@ -261,7 +759,7 @@ def submit_answer(game: ThingsGame, player_id, session_key, answer):
         send_error(e)
 
 
-@socketio.on("skip_answer")
+@on_event("skip_answer")
 @GameCommand(player_id="", session_key="")
 def skip_answer(game: ThingsGame, player_id, session_key):
     try:
@@ -271,7 +769,7 @@ def skip_answer(game: ThingsGame, player_id, session_key):
 
 
 
-@socketio.on("submit_match")
+@on_event("submit_match")
 @GameCommand(player_id="", session_key="", guessed_player_id="", answer_id="")
 def submit_match(game: ThingsGame, player_id, session_key, guessed_player_id, answer_id):
     try:
@@ -280,27 +778,28 @@ def submit_match(game: ThingsGame, player_id, session_key, guessed_player_id, an
         data = {"player": player.to_dict(),
                 "guessed_answer": guessed_answer.to_dict(),
                 "guessed_player": guessed_player_answer.player.to_dict()}
-        emit("match_submitted", data, broadcast=True, room=game.info.game_id, include_self=True)
+        state.manager.save_game(game)
+        emit_to_game("match_submitted", data, game.id)
     except (GameStateError, PlayerError, InputError) as e:
         send_error(e)
         return
 
-    def round_started():
-        game.start_round()
-        send_update("round_started", game, context_aware=False)
-
-    def round_complete():
-        round_complete_data = {"winner": player.to_dict()}
-        socketio.emit("round_complete", round_complete_data,
-                      broadcast=True, room=game.info.game_id)
-        background_scheduler.run_in(6, round_started)
-
-    def finalize():
-        result = game.finalize_match(player, guessed_answer, guessed_player_answer)
-        match_result_data = {"game": game.info.to_dict(), "result": result}
-        socketio.emit("match_result", match_result_data,
-                      room=game.info.game_id)
-        if game.info.state == GameState.round_complete:
-            background_scheduler.run_in(2, round_complete)
-
-    background_scheduler.run_in(3, finalize)
+    # The scheduled steps only hold on to ids, the game itself is looked up again when they run
+    game_id = game.id
+    answer_ids = (guessed_answer.id, guessed_player_answer.id)
+
+    def round_complete(winner):
+        round_complete_data = {"winner": winner}
+        emit_to_game("round_complete", round_complete_data, game_id, context_aware=False)
+        state.scheduler.run_in(NEXT_ROUND_DELAY_S, _run_scheduled, game_id, _start_next_round)
+
+    def finalize(game: ThingsGame):
+        result = game.finalize_match(player_id, *answer_ids)
+        match_result_data = {"patch": game.publish_patch(), "result": result}
+        state.manager.save_game(game)
+        emit_to_game("match_result", match_result_data, game_id, context_aware=False)
+        update_lobby(game)
+        if result and game.info.state == GameState.round_complete:
+            state.scheduler.run_in(ROUND_COMPLETE_DELAY_S, round_complete, game.info.players.get(player_id).to_dict())
+
+    state.scheduler.run_in(MATCH_RESULT_DELAY_S, _run_scheduled, game_id, finalize)
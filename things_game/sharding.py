@@ -0,0 +1,85 @@
+"""
+Shard-per-core mode: every worker owns the games whose ids hash to it and nginx routes each client to the owner of
+its game, so workers share nothing.
+
+    python -m things_game.sharding 127.0.0.1:8000 127.0.0.1:8001 > /etc/nginx/sites-available/things-game
+"""
+import argparse
+import os
+import re
+import zlib
+from bisect import bisect_left
+from typing import Sequence
+
+# nginx places every upstream server at 160 points of the ring per unit of weight
+POINTS_PER_SERVER = 160
+NGINX_TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "deploy",
+                              "things-game.nginx.conf")
+# Clients connect with ?game_id= once they have a game, and a random ?shard_key= to spread those without one
+_NGINX_UPSTREAM = """map $arg_game_id $things_game_shard_key {{
+    "" $arg_shard_key;
+    default $arg_game_id;
+}}
+
+# Generated by `python -m things_game.sharding`. Every worker owns the games whose ids hash to it, the workers must be
+# started with THINGS_GAME_SHARDS={servers} and THINGS_GAME_SHARD set to their own entry
+upstream things_game_socketio {{
+    hash $things_game_shard_key consistent;
+{entries}
+}}"""
+
+
+class HashRing(object):
+    """
+    Consistent hashing of game ids onto worker addresses. The ring is built point for point like the one nginx builds
+    for `hash $key consistent` over the same `server host:port` entries, so nginx sends a client to the worker that
+    owns its game and adding a worker only moves the games that hash to it.
+    """
+    def __init__(self, servers: Sequence[str]):
+        if not servers:
+            raise ValueError("A hash ring needs at least one server")
+        self.servers = list(servers)
+        points = {}
+        for server in self.servers:
+            host, _, port = server.rpartition(":") if ":" in server else (server, "", "")
+            # crc32(host \0 port previous_point), like Cache::Memcached::Fast
+            base = zlib.crc32(host.encode() + b"\0" + port.encode())
+            point = 0
+            for _ in range(POINTS_PER_SERVER):
+                point = zlib.crc32(point.to_bytes(4, "little"), base)
+                points.setdefault(point, server)
+        self._points = sorted(points)
+        self._servers = [points[point] for point in self._points]
+
+    def server_for(self, key: str) -> str:
+        index = bisect_left(self._points, zlib.crc32(key.encode("utf8")))
+        return self._servers[index % len(self._points)]
+
+
+def render_nginx_config(servers: Sequence[str], template=NGINX_TEMPLATE) -> str:
+    """The nginx site config with its upstream replaced by one routing each game to its worker"""
+    with open(template, "r") as f:
+        config = f.read()
+    upstream = _NGINX_UPSTREAM.format(servers=",".join(servers),
+                                      entries="\n".join(f"    server {server};" for server in servers))
+    config, count = re.subn(r"(#[^\n]*\n)*upstream things_game_socketio \{.*?\}", lambda _: upstream, config,
+                            flags=re.S)
+    if count != 1:
+        raise ValueError(f"Expected one things_game_socketio upstream in {template}")
+    return config
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("servers", nargs="+", help="host:port of every worker, in the same order everywhere")
+    parser.add_argument("--template", default=NGINX_TEMPLATE)
+    parser.add_argument("--owner", metavar="GAME_ID", help="print the worker owning a game id instead")
+    args = parser.parse_args()
+    if args.owner:
+        print(HashRing(args.servers).server_for(args.owner))
+    else:
+        print(render_nginx_config(args.servers, args.template), end="")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,392 @@
+import json
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from things_game.errors import ConcurrentUpdateError
+from things_game.expiry import ExpiryIndex
+from things_game.game_ids import GameIdPool, RedisGameIdPool
+from things_game.lobby import lobby_entry
+from things_game.logic import ThingsGame
+
+
+class GameStore(object):
+    """Where GameManager keeps games and the socket ids of their players"""
+    def get(self, game_id) -> Optional[ThingsGame]:
+        raise NotImplementedError
+
+    def add(self, game: ThingsGame) -> bool:
+        """Store a new game, returns False if its id is already taken"""
+        raise NotImplementedError
+
+    def save(self, game: ThingsGame):
+        """Persist changes made to a game returned by `get`, raises ConcurrentUpdateError if it was changed elsewhere"""
+        raise NotImplementedError
+
+    def remove_if(self, game_id, predicate) -> Optional[ThingsGame]:
+        """Remove the game if `predicate(game)` holds for the latest copy, returns the removed game"""
+        raise NotImplementedError
+
+    def expiry_candidates(self, cutoff) -> Iterable[str]:
+        """
+        Ids of games that may have gone stale, at least every game last updated at or before `cutoff`. Should cost
+        about as much as the number of ids returned, the caller checks each one again before removing it.
+        """
+        raise NotImplementedError
+
+    def games(self) -> Iterable[ThingsGame]:
+        raise NotImplementedError
+
+    def game_id_pool(self, words: Iterable[str] = None, owns=None):
+        """The pool new game ids come from, one that every process sharing the store draws from if it has one"""
+        return GameIdPool(words, owns)
+
+    def lobby_entries(self) -> Iterable[dict]:
+        """The lobby entry of every game, stores keeping games elsewhere should answer without loading them"""
+        return [lobby_entry(game) for game in self.games()]
+
+    def game_ids(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def __contains__(self, game_id):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def set_sid(self, game_id, player_id, sid):
+        raise NotImplementedError
+
+    def get_sid(self, game_id, player_id):
+        raise NotImplementedError
+
+    def pop_sid(self, game_id, player_id):
+        raise NotImplementedError
+
+    def pop_sids(self, game_id) -> Dict[str, str]:
+        raise NotImplementedError
+
+    def pop_connection(self, sid) -> List[Tuple[str, str]]:
+        """Forget a closed connection, returns the (game id, player id) pairs it was still the current sid of"""
+        raise NotImplementedError
+
+
+class MemoryGameStore(GameStore):
+    """
+    Keeps live game objects in this process, `save` has nothing to do.
+
+    Reads never take a lock: single dict operations are atomic, and games are only ever added or removed whole.
+    Writers to the games, the socket ids and the expiry index each have their own lock, held only for the individual
+    update. Games report their changes to the expiry index themselves through `on_updated`.
+    """
+    def __init__(self):
+        self.games_lock = Lock()
+        self.sids_lock = Lock()
+        self.expiry_lock = Lock()
+        self._games: Dict[str, ThingsGame] = {}
+        self._expiry = ExpiryIndex()
+        # game id -> player id -> sid, and the reverse so a closed connection is cleaned up without a search
+        self._sids: Dict[str, Dict[str, str]] = {}
+        self._connections: Dict[str, Set[Tuple[str, str]]] = {}
+
+    def get(self, game_id):
+        return self._games.get(game_id, None)
+
+    def add(self, game):
+        with self.games_lock:
+            if game.id in self._games:
+                return False
+            self._games[game.id] = game
+        game.on_updated = self._touch
+        self._touch(game)
+        return True
+
+    def _touch(self, game):
+        with self.expiry_lock:
+            self._expiry.touch(game)
+
+    def save(self, game):
+        pass
+
+    def remove_if(self, game_id, predicate):
+        with self.games_lock:
+            game = self._games.get(game_id)
+            if game is None or not predicate(game):
+                return None
+            del self._games[game_id]
+        game.on_updated = None
+        with self.expiry_lock:
+            self._expiry.discard(game_id)
+        return game
+
+    def expiry_candidates(self, cutoff):
+        with self.expiry_lock:
+            return self._expiry.expired(cutoff)
+
+    def games(self):
+        return list(self._games.values())
+
+    def game_ids(self):
+        return list(self._games)
+
+    def __contains__(self, game_id):
+        return game_id in self._games
+
+    def __len__(self):
+        return len(self._games)
+
+    def _unlink(self, sid, game_id, player_id):
+        players = self._connections.get(sid)
+        if players is not None:
+            players.discard((game_id, player_id))
+            if not players:
+                del self._connections[sid]
+
+    def set_sid(self, game_id, player_id, sid):
+        with self.sids_lock:
+            game_sids = self._sids.setdefault(game_id, {})
+            previous = game_sids.get(player_id)
+            if previous and previous != sid:
+                self._unlink(previous, game_id, player_id)
+            game_sids[player_id] = sid
+            self._connections.setdefault(sid, set()).add((game_id, player_id))
+
+    def get_sid(self, game_id, player_id):
+        return self._sids.get(game_id, {}).get(player_id, "")
+
+    def pop_sid(self, game_id, player_id):
+        with self.sids_lock:
+            game_sids = self._sids.get(game_id)
+            if not game_sids:
+                return ""
+            sid = game_sids.pop(player_id, "")
+            if sid:
+                self._unlink(sid, game_id, player_id)
+            return sid
+
+    def pop_sids(self, game_id):
+        with self.sids_lock:
+            game_sids = self._sids.pop(game_id, {})
+            for player_id, sid in game_sids.items():
+                self._unlink(sid, game_id, player_id)
+            return game_sids
+
+    def pop_connection(self, sid):
+        with self.sids_lock:
+            players = self._connections.pop(sid, ())
+            for game_id, player_id in players:
+                game_sids = self._sids.get(game_id)
+                if game_sids and game_sids.get(player_id) == sid:
+                    del game_sids[player_id]
+            return list(players)
+
+
+class RedisGameStore(GameStore):
+    """
+    Keeps games in Redis (or anything speaking its protocol) so several server processes can share them.
+
+    Each game is a hash holding its JSON state and a generation number. Every process works on its own copy: `save`
+    only writes if the generation is still the one the copy was loaded at (WATCH/MULTI), otherwise it raises
+    ConcurrentUpdateError and the copy must be reloaded. The lobby entry of every game is kept next to it in one more
+    hash, so the lobby and the metrics never have to load the games.
+    """
+    def __init__(self, url="redis://localhost:6379/0", client=None, prefix="things_game"):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("The redis package is required to use RedisGameStore")
+        if client is None:
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.redis = client
+        self._watch_error = redis.WatchError
+        self.prefix = prefix
+        self._ids_key = f"{prefix}:games"
+        # Sorted set of game ids scored by last update, games without players score 0 so they expire right away
+        self._expiry_key = f"{prefix}:expiry"
+        # Hash of game id -> JSON lobby entry, written along with the game
+        self._lobby_key = f"{prefix}:lobby"
+        self._free_ids_key = f"{prefix}:free_ids"
+
+    def _game_key(self, game_id):
+        return f"{self.prefix}:game:{game_id}"
+
+    def _sids_key(self, game_id):
+        return f"{self.prefix}:sids:{game_id}"
+
+    def _connection_key(self, sid):
+        # Set of "game id:player id" the connection is the current sid of
+        return f"{self.prefix}:connection:{sid}"
+
+    @staticmethod
+    def _expiry_score(game: ThingsGame):
+        return game.last_update_time if game.info.players else 0
+
+    @staticmethod
+    def _track(game: ThingsGame, generation):
+        game.store_token = (int(generation), game.revision, game.version)
+
+    def _load(self, generation, state):
+        if generation is None or state is None:
+            return None
+        game = ThingsGame.from_state(json.loads(state))
+        self._track(game, generation)
+        return game
+
+    def get(self, game_id):
+        generation, state = self.redis.hmget(self._game_key(game_id), "generation", "state")
+        return self._load(generation, state)
+
+    def add(self, game):
+        key = self._game_key(game.id)
+        state = json.dumps(game.to_state())
+        with self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.exists(key):
+                    return False
+                pipe.multi()
+                pipe.hset(key, mapping={"generation": 1, "state": state})
+                pipe.sadd(self._ids_key, game.id)
+                pipe.zadd(self._expiry_key, {game.id: self._expiry_score(game)})
+                pipe.hset(self._lobby_key, game.id, json.dumps(lobby_entry(game)))
+                pipe.execute()
+            except self._watch_error:
+                return False
+        self._track(game, 1)
+        return True
+
+    def save(self, game):
+        if game.store_token is None:
+            # Either never stored or it lost a race already, the caller has been told
+            return
+        generation, revision, version = game.store_token
+        if (revision, version) == (game.revision, game.version):
+            return
+        key = self._game_key(game.id)
+        state = json.dumps(game.to_state())
+        conflict = False
+        with self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                stored_generation = pipe.hget(key, "generation")
+                if stored_generation is None or int(stored_generation) != generation:
+                    conflict = True
+                else:
+                    pipe.multi()
+                    pipe.hset(key, mapping={"generation": generation + 1, "state": state})
+                    pipe.zadd(self._expiry_key, {game.id: self._expiry_score(game)})
+                    pipe.hset(self._lobby_key, game.id, json.dumps(lobby_entry(game)))
+                    pipe.execute()
+            except self._watch_error:
+                conflict = True
+        if conflict:
+            game.store_token = None
+            raise ConcurrentUpdateError("Game was updated by another request, please try again")
+        self._track(game, generation + 1)
+
+    def remove_if(self, game_id, predicate):
+        key = self._game_key(game_id)
+        with self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                game = self._load(*pipe.hmget(key, "generation", "state"))
+                if game is None or not predicate(game):
+                    return None
+                pipe.multi()
+                pipe.delete(key)
+                pipe.srem(self._ids_key, game_id)
+                pipe.zrem(self._expiry_key, game_id)
+                pipe.hdel(self._lobby_key, game_id)
+                pipe.execute()
+            except self._watch_error:
+                # Updated since it was loaded, so it is still in use
+                return None
+        return game
+
+    def expiry_candidates(self, cutoff):
+        return self.redis.zrangebyscore(self._expiry_key, "-inf", cutoff)
+
+    def games(self):
+        game_ids = list(self.redis.smembers(self._ids_key))
+        with self.redis.pipeline(transaction=False) as pipe:
+            for game_id in game_ids:
+                pipe.hmget(self._game_key(game_id), "generation", "state")
+            results = pipe.execute()
+        games = [self._load(generation, state) for generation, state in results]
+        return [game for game in games if game]
+
+    def game_id_pool(self, words=None, owns=None):
+        if owns is not None:
+            raise ValueError("Game ids can't be restricted to a shard with Redis")
+        return RedisGameIdPool(self.redis, self._free_ids_key, self._ids_key, words)
+
+    def lobby_entries(self):
+        return [json.loads(entry) for entry in self.redis.hvals(self._lobby_key)]
+
+    def game_ids(self):
+        return list(self.redis.smembers(self._ids_key))
+
+    def __contains__(self, game_id):
+        return bool(self.redis.exists(self._game_key(game_id)))
+
+    def __len__(self):
+        return self.redis.scard(self._ids_key)
+
+    def set_sid(self, game_id, player_id, sid):
+        member = f"{game_id}:{player_id}"
+        with self.redis.pipeline() as pipe:
+            pipe.hget(self._sids_key(game_id), player_id)
+            pipe.hset(self._sids_key(game_id), player_id, sid)
+            pipe.sadd(self._connection_key(sid), member)
+            previous = pipe.execute()[0]
+        if previous and previous != sid:
+            self.redis.srem(self._connection_key(previous), member)
+
+    def get_sid(self, game_id, player_id):
+        return self.redis.hget(self._sids_key(game_id), player_id) or ""
+
+    def pop_sid(self, game_id, player_id):
+        key = self._sids_key(game_id)
+        with self.redis.pipeline() as pipe:
+            pipe.hget(key, player_id)
+            pipe.hdel(key, player_id)
+            sid, _ = pipe.execute()
+        if sid:
+            self.redis.srem(self._connection_key(sid), f"{game_id}:{player_id}")
+        return sid or ""
+
+    def pop_sids(self, game_id):
+        key = self._sids_key(game_id)
+        with self.redis.pipeline() as pipe:
+            pipe.hgetall(key)
+            pipe.delete(key)
+            sids, _ = pipe.execute()
+        if sids:
+            with self.redis.pipeline(transaction=False) as pipe:
+                for player_id, sid in sids.items():
+                    pipe.srem(self._connection_key(sid), f"{game_id}:{player_id}")
+                pipe.execute()
+        return sids or {}
+
+    def pop_connection(self, sid):
+        key = self._connection_key(sid)
+        with self.redis.pipeline() as pipe:
+            pipe.smembers(key)
+            pipe.delete(key)
+            members, _ = pipe.execute()
+        players = []
+        for member in members:
+            game_id, _, player_id = member.partition(":")
+            sids_key = self._sids_key(game_id)
+            with self.redis.pipeline() as pipe:
+                try:
+                    # Only if the player hasn't reconnected with another sid meanwhile
+                    pipe.watch(sids_key)
+                    if pipe.hget(sids_key, player_id) != sid:
+                        continue
+                    pipe.multi()
+                    pipe.hdel(sids_key, player_id)
+                    pipe.execute()
+                except self._watch_error:
+                    continue
+            players.append((game_id, player_id))
+        return players
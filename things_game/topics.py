@@ -1,39 +1,170 @@
-import time
+import mmap
 import os
 import threading
-import random
+import time
+from array import array
+from typing import Dict, Tuple
+import logging
+
+from things_game.errors import InputError
+from things_game.utils import rand
 
 
+logger = logging.getLogger(__name__)
+
 DEFAULT_FILE = os.path.join(os.path.dirname(__file__), "topics.txt")
-T_MIN_CHECK_INTERVAL_S = 15*60
-
-
-class TopicsList(object):
-    def __init__(self, topics_file=None):
-        if not topics_file:
-            topics_file = DEFAULT_FILE
-        if not os.path.isfile(topics_file):
-            raise ValueError(f"Topics file must exist on disk. Unable to find '{topics_file}'")
-        self._topics_filename = topics_file
-        self._lock = threading.RLock()
-        self._topics = []
-        self._t_last_load = 0
-
-    def _load_list_from_file(self):
-        with self._lock:
-            with open(self._topics_filename, "r") as f:
-                self._topics = [line.strip() for line in f if line.strip()]
-            self._t_last_load = int(time.time())
-
-    def _check_list_updated(self):
-        with self._lock:
-            if time.time() - self._t_last_load < T_MIN_CHECK_INTERVAL_S:
-                return
-            f_update_time = os.stat(self._topics_filename).st_mtime
-            if f_update_time > self._t_last_load:
-                self._load_list_from_file()
-
-    def get_random_topic(self):
-        self._check_list_updated()
-        with self._lock:
-            return random.choice(self._topics)
+DEFAULT_PACK = "default"
+RELOAD_INTERVAL_S = 60
+# Lines indexed between chances for other green threads to run while a large pack loads
+_INDEX_BATCH = 10000
+
+
+class TopicPack(object):
+    """
+    The topics in one file, one per line. The file is memory mapped and only the byte range of each line is kept, a
+    topic is decoded when it is drawn. Replace pack files with a rename rather than rewriting them in place, a mapped
+    file that shrinks under a reader crashes the process.
+    """
+    def __init__(self, name, filename):
+        self.name = name
+        self.filename = filename
+        with open(filename, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.mtime = stat.st_mtime
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+        self._starts, self._ends = self._index(self._data)
+
+    @staticmethod
+    def _index(data):
+        starts = array("Q")
+        ends = array("Q")
+        size = len(data)
+        start = 0
+        lines = 0
+        while start < size:
+            end = data.find(b"\n", start)
+            if end == -1:
+                end = size
+            if data[start:end].strip():
+                starts.append(start)
+                ends.append(end)
+            start = end + 1
+            lines += 1
+            if lines % _INDEX_BATCH == 0:
+                time.sleep(0)
+        return starts, ends
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __getitem__(self, index):
+        return self._data[self._starts[index]:self._ends[index]].decode("utf8").strip()
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+
+class ShuffleBag(object):
+    """
+    Draws every number below `size` once, in random order, before starting over. Only the positions a draw moved are
+    stored (a sparse Fisher-Yates shuffle), so memory grows with the number of draws rather than with `size`.
+    """
+    __slots__ = ("size", "_remaining", "_moved")
+
+    def __init__(self, size):
+        self.size = size
+        self._remaining = size
+        self._moved: Dict[int, int] = {}
+
+    def draw(self):
+        if self._remaining == 0:
+            self._remaining = self.size
+            self._moved.clear()
+        last = self._remaining - 1
+        position = rand.randrange(self._remaining)
+        value = self._moved.get(position, position)
+        if position != last:
+            self._moved[position] = self._moved.get(last, last)
+        self._moved.pop(last, None)
+        self._remaining = last
+        return value
+
+
+class TopicLibrary(object):
+    """
+    Named topic packs: `default` from `default_file`, plus one per .txt file in `packs_directory` named after it.
+
+    Every game draws from its own shuffle bag per pack, so it only sees a topic again once it has seen the whole pack.
+    Files are never checked on the request path, `reload` picks up changes and is meant to run in the background.
+    """
+    def __init__(self, default_file=None, packs_directory=""):
+        self.default_file = default_file or DEFAULT_FILE
+        if not os.path.isfile(self.default_file):
+            raise ValueError(f"Topics file must exist on disk. Unable to find '{self.default_file}'")
+        self.packs_directory = packs_directory
+        self.packs: Dict[str, TopicPack] = {}
+        # Packs replaced by the last reload, closed by the next one
+        self._retired = []
+        self.lock = threading.Lock()
+        # game id -> pack name -> (pack the bag was made for, bag)
+        self._bags: Dict[str, Dict[str, Tuple[TopicPack, ShuffleBag]]] = {}
+        self.reload()
+
+    def _pack_files(self):
+        files = {}
+        if self.packs_directory and os.path.isdir(self.packs_directory):
+            for filename in sorted(os.listdir(self.packs_directory)):
+                name, ext = os.path.splitext(filename)
+                if ext == ".txt":
+                    files[name] = os.path.join(self.packs_directory, filename)
+        files[DEFAULT_PACK] = self.default_file
+        return files
+
+    def reload(self):
+        """Load new and changed pack files, packs whose file is gone are dropped"""
+        packs = {}
+        for name, filename in self._pack_files().items():
+            current = self.packs.get(name)
+            try:
+                if current and current.filename == filename and current.mtime == os.stat(filename).st_mtime:
+                    packs[name] = current
+                    continue
+                packs[name] = TopicPack(name, filename)
+                logger.info(f"Loaded {len(packs[name])} topics into pack '{name}' from {filename}")
+            except (OSError, ValueError) as e:
+                logger.exception(e)
+                if current:
+                    packs[name] = current
+        # Swapped in whole, a draw in progress keeps using the packs it started with. Their maps are only closed a
+        # reload later, once no draw can still be reading them
+        for pack in self._retired:
+            pack.close()
+        kept = {id(pack) for pack in packs.values()}
+        self._retired = [pack for pack in self.packs.values() if id(pack) not in kept]
+        self.packs = packs
+
+    def pack_sizes(self):
+        return {name: len(pack) for name, pack in self.packs.items()}
+
+    def get_random_topic(self, game_id="", pack_name=DEFAULT_PACK):
+        pack = self.packs.get(pack_name or DEFAULT_PACK)
+        if pack is None:
+            raise InputError(f"Unknown topic pack '{pack_name}'")
+        if not len(pack):
+            return ""
+        if not game_id:
+            return pack[rand.randrange(len(pack))]
+        with self.lock:
+            game_bags = self._bags.setdefault(game_id, {})
+            entry = game_bags.get(pack.name)
+            if entry is None or entry[0] is not pack:
+                # New game, or the pack was reloaded since and the old order no longer matches its lines
+                entry = game_bags[pack.name] = (pack, ShuffleBag(len(pack)))
+            index = entry[1].draw()
+        return pack[index]
+
+    def forget(self, game_id):
+        """Drop the shuffle bags of a game that was removed"""
+        with self.lock:
+            self._bags.pop(game_id, None)
@@ -1,22 +1,45 @@
-import os
+import importlib
 import string
 from enum import Enum
 import random
 import secrets
 import base64
+from copy import copy
+from operator import attrgetter
 
 
-rand = random.SystemRandom()
+class SeedableRandom(random.Random):
+    """
+    Draws from the OS like SystemRandom until `seed` is called with a value, from then on it is a reproducible
+    Mersenne Twister sequence. Lets recorded traffic be replayed with the same ids, shuffles and topic writers.
+    """
+    def __init__(self):
+        self._system = random.SystemRandom()
+        self.seeded = False
+        super(SeedableRandom, self).__init__()
 
-word_list = []
+    def seed(self, a=None, version=2):
+        super(SeedableRandom, self).seed(a, version)
+        self.seeded = a is not None
 
+    def random(self):
+        return super(SeedableRandom, self).random() if self.seeded else self._system.random()
 
-def _init_word_list():
-    with open(os.path.join(os.path.dirname(__file__), "word_id_list.txt"), "r") as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                word_list.append(line.upper())
+    def getrandbits(self, k):
+        return super(SeedableRandom, self).getrandbits(k) if self.seeded else self._system.getrandbits(k)
+
+
+# Every random choice in the game goes through this one generator, session keys use `secrets` and are never seeded
+rand = SeedableRandom()
+
+
+def native_module(name):
+    """The standard library module as it was before eventlet monkey patching, for work that needs real OS threads"""
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return importlib.import_module(name)
+    return patcher.original(name)
 
 
 class unpack(object):
@@ -25,7 +48,9 @@ class unpack(object):
         self.optional = kwargs
 
     def __call__(self, func):
-        def f(data):
+        def f(data=None):
+            if data is None:
+                data = {}
             kwargs = {}
             for arg in self.required:
                 kwargs[arg] = data[arg]
@@ -35,6 +60,32 @@ class unpack(object):
         return f
 
 
+_PRIMITIVE_TYPES = frozenset([str, int, float, bool, type(None)])
+
+
+def _convert(value):
+    if type(value) in _PRIMITIVE_TYPES:
+        return value
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (list, tuple)):
+        return [_convert(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _convert(v) for k, v in value.items()}
+    return value
+
+
+def _field_names(obj):
+    if hasattr(obj, "__dict__"):
+        return list(obj.__dict__)
+    names = []
+    for cls in reversed(type(obj).__mro__):
+        names.extend(getattr(cls, "__slots__", ()))
+    return names
+
+
 def to_dict(obj, omit=None, replace=None):
     members = {}
     if omit is None:
@@ -44,31 +95,44 @@ def to_dict(obj, omit=None, replace=None):
     if replace is None or not isinstance(replace, dict):
         replace = {}
 
-    def convert(value):
-        if hasattr(value, "to_dict"):
-            return value.to_dict()
-        if isinstance(value, Enum):
-            return value.value
-        if isinstance(value, (list, tuple)):
-            return [convert(v) for v in value]
-        if isinstance(value, dict):
-            return {k: convert(v) for k, v in value.items()}
-        return value
-
-    for name, val in obj.__dict__.items():
+    for name in _field_names(obj):
         if name.startswith("_") or name in omit:
             continue
         if name in replace:
             members[name] = replace[name]
         else:
-            members[name] = convert(val)
+            members[name] = _convert(getattr(obj, name))
     return members
 
 
-def generate_game_id():
-    if not word_list:
-        _init_word_list()
-    return rand.choice(word_list)
+class Serializer(object):
+    """
+    Same output as `to_dict`, but the list of fields to serialize is worked out from the first object and reused, so
+    `omit`/`replace` are fixed per serializer. Works with `__slots__` classes, otherwise every public attribute must be
+    set in `__init__`.
+    """
+    def __init__(self, omit=(), replace=None):
+        self.omit = frozenset(omit)
+        self.replace = replace or {}
+        self._plan = None
+
+    def _build_plan(self, obj):
+        names = tuple(name for name in _field_names(obj)
+                      if not name.startswith("_") and name not in self.omit and name not in self.replace)
+        # A single attrgetter fetches every field in one call, for both __dict__ and __slots__ objects
+        getter = attrgetter(*names) if len(names) > 1 else lambda o: tuple(getattr(o, n) for n in names)
+        return names, getter
+
+    def __call__(self, obj):
+        plan = self._plan
+        if plan is None:
+            plan = self._plan = self._build_plan(obj)
+        names, getter = plan
+        members = {name: value if type(value) in _PRIMITIVE_TYPES else _convert(value)
+                   for name, value in zip(names, getter(obj))}
+        # Copied so outputs never share a mutable replacement, like the empty answer list of a hidden game
+        members.update({name: copy(value) for name, value in self.replace.items()})
+        return members
 
 
 def generate_id(length=6):
@@ -76,4 +140,4 @@ def generate_id(length=6):
 
 
 def generate_key(length=64):
-    return base64.b64encode(secrets.token_bytes(length)).decode("utf8")
\ No newline at end of file
+    return base64.b64encode(secrets.token_bytes(length)).decode("utf8")
@@ -0,0 +1,73 @@
+from typing import Optional
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+JSON = "json"
+MSGPACK = "msgpack"
+FORMATS = (JSON, MSGPACK)
+
+# Fields holding a whole player dict, sent as the player's id alone in the normalized schema
+_PLAYER_FIELDS = {"topic_writer": "topic_writer_id", "guesser": "guesser_id", "player": "player_id",
+                  "guessed_player": "guessed_player_id"}
+
+
+def check_format(wire_format):
+    """The format a client asked for, raises ValueError if it can't be served"""
+    wire_format = wire_format or JSON
+    if wire_format not in FORMATS:
+        raise ValueError(f"Unknown wire format '{wire_format}'")
+    if wire_format == MSGPACK and msgpack is None:
+        raise ValueError("The msgpack package is required for the msgpack wire format")
+    return wire_format
+
+
+def _player_id(player: Optional[dict]):
+    return player["id"] if player else None
+
+
+def _normalize_entity(entity: dict) -> dict:
+    if not any(name in entity for name in _PLAYER_FIELDS):
+        return entity
+    return {_PLAYER_FIELDS[k] if k in _PLAYER_FIELDS else k: _player_id(v) if k in _PLAYER_FIELDS else v
+            for k, v in entity.items()}
+
+
+def _normalize_collection(diff: dict) -> dict:
+    if "changed" not in diff:
+        return diff
+    return dict(diff, changed={item_id: _normalize_entity(item) for item_id, item in diff["changed"].items()})
+
+
+def normalize(data: dict) -> dict:
+    """
+    The normalized schema of a payload: player dicts nested in answers, the game's topic writer and guesser, or the
+    payload itself are replaced by the player's id, which clients look up in `players`. Works the same on a game, a
+    patch (its fields and changed entities), or a payload holding either, so patches of normalized games apply as is.
+    """
+    data = _normalize_entity(data)
+    if "game" in data and data["game"]:
+        data = dict(data, game=normalize(data["game"]))
+    if "patch" in data and data["patch"]:
+        data = dict(data, patch=normalize(data["patch"]))
+    if "fields" in data:
+        data = dict(data, fields=_normalize_entity(data["fields"]))
+    if "guessed_answer" in data:
+        data = dict(data, guessed_answer=_normalize_entity(data["guessed_answer"]))
+    answers = data.get("answers")
+    if isinstance(answers, list):
+        data = dict(data, answers=[_normalize_entity(a) for a in answers])
+    elif isinstance(answers, dict):
+        data = dict(data, answers=_normalize_collection(answers))
+    return data
+
+
+def encode(data: dict, wire_format) -> object:
+    """The payload to emit to clients using `wire_format`, JSON clients get `data` unchanged"""
+    if wire_format == MSGPACK:
+        # Sent as a binary attachment, socket.io passes bytes through without JSON encoding them
+        return msgpack.packb(normalize(data), use_bin_type=True)
+    return data
@@ -1,5 +1,15 @@
-from things_game.server import app, socketio
+import eventlet
+# Enough for the locks and threads the app creates. Preloaded, this runs in gunicorn's master, which can't handle its
+# signals with os and select patched too. Its eventlet workers patch everything after the fork
+eventlet.monkey_patch(os=False, select=False)
+
+from things_game.server import create_app
+
+app = create_app()
+socketio = app.extensions["socketio"]
 
 
 if __name__ == '__main__':
+    eventlet.monkey_patch()
+    app.extensions["things_game"].start()
     socketio.run(app)